@@ -1,19 +1,9 @@
-from paths import aidev_path
-import pandas as pd
-import os
+from pipeline_stages import download_aidev, save_aidev
+import instrumentation
 
-os.makedirs(aidev_path, exist_ok=True)
+instrumentation.start_stage("0")
 
-# === Read datasets from Parquet ===
-repo_df = pd.read_parquet("hf://datasets/hao-li/AIDev/repository.parquet")
-pr_df = pd.read_parquet("hf://datasets/hao-li/AIDev/pull_request.parquet")
-pr_commits = pd.read_parquet("hf://datasets/hao-li/AIDev/pr_commits.parquet")
-pr_commit_details = pd.read_parquet("hf://datasets/hao-li/AIDev/pr_commit_details.parquet")
-
-# === Save as CSV ===
-repo_df.to_csv(os.path.join(aidev_path, "repository.csv"), index=False)
-pr_df.to_csv(os.path.join(aidev_path, "pull_request.csv"), index=False)
-pr_commits.to_csv(os.path.join(aidev_path, "pr_commits.csv"), index=False)
-pr_commit_details.to_csv(os.path.join(aidev_path, "pr_commit_details.csv"), index=False)
+# === Read datasets from Parquet and save as CSV ===
+save_aidev(download_aidev())
 
 print("CSV files have been saved successfully!")
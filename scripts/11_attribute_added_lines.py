@@ -0,0 +1,122 @@
+import os
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from hunk_index import HunkIndex
+from paths import aidev_path, metadata_path, lifetimes_path, git_repos_path, load_projects
+import instrumentation
+
+instrumentation.start_stage("11")
+
+# ==========================================
+# 1. SETTINGS
+# ==========================================
+details_csv = os.path.join(aidev_path, "pr_commit_details.csv")
+
+projects = load_projects()
+
+# ==========================================
+# 2. HELPER FUNCTIONS
+# ==========================================
+
+def load_lifetimes_with_birth_sha(project):
+    """
+    Lifetimes of the project with the SHA of the commit where each clone was
+    born (the commit whose line numbers the row uses), or None.
+    """
+    lifetimes_csv = os.path.join(lifetimes_path, f"{project}_clone_lifetimes.csv")
+    metadata_csv = f"{metadata_path}/{project}.csv"
+    if not os.path.exists(lifetimes_csv) or not os.path.exists(metadata_csv):
+        return None
+
+    try:
+        df = pd.read_csv(lifetimes_csv)
+    except pd.errors.EmptyDataError:
+        return None
+    if df.empty:
+        return None
+
+    commits = pd.read_csv(metadata_csv, usecols=["number_pr", "number_commit", "child"])
+    commits = commits.rename(columns={
+        "number_pr": "pr", "number_commit": "start_commit", "child": "birth_sha"
+    }).drop_duplicates(["pr", "start_commit"])
+    commits["birth_sha"] = commits["birth_sha"].astype(str).str.strip()
+
+    return df.merge(commits, on=["pr", "start_commit"], how="left")
+
+
+def annotate(df, index, project):
+    """
+    Add the overlap of every clone fragment with the lines its birth commit
+    added to the file:
+      - added_lines: fragment lines added by the commit
+      - added_line_ratio: added_lines / fragment length
+      - added_coverage: added_lines / lines the commit added to the file
+      - patch_available: False when the dataset has no patch for the file
+        (binary or too large for GitHub), the other columns are then empty
+    """
+    repo_prefix = f"{git_repos_path}/{project}/"
+    filenames = df["source_file"].astype(str).str.replace(repo_prefix, "", n=1, regex=False)
+
+    added = np.full(len(df), np.nan)
+    total_added = np.full(len(df), np.nan)
+
+    positions = pd.Series(np.arange(len(df)))
+    for (sha, filename), rows in positions.groupby([df["birth_sha"].values, filenames.values]):
+        rows = rows.to_numpy()
+        counts = index.added_lines(
+            sha, filename,
+            df["start_line"].to_numpy()[rows],
+            df["end_line"].to_numpy()[rows]
+        )
+        if counts is None:
+            continue
+        added[rows] = counts
+        total_added[rows] = index.total_added(sha, filename)
+
+    lengths = (df["end_line"] - df["start_line"] + 1).to_numpy()
+    df["added_lines"] = pd.array(added, dtype="Int64")
+    df["added_line_ratio"] = np.round(added / lengths, 4)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coverage = np.where(total_added > 0, added / total_added, 0.0)
+    coverage[np.isnan(added)] = np.nan
+    df["added_coverage"] = np.round(coverage, 4)
+    df["patch_available"] = ~np.isnan(added)
+    return df
+
+
+# ==========================================
+# 3. MAIN LOOP
+# ==========================================
+if not os.path.exists(details_csv):
+    raise FileNotFoundError(f"CSV file not found: {details_csv}")
+
+lifetimes = {}
+for project in projects:
+    df = load_lifetimes_with_birth_sha(project)
+    if df is None:
+        print(f"⚠️ No lifetimes for {project}")
+        continue
+    lifetimes[project] = df
+
+# Only the commits where some clone was born need their patches
+needed_shas = set()
+for df in lifetimes.values():
+    needed_shas.update(df["birth_sha"].dropna())
+
+print(f"\n🧩 Indexing added lines of {len(needed_shas)} commits from {details_csv}")
+with instrumentation.timed("index_patches", commits=len(needed_shas)) as event:
+    index = HunkIndex.from_details_csv(details_csv, needed_shas)
+    event["patches"] = len(index)
+print(f"📚 {len(index)} (commit, file) patches indexed")
+
+for project, df in tqdm(lifetimes.items(), desc="Attributing clones"):
+    with instrumentation.timed("attribute", project=project, clones=len(df)):
+        df = annotate(df, index, project)
+
+    output_csv = os.path.join(lifetimes_path, f"{project}_clone_lifetimes_attributed.csv")
+    df.to_csv(output_csv, index=False)
+
+    share = df.loc[df["patch_available"], "added_line_ratio"]
+    print(f"✅ {project}: {len(df)} clones, {df['patch_available'].sum()} with patch data, "
+          f"mean added-line ratio {share.mean() if len(share) else 0:.2f} -> {output_csv}")
@@ -1,17 +1,8 @@
-import os
-from paths import metadata_path
+from pipeline_stages import list_projects, save_project_list
+import instrumentation
 
-projects = []
-for file in os.listdir(metadata_path):
-    if file.endswith(".csv") or file.endswith(".xlsx"):
-        project_name = os.path.splitext(file)[0]
-        projects.append(project_name)
+instrumentation.start_stage("5")
 
-projects = sorted(set(projects))
-
-output_path = "projects_filtered.txt"
-
-with open(output_path, "w", encoding="utf-8") as f:
-    f.write("\n".join(projects))
+save_project_list(list_projects())
 
 print(f"\nprojects_filtered.txt generated")
@@ -0,0 +1,102 @@
+import io
+import os
+import gzip
+import shutil
+
+# zstandard is optional: gzip (stdlib) and plain files always work
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Compression of a search_results artifact is detected from its extension
+COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def detect_compression(path):
+    """Return "gzip", "zstd" or None, based only on the file extension."""
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if str(path).endswith(extension):
+            return compression
+    return None
+
+
+def strip_compression(path):
+    """x.xml.gz -> x.xml (unchanged if not compressed)."""
+    compression = detect_compression(path)
+    if compression is None:
+        return str(path)
+    return str(path)[:-len(COMPRESSION_EXTENSIONS[compression])]
+
+
+def artifact_path(path, compression=None):
+    """Path of an artifact written with the given compression ("none" or None = plain)."""
+    path = strip_compression(path)
+    if compression in (None, "", "none"):
+        return path
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    return path + COMPRESSION_EXTENSIONS[compression]
+
+
+def find_artifact(path):
+    """
+    Existing file for an artifact in any of the supported compressions,
+    plain first. Returns None if there is none.
+    """
+    base = strip_compression(path)
+    for candidate in [base] + [base + ext for ext in COMPRESSION_EXTENSIONS.values()]:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def open_artifact(path, mode="rb", encoding="utf-8", errors=None, level=None):
+    """
+    open() replacement for search_results artifacts: the (de)compression is
+    chosen from the extension. Modes are "rb", "wb", "rt" and "wt".
+    """
+    compression = detect_compression(path)
+    text = "t" in mode
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+
+    if compression is None:
+        if text:
+            return open(path, binary_mode.replace("b", ""), encoding=encoding, errors=errors)
+        return open(path, binary_mode)
+
+    if compression == "gzip":
+        stream = gzip.open(path, binary_mode, compresslevel=level or 6)
+    else:
+        if not HAS_ZSTD:
+            raise RuntimeError(f"zstandard is not installed, cannot open {path}")
+        raw = open(path, binary_mode)
+        if binary_mode == "rb":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=level or 3).stream_writer(raw, closefd=True)
+
+    if text:
+        return io.TextIOWrapper(stream, encoding=encoding, errors=errors)
+    return stream
+
+
+def compress_file(src_path, compression, remove_source=True):
+    """
+    Compress src_path to its compressed artifact path and return that path.
+    Plain compression ("none") leaves the file as it is.
+    """
+    dst_path = artifact_path(src_path, compression)
+    if dst_path == str(src_path):
+        return dst_path
+
+    with open(src_path, "rb") as src, open_artifact(dst_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+
+    if remove_source:
+        os.remove(src_path)
+    return dst_path
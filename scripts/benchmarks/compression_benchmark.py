@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark of search_results compression: for plain, gzip and zstd XMLs,
+measure size, write time and the time to read + parse them the way the
+tracking stage does, both from the page cache (pure decompression cost)
+and cold (page cache evicted, real disk I/O).
+
+Usage (from the scripts folder):
+    python3 benchmarks/compression_benchmark.py                 # synthetic XMLs
+    python3 benchmarks/compression_benchmark.py --source search_results --limit 200
+    python3 benchmarks/compression_benchmark.py --disk-mbps 150 # model a slower disk
+"""
+import os
+import sys
+import time
+import glob
+import random
+import shutil
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from artifact_io import HAS_ZSTD, artifact_path, open_artifact, strip_compression
+
+
+def synthetic_xml(path, n_sets, seed):
+    """Write a generic <clones> XML with n_sets sets of 2-4 blocks."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<clones>\n    <check threshold="6">\n')
+        for i in range(n_sets):
+            blocks = rng.randint(2, 4)
+            f.write(f'        <set lineCount="{rng.randint(6, 60)}" fingerprint="{rng.getrandbits(128):032x}" '
+                    f'similarity="{rng.randint(70, 100)}" nclones="{blocks}">\n')
+            for _ in range(blocks):
+                start = rng.randint(1, 3000)
+                f.write(f'            <block sourceFile="/data/git_repos/project/src/module_{rng.randint(1, 400)}/File{rng.randint(1, 50)}.java" '
+                        f'startLineNumber="{start}" endLineNumber="{start + rng.randint(6, 60)}"/>\n')
+            f.write('        </set>\n')
+        f.write('    </check>\n</clones>')
+
+
+def parse_instances(path):
+    """Read + parse like 8_track_clones.extract_clone_instances."""
+    instances = set()
+    with open_artifact(path, "rb") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == "set":
+                fp = elem.get("fingerprint")
+                for b in elem.findall("block"):
+                    instances.add((fp, b.get("sourceFile"), b.get("startLineNumber"), b.get("endLineNumber")))
+                elem.clear()
+    return len(instances)
+
+
+def evict(paths):
+    """Drop the files from the page cache so the next read hits the disk."""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def timed_parse(paths):
+    started = time.perf_counter()
+    for path in paths:
+        parse_instances(path)
+    return time.perf_counter() - started
+
+
+def run(sources, work_dir, compressions, disk_mbps):
+    results = []
+    plain_bytes = None
+    plain_warm = None
+
+    for compression in compressions:
+        target_dir = os.path.join(work_dir, compression)
+        os.makedirs(target_dir, exist_ok=True)
+
+        # Write
+        paths = []
+        started = time.perf_counter()
+        for source in sources:
+            name = os.path.basename(strip_compression(source))
+            path = artifact_path(os.path.join(target_dir, name), compression)
+            with open_artifact(source, "rb") as src, open_artifact(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=1024 * 1024)
+            paths.append(path)
+        write_seconds = time.perf_counter() - started
+        total_bytes = sum(os.path.getsize(p) for p in paths)
+
+        # Warm: files are in the page cache, only CPU (parse + decompression)
+        timed_parse(paths)
+        warm_seconds = timed_parse(paths)
+
+        # Cold: page cache evicted, the disk has to deliver every byte
+        evict(paths)
+        cold_seconds = timed_parse(paths)
+
+        if compression == "none":
+            plain_bytes, plain_warm = total_bytes, warm_seconds
+
+        results.append({
+            "compression": compression,
+            "bytes": total_bytes,
+            "write_s": write_seconds,
+            "warm_read_s": warm_seconds,
+            "cold_read_s": cold_seconds,
+        })
+
+    print(f"\n{'compression':<12}{'size MB':>10}{'ratio':>8}{'write s':>10}{'warm s':>10}{'cold s':>10}{'model s':>10}")
+    for r in results:
+        ratio = plain_bytes / r["bytes"] if r["bytes"] else 0
+        # Modeled read time on a disk of disk_mbps: CPU (warm) + bytes / bandwidth
+        model = r["warm_read_s"] + r["bytes"] / (disk_mbps * 1024 * 1024)
+        r["model_s"] = model
+        print(f"{r['compression']:<12}{r['bytes'] / 1024 / 1024:>10.2f}{ratio:>8.1f}"
+              f"{r['write_s']:>10.2f}{r['warm_read_s']:>10.2f}{r['cold_read_s']:>10.2f}{model:>10.2f}")
+
+    print(f"\n(model s = warm read time + size / {disk_mbps} MB/s disk bandwidth)")
+    for r in results:
+        if r["compression"] == "none":
+            continue
+        decompression_cost = r["warm_read_s"] - plain_warm
+        io_saved = (plain_bytes - r["bytes"]) / (disk_mbps * 1024 * 1024)
+        verdict = "pays off" if io_saved > decompression_cost else "does NOT pay off"
+        print(f"{r['compression']}: decompression costs {decompression_cost:+.2f}s, "
+              f"saved disk I/O {io_saved:.2f}s -> {verdict}")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compression benchmark for search_results XMLs.")
+    parser.add_argument("--source", help="Folder with real XMLs (e.g. search_results); synthetic if omitted")
+    parser.add_argument("--limit", type=int, default=200, help="Max number of real XMLs to use")
+    parser.add_argument("--files", type=int, default=50, help="Number of synthetic XMLs")
+    parser.add_argument("--sets", type=int, default=2000, help="Sets per synthetic XML")
+    parser.add_argument("--disk-mbps", type=float, default=200.0, help="Disk bandwidth for the I/O model")
+    args = parser.parse_args()
+
+    compressions = ["none", "gzip"] + (["zstd"] if HAS_ZSTD else [])
+    work_dir = tempfile.mkdtemp(prefix="compression-bench-")
+
+    try:
+        if args.source:
+            sources = sorted(
+                p for p in glob.glob(os.path.join(args.source, "nicad-result-*.xml*"))
+            )[:args.limit]
+            if not sources:
+                print(f"No XMLs found in {args.source}")
+                raise SystemExit(1)
+        else:
+            source_dir = os.path.join(work_dir, "source")
+            os.makedirs(source_dir)
+            sources = []
+            for i in range(args.files):
+                path = os.path.join(source_dir, f"nicad-result-synthetic-1-{i}-child.xml")
+                synthetic_xml(path, args.sets, seed=i)
+                sources.append(path)
+
+        print(f"Benchmarking {len(sources)} XMLs: {', '.join(compressions)}")
+        run(sources, work_dir, compressions, args.disk_mbps)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Agreement of the python clone detector with NiCad, snapshot by snapshot.
+
+Every snapshot (parent / child of the commits of a project) is exported
+from git to a temporary folder with `git archive`, so the repository is not
+checked out. The python detector runs on it, and its clone pairs are
+compared with the reference:
+  - --reference xml (default): the XML NiCad already wrote for the snapshot
+    in search_results (raw or converted by stage 7);
+  - --reference nicad: NiCad run on the same export (--nicad folder).
+
+Two fragments are the same when they are in the same file and overlap by at
+least half of their lines, since NiCad and ast may not end a function on the
+same line. A pair is counted once per snapshot.
+
+Usage (from a workspace with metadata, git_repos and search_results):
+    python3 benchmarks/detector_agreement.py --project my_repo --limit 20
+    python3 benchmarks/detector_agreement.py --project my_repo --reference nicad --nicad NiCad
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import xml.etree.ElementTree as ET
+from itertools import combinations
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+from paths import git_repos_path, search_results_path, summary_path, load_settings
+from languages import LANGUAGES
+from artifact_io import find_artifact, open_artifact
+from pipeline_stages import read_metadata
+from clone_detectors import NiCadDetector, PythonDetector
+
+
+def export_snapshot(repo_path, sha, target, extension):
+    """Files of the language at sha, written under target."""
+    os.makedirs(target)
+    archive = subprocess.run(["git", "archive", sha, "--", f"*.{extension}"], cwd=repo_path,
+                             capture_output=True)
+    if archive.returncode != 0:
+        return  # no file of the language at sha
+    subprocess.run(["tar", "-x", "-C", target], input=archive.stdout, check=True)
+
+
+def read_classes(xml_path, root):
+    """Clone classes of a NiCad or generic XML as lists of (relative file, start, end)."""
+    classes = []
+    with open_artifact(xml_path, "rb") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == "class":
+                members = [(s.get("file"), int(s.get("startline")), int(s.get("endline")))
+                           for s in elem.findall("source")]
+            elif elem.tag == "set":
+                members = [(b.get("sourceFile"), int(b.get("startLineNumber")), int(b.get("endLineNumber")))
+                           for b in elem.findall("block")]
+            else:
+                continue
+            classes.append([(os.path.relpath(file, root), start, end) for file, start, end in members])
+            elem.clear()
+    return classes
+
+
+def pairs_of(classes):
+    return {tuple(sorted(pair)) for members in classes for pair in combinations(sorted(set(members)), 2)}
+
+
+def same_fragment(a, b):
+    if a[0] != b[0]:
+        return False
+    overlap = min(a[2], b[2]) - max(a[1], b[1]) + 1
+    return overlap > 0 and overlap >= 0.5 * (max(a[2], b[2]) - min(a[1], b[1]) + 1)
+
+
+def compare(detected, reference):
+    """(detected pairs, reference pairs, detected pairs that are in the reference)."""
+    fragments = sorted({fragment for pair in reference for fragment in pair})
+    by_file = {}
+    for fragment in fragments:
+        by_file.setdefault(fragment[0], []).append(fragment)
+
+    def to_reference(fragment):
+        return next((r for r in by_file.get(fragment[0], []) if same_fragment(fragment, r)), fragment)
+
+    mapped = {tuple(sorted((to_reference(a), to_reference(b)))) for a, b in detected}
+    matched = len(mapped & reference)
+    return len(detected), len(reference), matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agreement of the python clone detector with NiCad.")
+    parser.add_argument("--project", required=True, help="Project (metadata/<project>.csv)")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N commits")
+    parser.add_argument("--reference", choices=["xml", "nicad"], default="xml",
+                        help="Existing search_results XMLs or a NiCad run (default: xml)")
+    parser.add_argument("--nicad", default="NiCad", help="NiCad folder for --reference nicad")
+    parser.add_argument("--workers", type=int, default=1, help="Processes of the python detector")
+    args = parser.parse_args()
+
+    extension = LANGUAGES[load_settings()["language"]]
+    if extension not in PythonDetector.extensions:
+        sys.exit(f"The python detector only supports Python sources, not .{extension}")
+
+    df = read_metadata(args.project)
+    if df is None:
+        sys.exit(f"No metadata for {args.project}")
+    if args.limit:
+        df = df.head(args.limit)
+
+    repo_path = os.path.join(git_repos_path, args.project)
+    work_dir = tempfile.mkdtemp(prefix="detector-agreement-")
+    detector = PythonDetector(workers=args.workers)
+    nicad = NiCadDetector(os.path.abspath(args.nicad)) if args.reference == "nicad" else None
+    rows = []
+
+    try:
+        for _, row in df.iterrows():
+            for mode in ("parent", "child"):
+                sha = str(row[mode]).strip()
+                if sha in ["", "None", "nan"] or len(sha) <= 5:
+                    continue
+                snapshot = f"{row['number_pr']}-{row['number_commit']}-{mode}"
+
+                if nicad is None:
+                    xml_path = find_artifact(os.path.join(
+                        search_results_path, f"nicad-result-{args.project}-{snapshot}.xml"))
+                    if xml_path is None:
+                        continue
+
+                # <work>/<snapshot>/<project>: NiCad names its results after the folder
+                target = os.path.join(work_dir, snapshot, args.project)
+                export_snapshot(repo_path, sha, target, extension)
+
+                started = time.perf_counter()
+                classes = detector.find_classes(target, extension)
+                python_seconds = time.perf_counter() - started
+                detected = pairs_of([[(os.path.relpath(f, target), s, e) for f, s, e, _ in sources]
+                                     for _, _, sources in classes])
+
+                nicad_seconds = None
+                if nicad is not None:
+                    xml_path = os.path.join(work_dir, f"{snapshot}.xml")
+                    started = time.perf_counter()
+                    nicad.detect(target, extension, xml_path)
+                    nicad_seconds = time.perf_counter() - started
+                    reference = pairs_of(read_classes(xml_path, target))
+                else:
+                    reference = pairs_of(read_classes(xml_path, repo_path))
+
+                n_detected, n_reference, matched = compare(detected, reference)
+                rows.append({"snapshot": snapshot, "sha": sha, "reference_pairs": n_reference,
+                             "python_pairs": n_detected, "matched": matched,
+                             "python_s": round(python_seconds, 3),
+                             "nicad_s": round(nicad_seconds, 3) if nicad_seconds is not None else None})
+                shutil.rmtree(os.path.join(work_dir, snapshot), ignore_errors=True)
+    finally:
+        detector.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not rows:
+        sys.exit("No snapshot compared.")
+
+    results = pd.DataFrame(rows)
+    os.makedirs(summary_path, exist_ok=True)
+    output_csv = os.path.join(summary_path, f"detector_agreement_{args.project}.csv")
+    results.to_csv(output_csv, index=False)
+
+    reference, detected, matched = results[["reference_pairs", "python_pairs", "matched"]].sum()
+    precision = matched / detected if detected else 1.0
+    recall = matched / reference if reference else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    print(f"\n📊 {len(results)} snapshots of {args.project}")
+    print(f"   pairs: reference {reference}, python {detected}, in both {matched}")
+    print(f"   precision {precision:.3f}, recall {recall:.3f}, F1 {f1:.3f}")
+    print(f"   python detector: {results['python_s'].sum():.1f}s in total")
+    if nicad is not None:
+        print(f"   NiCad: {results['nicad_s'].sum():.1f}s in total")
+    print(f"📄 Per snapshot: {output_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of stages 3-10 on synthetic repositories (see
+synthetic_repos.py), without the network or the AIDev data.
+
+For every language, a workspace is generated and the numbered scripts run
+in it as the pipeline runs them, one process per stage. Each stage is timed
+and its peak memory (max RSS of the stage process and its workers) is
+read back from the kernel. Stage 6 runs the detector of --detector; the
+default, auto, times the python detector on Python sources and NiCad on the
+others when it is found (--nicad). When the detector cannot run, the XMLs of
+the injected clones stand in for its output and the stage is reported as
+skipped.
+
+The results are compared with the baseline of the profile,
+benchmarks/baselines/<profile>.json: a stage that is slower or uses more
+memory than the baseline allows makes the benchmark exit with status 1, and
+so does a stage measured differently from the baseline (e.g. stage 6 timed
+here but skipped in the baseline). Timings are absolute, so a missing
+baseline, or one recorded for another profile, other parameters or on
+another machine (host or number of CPUs) stops the benchmark with status 1
+before it runs, unless --update-baseline records a new one. The committed
+baselines use the default parameters; record them again on the machine that
+runs the benchmark:
+
+Usage (from the scripts folder):
+    python3 benchmarks/pipeline_benchmark.py --profile small --update-baseline
+    python3 benchmarks/pipeline_benchmark.py --profile small             # compare with it
+    python3 benchmarks/pipeline_benchmark.py --profile medium --languages Java,Python --workers 4
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import configparser
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+SCRIPT_DIR = BENCHMARK_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from languages import LANGUAGES
+from synthetic_repos import generate_workspace
+from clone_detectors import PythonDetector
+
+BASELINES_DIR = BENCHMARK_DIR / "baselines"
+
+PROFILES = {
+    "small": dict(projects=2, files=12, functions=4, prs=4, commits=3),
+    "medium": dict(projects=4, files=40, functions=6, prs=10, commits=4),
+    "large": dict(projects=8, files=150, functions=8, prs=25, commits=5),
+}
+
+STAGES = [
+    ("3", "3_get_commits_prs_correct.py"),
+    ("4", "4_break_projects.py"),
+    ("5", "5_take_projects.py"),
+    ("6", "6_detect_clone.py"),
+    ("7", "7_parser_clones.py"),
+    ("8", "8_track_clones.py"),
+    ("9", "9_made_lifecycle.py"),
+    ("10", "10_count_lifecycle.py"),
+]
+PARALLEL_STAGES = {"7", "8"}
+
+
+def nicad_available(folder):
+    """NiCad is built (nicad6 is executable) and TXL is installed."""
+    return os.access(Path(folder) / "nicad6", os.X_OK) and shutil.which("txl") is not None
+
+
+def prepare_workspace(path, language, nicad, detector):
+    """settings.ini of the scripts folder with the language and detector, and the NiCad link."""
+    config = configparser.ConfigParser()
+    config.read(SCRIPT_DIR / "settings.ini")
+    config["DETAILS"]["language"] = language
+    config["DETAILS"]["detector"] = detector
+    with open(path / "settings.ini", "w", encoding="utf-8") as f:
+        config.write(f)
+
+    if nicad:
+        # run_nicad looks for NiCad two levels above the repository
+        os.symlink(nicad, path / "NiCad")
+
+
+def run_stage(path, script, workers, log_dir):
+    """Run a numbered script in the workspace. Returns (seconds, peak RSS in MB, exit code)."""
+    command = [sys.executable, str(SCRIPT_DIR / script)]
+    if script.split("_")[0] in PARALLEL_STAGES:
+        command += ["--workers", str(workers)]
+
+    env = dict(os.environ)
+    env.pop("LIFECYCLE_PROJECTS", None)
+
+    with open(log_dir / f"{script[:-3]}.log", "w", encoding="utf-8") as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=path, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the resources of this process (and of its workers) alone
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    peak_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return seconds, peak_mb, process.returncode
+
+
+def stage_6_detector(language, args):
+    """Detector timed in stage 6, None when it cannot run here."""
+    if args.detector == "minhash" and LANGUAGES[language] in PythonDetector.extensions:
+        return "minhash"
+    if args.detector in ("python", "auto") and LANGUAGES[language] in PythonDetector.extensions:
+        return "python"
+    if args.detector in ("python", "minhash") or args.nicad is None:
+        return None
+    return "nicad"
+
+
+def benchmark_language(language, params, args, work_dir):
+    """Best time and highest peak memory of every stage over the repetitions."""
+    results = {}
+    for repetition in range(args.repeat):
+        path = work_dir / f"{LANGUAGES[language]}-{repetition}"
+        shutil.rmtree(path, ignore_errors=True)
+        path.mkdir(parents=True)
+
+        started = time.perf_counter()
+        detector = stage_6_detector(language, args)
+        sizes = generate_workspace(path, language, seed=args.seed, clone_rate=args.clone_rate,
+                                   nicad_xmls=detector is None, **params)
+        print(f"🧪 [{language}] workspace {repetition + 1}/{args.repeat}: {sizes['projects']} projects, "
+              f"{sizes['commits']} commits, generated in {time.perf_counter() - started:.1f}s")
+        prepare_workspace(path, language, args.nicad, detector or "nicad")
+
+        log_dir = path / "benchmark_logs"
+        log_dir.mkdir()
+        for stage, script in STAGES:
+            if stage == "6" and detector is None:
+                results[stage] = {"skipped": "no NiCad, XMLs of the injected clones used"}
+                continue
+
+            seconds, peak_mb, code = run_stage(path, script, args.workers, log_dir)
+            if code != 0:
+                log_file = log_dir / f"{script[:-3]}.log"
+                print(f"❌ [{language}] {script} failed with status {code}, last lines of {log_file}:")
+                print("".join(log_file.read_text(encoding="utf-8").splitlines(True)[-20:]))
+                raise SystemExit(1)
+
+            previous = results.get(stage)
+            if previous:
+                seconds = min(seconds, previous["seconds"])
+                peak_mb = max(peak_mb, previous["peak_mb"])
+            results[stage] = {
+                "seconds": round(seconds, 3),
+                "peak_mb": round(peak_mb, 1),
+                "commits_per_s": round(sizes["commits"] / seconds, 2),
+            }
+            if stage == "6":
+                results[stage]["detector"] = detector
+
+        if not args.keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+    return results
+
+
+# ==========================================
+# Baselines
+# ==========================================
+def measured_with(values):
+    if "skipped" in values:
+        return "skipped"
+    return f"run with {values['detector']}" if "detector" in values else "run"
+
+
+def machine_info():
+    return {"host": platform.node(), "cpus": os.cpu_count(), "python": platform.python_version()}
+
+
+def compare(results, baseline, max_slowdown, max_memory_growth):
+    """Regressions of results against the baseline, as readable messages."""
+    regressions = []
+    for key, current in results.items():
+        reference = baseline["stages"].get(key)
+        if reference is None:
+            regressions.append(f"{key}: not in the baseline")
+            continue
+        measured, expected = measured_with(current), measured_with(reference)
+        if measured != expected:
+            # e.g. stage 6 run with NiCad here, skipped when the baseline was recorded
+            regressions.append(f"{key}: {measured} here, {expected} in the baseline")
+            continue
+        if "skipped" in current:
+            continue
+        # Small absolute slack: the start of a Python process alone varies by a few 100 ms
+        allowed_seconds = reference["seconds"] * (1 + max_slowdown) + 0.25
+        if current["seconds"] > allowed_seconds:
+            regressions.append(f"{key}: {current['seconds']:.2f}s vs {reference['seconds']:.2f}s in the baseline "
+                               f"({current['commits_per_s']:.1f} vs {reference['commits_per_s']:.1f} commits/s)")
+        allowed_mb = reference["peak_mb"] * (1 + max_memory_growth) + 10
+        if current["peak_mb"] > allowed_mb:
+            regressions.append(f"{key}: peak memory {current['peak_mb']:.0f} MB vs "
+                               f"{reference['peak_mb']:.0f} MB in the baseline")
+    return regressions
+
+
+def print_table(results, baseline):
+    print(f"\n{'stage':<16}{'seconds':>10}{'commits/s':>12}{'peak MB':>10}{'base s':>10}{'base MB':>10}")
+    for key, current in results.items():
+        reference = (baseline or {}).get("stages", {}).get(key, {})
+        if "skipped" in current:
+            print(f"{key:<16}{'skipped':>10}  ({current['skipped']})")
+            continue
+        base_s = f"{reference['seconds']:.2f}" if "seconds" in reference else "-"
+        base_mb = f"{reference['peak_mb']:.0f}" if "peak_mb" in reference else "-"
+        print(f"{key:<16}{current['seconds']:>10.2f}{current['commits_per_s']:>12.1f}"
+              f"{current['peak_mb']:>10.0f}{base_s:>10}{base_mb:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of stages 3-10 on synthetic repositories.")
+    parser.add_argument("--profile", default="small", choices=sorted(PROFILES),
+                        help="Size of the synthetic repositories (default: small)")
+    for name in ("projects", "files", "functions", "prs", "commits"):
+        parser.add_argument(f"--{name}", type=int, default=None, help=f"Override the {name} of the profile")
+    parser.add_argument("--clone-rate", type=float, default=0.3,
+                        help="Probability that a new function copies an existing one")
+    parser.add_argument("--languages", default=",".join(LANGUAGES),
+                        help=f"Comma-separated languages (default: {','.join(LANGUAGES)})")
+    parser.add_argument("--workers", type=int, default=1, help="Processes of stages 7 and 8")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per language; the best time is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--detector", default="auto", choices=["nicad", "python", "minhash", "auto"],
+                        help="Clone detector of stage 6 (default: auto, python for Python sources and "
+                             "NiCad otherwise; python, minhash: Python sources only; see settings.ini)")
+    parser.add_argument("--nicad", default=None,
+                        help="NiCad folder (default: scripts/NiCad if it is built; stage 6 is skipped without it)")
+    parser.add_argument("--work-dir", default=None, help="Where the workspaces are generated (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the workspaces")
+    parser.add_argument("--baseline", default=None, help="Baseline file (default: baselines/<profile>.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="Save the results as the baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.25,
+                        help="Allowed relative slowdown of a stage (default: 0.25)")
+    parser.add_argument("--max-memory-growth", type=float, default=0.25,
+                        help="Allowed relative growth of the peak memory of a stage (default: 0.25)")
+    args = parser.parse_args()
+
+    languages = [language.strip() for language in args.languages.split(",") if language.strip()]
+    unknown = [language for language in languages if language not in LANGUAGES]
+    if unknown:
+        parser.error(f"unknown language(s): {', '.join(unknown)} (see languages.py)")
+
+    if args.nicad is None and nicad_available(SCRIPT_DIR / "NiCad"):
+        args.nicad = str(SCRIPT_DIR / "NiCad")
+    if args.nicad is not None:
+        args.nicad = str(Path(args.nicad).resolve())
+    elif any(stage_6_detector(language, args) is None for language in languages):
+        print("⚠️ NiCad not found: stage 6 is skipped where it needs NiCad, "
+              "the XMLs of the injected clones are used instead")
+
+    params = dict(PROFILES[args.profile])
+    for name in params:
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    params_key = dict(params, clone_rate=args.clone_rate, seed=args.seed, workers=args.workers,
+                      detector=args.detector)
+
+    baseline_path = Path(args.baseline) if args.baseline else BASELINES_DIR / f"{args.profile}.json"
+    baseline = None
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    # Checked before the run: without a matching baseline there is nothing to gate on
+    if not args.update_baseline:
+        if baseline is None:
+            sys.exit(f"🚨 No baseline at {baseline_path}; record one with --update-baseline")
+        if baseline.get("profile") != args.profile or baseline.get("params") != params_key:
+            sys.exit(f"🚨 {baseline_path} was recorded for profile {baseline.get('profile')} with "
+                     f"{baseline.get('params')}, not {args.profile} with {params_key}; "
+                     f"record a matching one with --update-baseline")
+        recorded_on = {name: baseline["machine"].get(name) for name in ("host", "cpus")}
+        this_machine = {name: machine_info()[name] for name in ("host", "cpus")}
+        if recorded_on != this_machine:
+            sys.exit(f"🚨 {baseline_path} was recorded on {recorded_on}, not {this_machine}: its timings "
+                     f"do not apply here; record one on this machine with --update-baseline")
+
+    work_dir = Path(args.work_dir or tempfile.mkdtemp(prefix="pipeline-bench-")).resolve()
+    results = {}
+    try:
+        for language in languages:
+            for stage, values in benchmark_language(language, params, args, work_dir).items():
+                results[f"{language}/{stage}"] = values
+    finally:
+        if not args.keep and args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(results, baseline)
+    record = {
+        "profile": args.profile,
+        "params": params_key,
+        "machine": machine_info(),
+        "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "stages": results,
+    }
+
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+        print(f"\n📌 Baseline saved to: {baseline_path}")
+        return
+
+    regressions = compare(results, baseline, args.max_slowdown, args.max_memory_growth)
+    if regressions:
+        print(f"\n🚨 {len(regressions)} regression(s) against {baseline_path}:")
+        for message in regressions:
+            print(f"  - {message}")
+        sys.exit(1)
+    print(f"\n✅ No regression against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
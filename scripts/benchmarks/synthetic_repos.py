@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Synthetic workspaces for the pipeline: git repositories in any language of
+languages.py, with a linear history of PRs whose commits add, edit, move and
+delete functions, some of them copies of other functions (injected clones).
+
+A workspace holds what stage 3 expects: git_repos/<project>/ and
+metadata/<language>_pr_commits_without_parents.csv (parents already filled,
+stage 3 recomputes them). Without NiCad, the XMLs stage 6 would write can be
+generated as well, from the injected clones: every family of copies with two
+or more live functions is a clone class.
+
+The same arguments always give the same repositories, down to the commit SHAs.
+
+Usage (from the scripts folder):
+    python3 benchmarks/synthetic_repos.py --out /tmp/synthetic --language Java --projects 3
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+from languages import LANGUAGES
+from pipeline_stages import PR_COMMIT_COLUMNS
+from clone_detectors import write_nicad_xml
+
+# How functions and files are written in each language
+SYNTAX = {
+    "py": dict(header=[], footer=[], comment="#", indent="", fn="def {name}(a, b):", end=None,
+               assign="{t} = {s} {op} {c}", ret="return {v}", var="{v}"),
+    "rb": dict(header=[], footer=[], comment="#", indent="", fn="def {name}(a, b)", end="end",
+               assign="{t} = {s} {op} {c}", ret="return {v}", var="{v}"),
+    "c": dict(header=["#include <stdio.h>", ""], footer=[], comment="//", indent="",
+              fn="int {name}(int a, int b) {{", end="}", assign="int {t} = {s} {op} {c};", ret="return {v};",
+              var="{v}"),
+    "java": dict(header=["public class {cls} {{", ""], footer=["}"], comment="//", indent="    ",
+                 fn="public static int {name}(int a, int b) {{", end="}", assign="int {t} = {s} {op} {c};",
+                 ret="return {v};", var="{v}"),
+    "cs": dict(header=["public class {cls} {{", ""], footer=["}"], comment="//", indent="    ",
+               fn="public static int {name}(int a, int b) {{", end="}", assign="int {t} = {s} {op} {c};",
+               ret="return {v};", var="{v}"),
+    "php": dict(header=["<?php", ""], footer=[], comment="//", indent="", fn="function {name}($a, $b) {{",
+                end="}", assign="{t} = {s} {op} {c};", ret="return {v};", var="${v}"),
+}
+OPERATORS = ["+", "-", "*"]
+AUTHOR = {"GIT_AUTHOR_NAME": "synthetic", "GIT_AUTHOR_EMAIL": "synthetic@example.com",
+          "GIT_COMMITTER_NAME": "synthetic", "GIT_COMMITTER_EMAIL": "synthetic@example.com"}
+FIRST_COMMIT_TIME = 1735689600  # 2025-01-01
+
+
+class Function:
+    def __init__(self, name, family, statements):
+        self.name = name
+        self.family = family          # functions of a family are copies of each other
+        self.statements = statements  # [(target, source, operator, constant)], last target is returned
+
+    def render(self, syntax):
+        var = lambda v: syntax["var"].format(v=v)
+        indent = syntax["indent"]
+        lines = [indent + syntax["fn"].format(name=self.name)]
+        for target, source, op, constant in self.statements:
+            lines.append(indent + "    " + syntax["assign"].format(t=var(target), s=var(source), op=op, c=constant))
+        lines.append(indent + "    " + syntax["ret"].format(v=var(self.statements[-1][0])))
+        if syntax["end"]:
+            lines.append(indent + syntax["end"])
+        return lines
+
+
+class SourceFile:
+    def __init__(self, name, functions):
+        self.name = name
+        self.functions = functions
+        self.comments = 0  # lines added on top, which move every function down
+
+    def render(self, syntax):
+        """File text and the (start, end) lines of every function."""
+        cls = Path(self.name).stem
+        lines = [line.format(cls=cls) for line in syntax["header"]]
+        lines += [f"{syntax['comment']} revision note {i}" for i in range(self.comments)]
+        spans = []
+        for function in self.functions:
+            body = function.render(syntax)
+            spans.append((function, len(lines) + 1, len(lines) + len(body)))
+            lines += body + [""]
+        lines += syntax["footer"]
+        return "\n".join(lines) + "\n", spans
+
+
+class SyntheticProject:
+    """One repository and the random edits of its PRs."""
+
+    def __init__(self, root, project, extension, files, functions, clone_rate, seed):
+        self.path = Path(root) / project
+        self.project = project
+        self.extension = extension
+        self.syntax = SYNTAX[extension]
+        self.clone_rate = clone_rate
+        self.rng = random.Random(seed)
+        self.next_id = 0
+        self.commits = 0
+        self.files = {}
+        for i in range(files):
+            self.add_file(functions)
+
+    # --- Model ---
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def fresh_function(self):
+        uid = self.new_id()
+        statements = []
+        available = ["a", "b"]
+        for i in range(self.rng.randint(5, 14)):
+            target = f"v{i}"
+            statements.append((target, self.rng.choice(available), self.rng.choice(OPERATORS),
+                               self.rng.randint(1, 99)))
+            available.append(target)
+        return Function(f"f{uid}", uid, statements)
+
+    def copy_of(self, function):
+        statements = list(function.statements)
+        if self.rng.random() < 0.5:
+            # Near-miss copy: one constant changed
+            i = self.rng.randrange(len(statements))
+            target, source, op, _ = statements[i]
+            statements[i] = (target, source, op, self.rng.randint(100, 999))
+        return Function(f"f{self.new_id()}", function.family, statements)
+
+    def all_functions(self):
+        return [f for source in self.files.values() for f in source.functions]
+
+    def new_function(self):
+        existing = self.all_functions()
+        if existing and self.rng.random() < self.clone_rate:
+            return self.copy_of(self.rng.choice(existing))
+        return self.fresh_function()
+
+    def add_file(self, functions):
+        name = f"src/module{len(self.files) % 7}/File{len(self.files)}.{self.extension}"
+        self.files[name] = SourceFile(name, [self.new_function() for _ in range(functions)])
+        return name
+
+    def edit(self):
+        """1 to 3 random changes; returns the touched files."""
+        touched = set()
+        for _ in range(self.rng.randint(1, 3)):
+            name = self.rng.choice(sorted(self.files))
+            source = self.files[name]
+            action = self.rng.random()
+            if action < 0.45:
+                source.functions.insert(self.rng.randint(0, len(source.functions)), self.new_function())
+            elif action < 0.65 and len(source.functions) > 1:
+                source.functions.pop(self.rng.randrange(len(source.functions)))
+            elif action < 0.8:
+                function = self.rng.choice(source.functions)
+                i = self.rng.randrange(len(function.statements))
+                target, s, op, _ = function.statements[i]
+                function.statements = list(function.statements)
+                function.statements[i] = (target, s, op, self.rng.randint(1, 99))
+                function.family = self.new_id()  # no longer a copy
+            elif action < 0.95:
+                source.comments += 1
+            else:
+                name = self.add_file(self.rng.randint(2, 4))
+            touched.add(name)
+        return touched
+
+    def clone_classes(self):
+        """Clone classes (see clone_detectors.write_nicad_xml) of the families with 2+ live functions."""
+        families = {}
+        for name in sorted(self.files):
+            _, spans = self.files[name].render(self.syntax)
+            for function, start, end in spans:
+                families.setdefault(function.family, []).append((str(self.path / name), start, end))
+
+        classes = []
+        pcid = 0
+        for members in families.values():
+            if len(members) < 2:
+                continue
+            nlines = round(sum(e - s + 1 for _, s, e in members) / len(members))
+            sources = []
+            for file, start, end in members:
+                pcid += 1
+                sources.append((file, start, end, pcid))
+            classes.append((100, nlines, sources))
+        return classes
+
+    # --- Git ---
+    def git(self, *args, env=None):
+        return subprocess.run(["git", *args], cwd=self.path, check=True, capture_output=True, text=True,
+                              env=env).stdout.strip()
+
+    def write(self, names):
+        for name in names:
+            path = self.path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(self.files[name].render(self.syntax)[0], encoding="utf-8")
+
+    def commit(self, message):
+        # Fixed author and dates: the same seed gives the same SHAs
+        date = f"{FIRST_COMMIT_TIME + 60 * self.commits} +0000"
+        env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date, **AUTHOR)
+        self.commits += 1
+        self.git("add", "-A")
+        # An edit can cancel itself out (e.g. a constant redrawn to its own value)
+        self.git("commit", "-q", "--no-verify", "--allow-empty", "-m", message, env=env)
+        return self.git("rev-parse", "HEAD")
+
+    def initialize(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True)
+        self.git("init", "-q")
+        self.write(self.files)
+        return self.commit("initial version")
+
+
+# ==========================================
+# Workspace
+# ==========================================
+def generate_workspace(root, language, projects=2, files=12, functions=4, prs=4, commits=3,
+                       clone_rate=0.3, seed=0, nicad_xmls=True):
+    """
+    Create git_repos, metadata and (nicad_xmls) search_results under root for
+    the language. Returns the sizes of what was generated.
+    """
+    extension = LANGUAGES[language]
+    root = Path(root).resolve()
+    git_repos = root / "git_repos"
+    search_results = root / "search_results"
+    for folder in (git_repos, root / "metadata", search_results):
+        folder.mkdir(parents=True, exist_ok=True)
+
+    rows = []
+    injected = 0
+    for p in range(projects):
+        project = f"synthetic_{extension}_{p}"
+        repo = SyntheticProject(git_repos, project, extension, files, functions, clone_rate,
+                                seed=f"{seed}-{language}-{p}")
+        parent = repo.initialize()
+        parent_classes = repo.clone_classes()
+
+        for k in range(1, prs + 1):
+            number_pr = 100 + k
+            id_pr = 1000 * (p + 1) + k
+            for number_commit in range(1, commits + 1):
+                repo.write(repo.edit())
+                sha = repo.commit(f"PR {number_pr}: change {number_commit}")
+                classes = repo.clone_classes()
+
+                api_url = f"https://api.github.com/repos/synthetic/{project}"
+                rows.append({
+                    "id": f"{number_pr}_rev{number_commit}",
+                    "number_pr": number_pr,
+                    "number_commit": number_commit,
+                    "repo_url": api_url,
+                    "merged_at": f"2025-01-{k % 28 + 1:02d}T00:00:00Z",
+                    "id_pr": id_pr,
+                    "sha_commit": sha,
+                    "url_commit": f"{api_url}/commit/{sha}",
+                    "url_pr": f"https://github.com/synthetic/{project}/pull/{number_pr}",
+                    "parent": parent,
+                    "child": sha,
+                })
+
+                if nicad_xmls:
+                    prefix = search_results / f"nicad-result-{project}-{number_pr}-{number_commit}"
+                    write_nicad_xml(f"{prefix}-parent.xml", project, parent_classes)
+                    write_nicad_xml(f"{prefix}-child.xml", project, classes)
+                injected += len(classes)
+                parent, parent_classes = sha, classes
+
+    commit_df = pd.DataFrame(rows, columns=PR_COMMIT_COLUMNS)
+    commit_df.to_csv(root / "metadata" / f"{language.lower()}_pr_commits_without_parents.csv", index=False)
+    return {"projects": projects, "commits": len(commit_df), "snapshots": 2 * len(commit_df),
+            "clone_classes": injected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic workspace for the pipeline.")
+    parser.add_argument("--out", required=True, help="Workspace folder")
+    parser.add_argument("--language", default="Java", choices=sorted(LANGUAGES))
+    parser.add_argument("--projects", type=int, default=2, help="Repositories")
+    parser.add_argument("--files", type=int, default=12, help="Source files of the first commit")
+    parser.add_argument("--functions", type=int, default=4, help="Functions per file of the first commit")
+    parser.add_argument("--prs", type=int, default=4, help="PRs per repository")
+    parser.add_argument("--commits", type=int, default=3, help="Commits per PR")
+    parser.add_argument("--clone-rate", type=float, default=0.3,
+                        help="Probability that a new function copies an existing one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-xmls", action="store_true", help="Do not write the NiCad-like XMLs")
+    args = parser.parse_args()
+
+    sizes = generate_workspace(args.out, args.language, args.projects, args.files, args.functions,
+                               args.prs, args.commits, args.clone_rate, args.seed, not args.no_xmls)
+    print(f"✅ {args.out}: {sizes}")
+
+
+if __name__ == "__main__":
+    main()
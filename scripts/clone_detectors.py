@@ -0,0 +1,436 @@
+"""
+Clone detectors of stage 6. A detector finds the function clones of a
+checked out source tree and writes them as NiCad writes its
+<project>_functions-clones-0.30-classes.xml, which stage 7 then converts:
+
+    <clones>
+      <class classid nclones nlines similarity>
+        <source file startline endline pcid/> ...
+
+- NiCadDetector runs the nicad6 chain (any language NiCad supports).
+- PythonDetector finds the clones of Python sources in process: functions
+  are extracted with ast, normalized with tokenize (one logical line per
+  line, no comments, no layout) and compared like NiCad's default
+  configuration: two functions of 6 to 2500 normalized lines are clones
+  when, for both, the lines outside their longest common subsequence are at
+  most 30% of the function (UPI threshold 0.30). Clone pairs are clustered
+  into classes.
+
+The detector is chosen with the "detector" setting of settings.ini.
+"""
+import os
+import ast
+import hashlib
+import shutil
+import tokenize
+import subprocess
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+from xml.sax.saxutils import quoteattr
+
+THRESHOLD = 0.3
+MIN_LINES = 6
+MAX_LINES = 2500
+
+
+def write_nicad_xml(path, system, classes):
+    """
+    Write the classes [(similarity, nlines, [(file, start, end, pcid), ...])]
+    in the format of NiCad's clone classes report.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<clones>\n")
+        f.write(f'<systeminfo processor="nicad6" system={quoteattr(system)} granularity="functions" '
+                f'threshold="{round(THRESHOLD * 100)}%" minlines="{MIN_LINES}" maxlines="{MAX_LINES}"/>\n')
+        f.write(f'<classinfo nclasses="{len(classes)}"/>\n')
+        for classid, (similarity, nlines, sources) in enumerate(classes, start=1):
+            f.write(f'<class classid="{classid}" nclones="{len(sources)}" nlines="{nlines}" '
+                    f'similarity="{similarity}">\n')
+            for file, start, end, pcid in sources:
+                f.write(f'<source file={quoteattr(file)} startline="{start}" endline="{end}" '
+                        f'pcid="{pcid}"></source>\n')
+            f.write("</class>\n")
+        f.write("</clones>\n")
+
+
+class CloneDetector:
+    """Finds the clones of a source tree."""
+
+    name = None
+    extensions = None  # languages (extensions of languages.py) it supports, None for any
+
+    def detect(self, source_dir, language, output_xml):
+        """Write the clone classes of source_dir (files of the language) to output_xml."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==========================================
+# NiCad
+# ==========================================
+def remove_logs_and_xml_files(directory):
+    for file_name in os.listdir(directory):
+        file_path = os.path.join(directory, file_name)
+
+        if os.path.isfile(file_path) and (file_name.endswith(".log") or file_name.endswith(".xml")):
+            try:
+                os.remove(file_path)
+            except Exception as e:
+                print(f"Remove error {file_path}: {e}")
+
+
+class NiCadDetector(CloneDetector):
+    """
+    nicad6 on the folder. NiCad writes its results and logs next to the
+    folder, in <folder>_functions-clones/ and the parent folder, which are
+    cleaned afterwards; two runs must not share a parent folder.
+    """
+
+    name = "nicad"
+
+    def __init__(self, nicad_dir=None):
+        # By default NiCad sits two levels above the repository: <workspace>/NiCad
+        self.nicad_dir = nicad_dir
+
+    def detect(self, source_dir, language, output_xml):
+        nicad_dir = self.nicad_dir or os.path.join(source_dir, "..", "..", "NiCad")
+        print(" >>> Running nicad6...")
+        subprocess.run(["./nicad6", "functions", language, source_dir], cwd=nicad_dir, check=True)
+
+        project = os.path.basename(source_dir.rstrip("/"))
+        clones_dir = f"{source_dir}_functions-clones"
+        shutil.move(f"{clones_dir}/{project}_functions-clones-0.30-classes.xml", output_xml)
+        shutil.rmtree(clones_dir, ignore_errors=True)
+        remove_logs_and_xml_files(os.path.dirname(os.path.abspath(source_dir)))
+
+
+# ==========================================
+# Python, in process
+# ==========================================
+def logical_lines(source):
+    """[(first row, normalized text)] of every logical line, without comments and layout."""
+    lines = []
+    tokens = []
+    row = None
+    readline = iter(source.splitlines(keepends=True)).__next__
+    for token in tokenize.generate_tokens(readline):
+        if token.type in (tokenize.COMMENT, tokenize.NL, tokenize.INDENT, tokenize.DEDENT,
+                          tokenize.ENDMARKER):
+            continue
+        if token.type == tokenize.NEWLINE:
+            if tokens:
+                lines.append((row, " ".join(tokens)))
+            tokens, row = [], None
+            continue
+        if row is None:
+            row = token.start[0]
+        tokens.append(token.string)
+    if tokens:
+        lines.append((row, " ".join(tokens)))
+    return lines
+
+
+def extract_functions(path):
+    """Functions of a Python file (see functions_of_source)."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return functions_of_source(f.read())
+
+
+def blob_ids(source_dir, paths):
+    """
+    {path: SHA of its content} for the paths. The SHAs of the files git
+    tracks unmodified come from its index (git ls-files -s); the others
+    (modified, untracked, or a source_dir outside git) are hashed as git
+    hashes blobs, so both kinds of keys agree. Unreadable paths are left out.
+    """
+    tracked = {}
+    listing = subprocess.run(["git", "-C", source_dir, "ls-files", "-s", "-z"], capture_output=True)
+    modified = subprocess.run(["git", "-C", source_dir, "ls-files", "-m", "-z"], capture_output=True)
+    if listing.returncode == 0 and modified.returncode == 0:
+        changed = set(os.fsdecode(name) for name in modified.stdout.split(b"\0") if name)
+        for entry in listing.stdout.split(b"\0"):
+            if not entry:
+                continue
+            info, name = entry.split(b"\t", 1)
+            mode, sha, _ = info.split()
+            name = os.fsdecode(name)
+            # Regular files only: the blob of a symlink is its target, a submodule has none
+            if mode in (b"100644", b"100755") and name not in changed:
+                tracked[os.path.normpath(os.path.join(source_dir, name))] = sha.decode()
+
+    ids = {}
+    for path in paths:
+        sha = tracked.get(os.path.normpath(path))
+        if sha is not None:
+            ids[path] = sha
+            continue
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            continue
+        ids[path] = hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+    return ids
+
+
+def functions_of_source(source):
+    """
+    [(start, end, normalized lines)] of every function (and method) of a
+    Python source; nested functions are fragments of their own as well.
+    Sources that do not parse give no functions, as in NiCad.
+    """
+    try:
+        tree = ast.parse(source)
+        lines = logical_lines(source)
+    except (SyntaxError, ValueError, tokenize.TokenError, RecursionError):
+        return []
+
+    rows = [row for row, _ in lines]
+    fragments = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            first = bisect_left(rows, node.lineno)
+            last = bisect_right(rows, node.end_lineno)
+            normalized = tuple(text for _, text in lines[first:last])
+            if MIN_LINES <= len(normalized) <= MAX_LINES:
+                fragments.append((node.lineno, node.end_lineno, normalized))
+    fragments.sort()
+    return fragments
+
+
+def lcs_length(a, b):
+    """Length of the longest common subsequence of two sequences (bit-parallel)."""
+    if len(a) < len(b):
+        a, b = b, a
+    masks = {}
+    for i, item in enumerate(a):
+        masks[item] = masks.get(item, 0) | (1 << i)
+    all_ones = (1 << len(a)) - 1
+    v = all_ones
+    for item in b:
+        u = v & masks.get(item, 0)
+        v = ((v + u) | (v - u)) & all_ones
+    return len(a) - bin(v).count("1")
+
+
+def allowed_unique(size, threshold):
+    """Most lines of a fragment of `size` lines that can be outside the LCS."""
+    return int(threshold * size + 1e-9)  # 0.3 * 30 is 8.999...
+
+
+def upi_similarity(a, b, threshold=THRESHOLD):
+    """
+    NiCad's similarity (percent) of two fragments given as lines, or None
+    when they are not clones under the UPI threshold.
+    """
+    common = lcs_length(a, b)
+    if len(a) - common > allowed_unique(len(a), threshold) or \
+            len(b) - common > allowed_unique(len(b), threshold):
+        return None
+    upi = max((len(a) - common) / len(a), (len(b) - common) / len(b))
+    return int(round((1 - upi) * 100))
+
+
+def find_clone_pairs(fragments, threshold=THRESHOLD):
+    """
+    {(i, j): similarity} of the fragments [(file, start, end, line ids)]
+    that are clones under the UPI threshold.
+
+    Candidates come from prefix filtering: two fragments can only reach the
+    common lines they need if they share one of the rarest lines of each,
+    so only those pairs are compared, first by line counts, then by LCS.
+    """
+    # Lines as tokens (line, occurrence), so repeated lines count once per occurrence
+    tokens = []
+    for _, _, _, lines in fragments:
+        seen = Counter()
+        fragment_tokens = []
+        for line in lines:
+            fragment_tokens.append((line, seen[line]))
+            seen[line] += 1
+        tokens.append(fragment_tokens)
+
+    frequency = Counter(token for fragment_tokens in tokens for token in fragment_tokens)
+    index = defaultdict(list)
+    pairs = {}
+    order = sorted(range(len(fragments)), key=lambda i: len(fragments[i][3]))
+
+    for i in order:
+        lines_i = fragments[i][3]
+        size_i = len(lines_i)
+        needed = size_i - allowed_unique(size_i, threshold)  # common lines needed by i
+        prefix = sorted(tokens[i], key=lambda token: (frequency[token], token))[:size_i - needed + 1]
+
+        candidates = set()
+        for token in prefix:
+            candidates.update(index[token])
+            index[token].append(i)
+
+        file_i, start_i, end_i, _ = fragments[i]
+        counts_i = None
+        for j in candidates:
+            file_j, start_j, end_j, lines_j = fragments[j]
+            size_j = len(lines_j)  # <= size_i, fragments come by size
+            if size_j < needed:
+                continue
+            if file_i == file_j and start_i <= end_j and start_j <= end_i:
+                continue  # a function and a function nested in it
+            if counts_i is None:
+                counts_i = Counter(lines_i)
+            overlap = sum((counts_i & Counter(lines_j)).values())
+            if overlap < needed or overlap < size_j - allowed_unique(size_j, threshold):
+                continue
+            similarity = upi_similarity(lines_i, lines_j, threshold)
+            if similarity is not None:
+                pairs[(min(i, j), max(i, j))] = similarity
+    return pairs
+
+
+def cluster_pairs(fragments, pairs):
+    """
+    Clone classes [(similarity, nlines, [(file, start, end, pcid)])]: the
+    connected groups of clone pairs, with the lowest pair similarity of the
+    group and its average number of normalized lines.
+    """
+    parent = list(range(len(fragments)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        parent[find(i)] = find(j)
+
+    members = defaultdict(set)
+    similarity = {}
+    for (i, j), value in pairs.items():
+        root = find(i)
+        members[root].update((i, j))
+        similarity[root] = min(similarity.get(root, 100), value)
+
+    classes = []
+    for root, group in members.items():
+        group = sorted(group, key=lambda k: fragments[k][:3])
+        nlines = round(sum(len(fragments[k][3]) for k in group) / len(group))
+        sources = [(fragments[k][0], fragments[k][1], fragments[k][2], k + 1) for k in group]
+        classes.append((similarity[root], nlines, sources))
+    classes.sort(key=lambda c: c[2][0][:3])
+    return classes
+
+
+class PythonDetector(CloneDetector):
+    """
+    Clones of Python functions, found in process. Functions are extracted by
+    `workers` processes, and the functions of files whose content the
+    previous snapshot already had (same blob SHA, see blob_ids) are reused.
+    """
+
+    name = "python"
+    extensions = {"py"}
+
+    def __init__(self, workers=1, threshold=THRESHOLD):
+        self.workers = workers
+        self.threshold = threshold
+        self.pool = None
+        self.cache = {}  # blob SHA -> functions, of the last snapshot
+
+    def source_files(self, source_dir, language):
+        suffix = f".{language}"
+        for root, dirs, files in os.walk(source_dir):
+            dirs[:] = sorted(d for d in dirs if d != ".git")
+            for name in sorted(files):
+                if name.endswith(suffix):
+                    yield os.path.join(root, name)
+
+    def extract(self, source_dir, paths):
+        """{path: functions}, from the cache or the workers."""
+        ids = blob_ids(source_dir, paths)
+        functions = {}
+        pending = {}  # blob SHA -> a path with that content
+        for path, sha in ids.items():
+            if sha in self.cache:
+                functions[path] = self.cache[sha]
+            else:
+                pending.setdefault(sha, path)
+
+        if self.workers > 1 and len(pending) > 1:
+            if self.pool is None:
+                self.pool = Pool(self.workers)
+            results = self.pool.map(extract_functions, list(pending.values()), chunksize=8)
+        else:
+            results = [extract_functions(path) for path in pending.values()]
+
+        extracted = dict(zip(pending, results))
+        for path, sha in ids.items():
+            if path not in functions:
+                functions[path] = extracted[sha]
+        # Snapshots are checked out in order: only the last one's blobs are worth keeping
+        self.cache = {sha: functions[path] for path, sha in ids.items()}
+        return functions
+
+    def find_classes(self, source_dir, language):
+        functions = self.extract(source_dir, list(self.source_files(source_dir, language)))
+
+        # Lines as small integers: cheaper to hash and compare than the text
+        line_ids = {}
+        fragments = []
+        for path in sorted(functions):
+            for start, end, lines in functions[path]:
+                ids = tuple(line_ids.setdefault(line, len(line_ids)) for line in lines)
+                fragments.append((path, start, end, ids))
+
+        return cluster_pairs(fragments, find_clone_pairs(fragments, self.threshold))
+
+    def detect(self, source_dir, language, output_xml):
+        if language not in self.extensions:
+            raise ValueError(f"The python detector only supports Python sources, not .{language}")
+        classes = self.find_classes(source_dir, language)
+        write_nicad_xml(output_xml, os.path.basename(source_dir.rstrip("/")), classes)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+def minhash_detector(workers):
+    # minhash_index builds on the extraction and matching of this module
+    from minhash_index import MinHashDetector
+    return MinHashDetector(workers=workers)
+
+
+# name -> factory taking the number of workers
+DETECTORS = {
+    "nicad": lambda workers: NiCadDetector(),
+    "python": lambda workers: PythonDetector(workers=workers),
+    "minhash": minhash_detector,
+}
+
+
+def detector_from_settings(settings, language):
+    """
+    The detector of settings.ini: "nicad" (default), "python", "minhash", or
+    "auto" (python for Python sources, NiCad otherwise).
+    """
+    name = settings.get("detector", fallback="nicad").strip().lower()
+    if name == "auto":
+        name = "python" if language in PythonDetector.extensions else "nicad"
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}' (options: auto, {', '.join(DETECTORS)})")
+
+    detector = DETECTORS[name](settings.getint("detector_workers", fallback=1))
+    if detector.extensions is not None and language not in detector.extensions:
+        raise ValueError(f"The {name} detector only supports Python sources, not .{language}")
+    return detector
@@ -0,0 +1,151 @@
+import os
+import xml.etree.ElementTree as ET
+from artifact_io import open_artifact, strip_compression
+
+# pyarrow is optional: without it the pipeline keeps using only the XMLs
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# One row per clone fragment (<block>). Fingerprints and file paths repeat a
+# lot inside a snapshot, so they are dictionary-encoded.
+if HAS_PYARROW:
+    SNAPSHOT_SCHEMA = pa.schema([
+        ("set_id", pa.int32()),
+        ("fingerprint", pa.dictionary(pa.int32(), pa.string())),
+        ("line_count", pa.int32()),
+        ("similarity", pa.int16()),
+        ("source_file", pa.dictionary(pa.int32(), pa.string())),
+        ("start_line", pa.int32()),
+        ("end_line", pa.int32()),
+    ])
+
+# Blocks buffered before a row group is flushed (keeps memory bounded)
+ROW_GROUP_SIZE = 50_000
+
+
+def snapshot_table_path(xml_path):
+    """Columnar file that sits next to a search_results XML (compressed or not)."""
+    return os.path.splitext(strip_compression(xml_path))[0] + ".parquet"
+
+
+class SnapshotWriter:
+    """Write the sets of one snapshot incrementally to a Parquet file."""
+
+    def __init__(self, table_path):
+        self.table_path = table_path
+        self._writer = pq.ParquetWriter(table_path, SNAPSHOT_SCHEMA, compression="zstd")
+        self._columns = {name: [] for name in SNAPSHOT_SCHEMA.names}
+        self._set_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_set(self, fingerprint, line_count, similarity, blocks):
+        """blocks is a list of (source_file, start_line, end_line)."""
+        self._set_id += 1
+        for source_file, start_line, end_line in blocks:
+            self._columns["set_id"].append(self._set_id)
+            self._columns["fingerprint"].append(fingerprint)
+            self._columns["line_count"].append(int(line_count))
+            self._columns["similarity"].append(int(similarity))
+            self._columns["source_file"].append(source_file)
+            self._columns["start_line"].append(int(start_line))
+            self._columns["end_line"].append(int(end_line))
+
+        if len(self._columns["set_id"]) >= ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        batch = pa.RecordBatch.from_pydict(self._columns, schema=SNAPSHOT_SCHEMA)
+        self._writer.write_batch(batch)
+        self._columns = {name: [] for name in SNAPSHOT_SCHEMA.names}
+
+    def close(self):
+        if self._writer is None:
+            return
+        # Always write once so empty snapshots still get a valid file
+        if self._columns["set_id"] or self._set_id == 0:
+            self._flush()
+        self._writer.close()
+        self._writer = None
+
+
+def write_snapshot_from_xml(xml_path, table_path=None):
+    """
+    Build the columnar file from an XML already in the generic <clones>
+    format, streaming its <set> elements.
+    """
+    table_path = table_path or snapshot_table_path(xml_path)
+
+    with SnapshotWriter(table_path) as writer, open_artifact(xml_path, "rb") as f:
+        root = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag != "set":
+                continue
+
+            blocks = [
+                (b.get("sourceFile"), b.get("startLineNumber"), b.get("endLineNumber"))
+                for b in elem.findall("block")
+            ]
+            writer.add_set(
+                elem.get("fingerprint"),
+                elem.get("lineCount", "0"),
+                elem.get("similarity", "100"),
+                blocks
+            )
+            root.clear()
+
+    return table_path
+
+
+def read_snapshot(table_path, columns=None):
+    """
+    Load a snapshot file straight into numpy arrays (one per column).
+    Dictionary-encoded columns are decoded with a single take over their
+    dictionary, so no per-row Python work is done.
+    """
+    table = pq.read_table(table_path, columns=columns)
+    arrays = {}
+
+    for name in table.column_names:
+        column = table.column(name).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            values = column.dictionary.to_numpy(zero_copy_only=False)
+            codes = column.indices.to_numpy(zero_copy_only=False)
+            arrays[name] = values[codes]
+        else:
+            arrays[name] = column.to_numpy(zero_copy_only=False)
+
+    return arrays
+
+
+def find_blocks(table_path, fingerprint):
+    """List (source_file, start_line, end_line) of the set with this fingerprint."""
+    table = pq.read_table(
+        table_path,
+        columns=["set_id", "source_file", "start_line", "end_line"],
+        filters=[("fingerprint", "=", fingerprint)]
+    )
+    if table.num_rows == 0:
+        return []
+
+    # The same fingerprint may label several sets; keep the first one
+    rows = table.to_pydict()
+    first_set = rows["set_id"][0]
+    return [
+        (src, str(start), str(end))
+        for set_id, src, start, end in zip(rows["set_id"], rows["source_file"],
+                                           rows["start_line"], rows["end_line"])
+        if set_id == first_set
+    ]
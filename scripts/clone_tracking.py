@@ -0,0 +1,257 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+
+
+class InstanceInterner:
+    """
+    Dictionary of clone instances for one project: every distinct
+    (fingerprint, source_file, start_line, end_line) gets an integer id, so
+    snapshots can be held as sorted int64 arrays.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self.fingerprints = []
+        self.source_files = []
+        self.start_lines = []
+        self.end_lines = []
+        # Source files are numbered too, to select instances by file with numpy
+        self._file_codes = {}
+        self._instance_file_codes = []
+        self._file_code_array = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def intern(self, fingerprints, source_files, start_lines, end_lines):
+        """Ids of the given instances, as a sorted array without duplicates."""
+        out = np.empty(len(fingerprints), dtype=np.int64)
+
+        for i, key in enumerate(zip(fingerprints, source_files, start_lines, end_lines)):
+            out[i] = self.intern_key(key)
+
+        return np.unique(out)
+
+    def intern_key(self, key):
+        """Id of one (fingerprint, source_file, start_line, end_line)."""
+        instance_id = self._ids.get(key)
+        if instance_id is None:
+            instance_id = len(self.fingerprints)
+            self._ids[key] = instance_id
+            self.fingerprints.append(key[0])
+            self.source_files.append(key[1])
+            self.start_lines.append(key[2])
+            self.end_lines.append(key[3])
+            self._instance_file_codes.append(
+                self._file_codes.setdefault(key[1], len(self._file_codes))
+            )
+        return instance_id
+
+    def key(self, instance_id):
+        return (
+            self.fingerprints[instance_id],
+            self.source_files[instance_id],
+            self.start_lines[instance_id],
+            self.end_lines[instance_id],
+        )
+
+    def file_codes(self, source_files):
+        """Codes of the given files (files never seen are left out)."""
+        return np.array(
+            [self._file_codes[f] for f in source_files if f in self._file_codes],
+            dtype=np.int64
+        )
+
+    def instance_file_codes(self):
+        """File code of every interned instance, indexable by id."""
+        if self._file_code_array.size != len(self._instance_file_codes):
+            self._file_code_array = np.asarray(self._instance_file_codes, dtype=np.int64)
+        return self._file_code_array
+
+    def decode(self, ids):
+        """Columns (fingerprint, source_file, start_line, end_line) for an id array."""
+        return {
+            "clone_fingerprint": np.asarray(self.fingerprints, dtype=object)[ids],
+            "source_file": np.asarray(self.source_files, dtype=object)[ids],
+            "start_line": np.asarray(self.start_lines, dtype=np.int64)[ids],
+            "end_line": np.asarray(self.end_lines, dtype=np.int64)[ids],
+        }
+
+
+class SnapshotCache:
+    """
+    Bounded LRU of parsed snapshots (sorted id arrays). Keys are tree SHAs
+    when known, content hashes of the result file otherwise, so a snapshot
+    shared by consecutive commits or by PRs with the same base is parsed once.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_load(self, key, loader):
+        """Cached value for key, calling loader() on a miss."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        self.misses += 1
+        value = loader()
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+
+def content_key(path, chunk_size=1024 * 1024):
+    """Cache key from the bytes of a result file (cheaper than parsing it)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return ("content", digest.hexdigest())
+
+
+def map_range(hunks, start, end):
+    """
+    Where the lines start..end of the old file are in the new file, given the
+    diff hunks (old_start, old_count, new_start, new_count) of that file.
+    None when a hunk removes or inserts lines inside the range.
+    """
+    shift = 0
+    for old_start, old_count, _, new_count in hunks:
+        if old_count == 0:
+            # Pure insertion after old line old_start
+            if old_start < start:
+                shift += new_count
+            elif old_start < end:
+                return None
+            else:
+                break
+        else:
+            old_end = old_start + old_count - 1
+            if old_end < start:
+                shift += new_count - old_count
+            elif old_start > end:
+                break
+            else:
+                return None
+    return start + shift, end + shift
+
+
+def carry_forward(ids, changes, repo_prefix, interner):
+    """
+    Move instance ids across one commit using its diff hunks (see
+    git_objects.diff_hunks). Instances in files the diff did not touch keep
+    their id without being looked at; the others get the id of their shifted
+    (or renamed) location, or keep their old id when their own lines changed.
+    The work is proportional to the instances in touched files.
+    """
+    if not changes or ids.size == 0:
+        return ids
+
+    touched = {repo_prefix + path: (new_path, hunks) for path, (new_path, hunks) in changes.items()}
+    touched_codes = interner.file_codes(touched)
+    if touched_codes.size == 0:
+        return ids
+
+    in_touched = np.isin(interner.instance_file_codes()[ids], touched_codes)
+    if not in_touched.any():
+        return ids
+
+    out = ids.copy()
+    for pos in np.flatnonzero(in_touched):
+        fp, source_file, start, end = interner.key(ids[pos])
+        new_path, hunks = touched[source_file]
+        if new_path is None:
+            continue  # file deleted
+        new_range = map_range(hunks, start, end)
+        if new_range is not None:
+            out[pos] = interner.intern_key((fp, repo_prefix + new_path, *new_range))
+    return out
+
+
+def track_pr(snapshots, carries=None):
+    """
+    Lifetimes of the clone instances of one PR.
+
+    snapshots is the commit-ordered list of (number_commit, parent_ids,
+    child_ids), ids being sorted arrays from InstanceInterner.intern.
+    An instance is born in a commit when it is in the child but not in the
+    parent, and dies at the first later commit whose child no longer has it.
+    Instances still alive after the last commit end there.
+
+    carries, when given, holds one (carry_active, carry_parent) pair per
+    commit: functions moving ids from the previous child (active instances)
+    and from the parent into the child's line numbers (see carry_forward),
+    or None to compare ids as they are. An instance that only moved keeps
+    its lifetime; it is reported with the location where it was born.
+
+    Returns columns as arrays: instance_id, start_commit, end_commit.
+    """
+    # Current location of each active instance, and where it was born
+    active_ids = EMPTY_IDS
+    active_birth = EMPTY_IDS
+    active_start = EMPTY_IDS
+
+    out_ids, out_start, out_end = [], [], []
+
+    for i, (number_commit, parent_ids, child_ids) in enumerate(snapshots):
+        carry_active, carry_parent = carries[i] if carries else (None, None)
+
+        if carry_active is not None and active_ids.size:
+            active_ids = carry_active(active_ids)
+
+        # Two instances moved onto the same location: keep the first one
+        _, first = np.unique(active_ids, return_index=True)
+        alive = np.zeros(active_ids.size, dtype=bool)
+        alive[first] = True
+
+        # --- A. DEATHS: active instances missing from the child ---
+        alive &= np.isin(active_ids, child_ids)
+        if not alive.all():
+            dead = ~alive
+            out_ids.append(active_birth[dead])
+            out_start.append(active_start[dead])
+            # Died before this commit
+            out_end.append(np.full(dead.sum(), number_commit - 1, dtype=np.int64))
+            active_ids = active_ids[alive]
+            active_birth = active_birth[alive]
+            active_start = active_start[alive]
+
+        # --- B. BIRTHS: in the child but not in the parent, and not already tracked ---
+        if carry_parent is not None and parent_ids.size:
+            parent_ids = np.unique(carry_parent(parent_ids))
+        born = np.setdiff1d(child_ids, parent_ids, assume_unique=True)
+        born = np.setdiff1d(born, active_ids, assume_unique=True)
+        if born.size:
+            active_ids = np.concatenate([active_ids, born])
+            active_birth = np.concatenate([active_birth, born])
+            active_start = np.concatenate([
+                active_start, np.full(born.size, number_commit, dtype=np.int64)
+            ])
+
+    # --- C. CLOSE INSTANCES THAT SURVIVED UNTIL THE END OF THE PR ---
+    if active_ids.size and snapshots:
+        last_commit = max(number_commit for number_commit, _, _ in snapshots)
+        out_ids.append(active_birth)
+        out_start.append(active_start)
+        out_end.append(np.full(active_ids.size, last_commit, dtype=np.int64))
+
+    if not out_ids:
+        return {"instance_id": EMPTY_IDS, "start_commit": EMPTY_IDS, "end_commit": EMPTY_IDS}
+
+    return {
+        "instance_id": np.concatenate(out_ids),
+        "start_commit": np.concatenate(out_start),
+        "end_commit": np.concatenate(out_end),
+    }
@@ -0,0 +1,136 @@
+import os
+import csv
+from collections import defaultdict
+
+# Motor único de relatórios: lê cada CSV classificado uma única vez (em stream)
+# e calcula todas as contagens usadas pelos scripts de count_results.
+
+# Pasta onde estão os CSVs
+BASE_DIR = "clones_classified"
+SUFFIX = "_clone_classified.csv"
+
+# Categorias consideradas unique (as demais são recorrentes)
+UNIQUE_PREFIX = "unique"
+
+
+class CloneReport:
+    """Acumula as contagens linha a linha, sem guardar as linhas."""
+
+    def __init__(self):
+        # Por projeto
+        self.prs_by_project = defaultdict(set)
+        self.clones_by_project = defaultdict(int)  # soma das recorrências
+        self.fingerprints_by_project = defaultdict(set)
+
+        # Globais
+        self.prs_unique = set()
+        self.prs_recurrent = set()
+        self.unique_fingerprints = set()
+        self.prs_by_category = defaultdict(set)
+
+    def add_project(self, project):
+        """Registra o projeto mesmo que o CSV dele não tenha linhas (aparece com 0)."""
+        self.prs_by_project.setdefault(project, set())
+        self.clones_by_project.setdefault(project, 0)
+        self.fingerprints_by_project.setdefault(project, set())
+
+    def add(self, project, row):
+        """project é o do nome do arquivo; as classes de PR usam a coluna "project"."""
+        pr = row["pr"]
+        fingerprint = row["clone_fingerprint"]
+        category = row["category"].strip().lower()
+        recurrence = int(row["end_commit"]) - int(row["start_commit"]) + 1
+
+        self.prs_by_project[project].add(pr)
+        self.clones_by_project[project] += recurrence
+        self.fingerprints_by_project[project].add(fingerprint)
+
+        key = (row["project"], pr)
+        self.unique_fingerprints.add(fingerprint)
+        self.prs_by_category[category].add(key)
+
+        # Classificação da PR
+        if category.startswith(UNIQUE_PREFIX):
+            self.prs_unique.add(key)
+        else:
+            self.prs_recurrent.add(key)
+
+    # --- Resultados ---------------------------------------------------
+    def intersection(self):
+        return self.prs_unique & self.prs_recurrent
+
+    def pr_classes(self):
+        intersection = self.intersection()
+        return {
+            "unique": len(self.prs_unique - intersection),
+            "recurrent": len(self.prs_recurrent - intersection),
+            "intersection": len(intersection),
+        }
+
+    def category_counts(self):
+        """Número de PRs distintas por categoria, da maior para a menor."""
+        counts = [(category, len(prs)) for category, prs in self.prs_by_category.items()]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+
+def classified_files(projects=None, base_dir=BASE_DIR):
+    """
+    (projeto, caminho) de cada CSV classificado: dos projetos informados, na
+    ordem deles, ou de todos os arquivos da pasta.
+    """
+    if projects is None:
+        names = sorted(f for f in os.listdir(base_dir) if f.endswith(SUFFIX))
+        return [(name[:-len(SUFFIX)], os.path.join(base_dir, name)) for name in names]
+
+    files = []
+    for project in projects:
+        path = os.path.join(base_dir, project + SUFFIX)
+        if not os.path.exists(path):
+            print(f"Arquivo não encontrado para o projeto {project}: {path}")
+            continue
+        files.append((project, path))
+    return files
+
+
+def build_report(files):
+    """
+    Uma única passada por todos os arquivos. Um projeto repetido na lista é
+    contado uma vez só.
+    """
+    report = CloneReport()
+    for project, path in dict.fromkeys(files):
+        report.add_project(project)
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                report.add(project, row)
+    return report
+
+
+def print_projects(report):
+    print("=== PRs únicos afetados por projeto ===")
+    for project, prs in report.prs_by_project.items():
+        print(f"{project}: {len(prs)} PRs únicos")
+
+    print("\n=== Total de clones (com recorrência) por projeto ===")
+    for project, total in report.clones_by_project.items():
+        print(f"{project}: {total} clones")
+
+    print("\n===============================================")
+    print("TOTAL FINAL DE PRs ÚNICOS AFETADOS:", sum(len(prs) for prs in report.prs_by_project.values()))
+    print("TOTAL FINAL DE CLONES (COM RECORRÊNCIA):", sum(report.clones_by_project.values()))
+    print("===============================================")
+
+
+def print_pr_classes(report):
+    classes = report.pr_classes()
+    print("=== RESULTADOS FINAIS ===")
+    print(f"PRs Únicas: {classes['unique']}")
+    print(f"PRs Recorrentes: {classes['recurrent']}")
+    print(f"PRs Interseção (ambas): {classes['intersection']}")
+    print(f"Clones únicos (fingerprints únicos): {len(report.unique_fingerprints)}")
+
+
+def print_categories(report):
+    print("=== PRs por categoria ===")
+    for category, n in report.category_counts():
+        print(f"{category}: {n}")
@@ -0,0 +1,47 @@
+import os
+import csv
+import sys
+from clone_report import build_report, classified_files, print_projects, print_pr_classes, print_categories
+
+# Todos os relatórios de count_results numa única leitura dos CSVs classificados.
+# Uso (da pasta scripts): python3 count_results/report_all.py
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from paths import summary_path
+
+report = build_report(classified_files())
+
+print_projects(report)
+print()
+print_pr_classes(report)
+print()
+print_categories(report)
+
+# --- Salvar os relatórios ---
+os.makedirs(summary_path, exist_ok=True)
+
+projects_csv = os.path.join(summary_path, "report_projects.csv")
+with open(projects_csv, "w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow(["project", "unique_prs", "clones_with_recurrence", "distinct_fingerprints"])
+    for project, prs in report.prs_by_project.items():
+        writer.writerow([
+            project, len(prs), report.clones_by_project[project],
+            len(report.fingerprints_by_project[project])
+        ])
+
+classes_csv = os.path.join(summary_path, "report_pr_classes.csv")
+with open(classes_csv, "w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow(["type", "count"])
+    for name, n in report.pr_classes().items():
+        writer.writerow([name, n])
+    writer.writerow(["distinct_fingerprints", len(report.unique_fingerprints)])
+
+categories_csv = os.path.join(summary_path, "report_pr_by_category.csv")
+with open(categories_csv, "w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    writer.writerow(["type", "count"])
+    writer.writerows(report.category_counts())
+
+print(f"\n✅ Relatórios salvos em: {projects_csv}, {classes_csv}, {categories_csv}")
@@ -0,0 +1,150 @@
+import os
+import json
+import sqlite3
+import xml.etree.ElementTree as ET
+from artifact_io import detect_compression, open_artifact, strip_compression
+from paths import search_results_path
+
+# Lives next to the XMLs it indexes
+INDEX_PATH = os.path.join(search_results_path, "fingerprint_index.sqlite")
+
+# WAL lets readers and writers work concurrently, but it needs shared memory:
+# shard workers, whose workspaces are on a shared filesystem, set "delete"
+JOURNAL_MODE = os.environ.get("LIFECYCLE_SQLITE_JOURNAL", "wal")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS sets (
+    fingerprint TEXT NOT NULL,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    set_offset INTEGER NOT NULL,
+    blocks TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sets_by_fingerprint ON sets (fingerprint, snapshot_id);
+CREATE INDEX IF NOT EXISTS sets_by_snapshot ON sets (snapshot_id);
+"""
+
+
+def snapshot_name(xml_path):
+    """Key of a snapshot: its XML file name without compression extension."""
+    return os.path.basename(strip_compression(xml_path))
+
+
+class FingerprintIndex:
+    """
+    Persistent fingerprint -> (snapshot, set byte offset, blocks) table, so a
+    clone set can be found without parsing any XML. The offset is the
+    position of the <set> tag in the uncompressed generic XML (see
+    read_set_at); blocks is the list of (source_file, start_line, end_line).
+    Written by stage 7 (one transaction per snapshot); readers can open it
+    concurrently.
+    """
+
+    def __init__(self, path=INDEX_PATH, readonly=False):
+        self.path = path
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=60)
+        else:
+            # Several stage 7 runs (one per project) may write at the same time
+            self._conn = sqlite3.connect(path, timeout=60)
+            self._conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+            self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def indexed_snapshots(self):
+        return {name for (name,) in self._conn.execute("SELECT name FROM snapshots")}
+
+    def add_snapshot(self, xml_path, entries):
+        """Replace the sets of one snapshot; entries are (fingerprint, offset, blocks)."""
+        name = snapshot_name(xml_path)
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO snapshots (name) VALUES (?)", (name,))
+            (snapshot_id,) = self._conn.execute(
+                "SELECT id FROM snapshots WHERE name = ?", (name,)
+            ).fetchone()
+            self._conn.execute("DELETE FROM sets WHERE snapshot_id = ?", (snapshot_id,))
+            self._conn.executemany(
+                "INSERT INTO sets (fingerprint, snapshot_id, set_offset, blocks) VALUES (?, ?, ?, ?)",
+                [(fp, snapshot_id, offset, json.dumps(blocks)) for fp, offset, blocks in entries]
+            )
+
+    def lookup(self, fingerprint, xml_path=None):
+        """
+        List of (snapshot name, set offset, blocks) for the fingerprint, in
+        every snapshot or only in the snapshot of xml_path.
+        """
+        query = (
+            "SELECT snapshots.name, sets.set_offset, sets.blocks FROM sets "
+            "JOIN snapshots ON snapshots.id = sets.snapshot_id WHERE sets.fingerprint = ?"
+        )
+        params = [fingerprint]
+        if xml_path is not None:
+            query += " AND snapshots.name = ?"
+            params.append(snapshot_name(xml_path))
+        query += " ORDER BY snapshots.name, sets.set_offset"
+
+        return [
+            (name, offset, [tuple(block) for block in json.loads(blocks)])
+            for name, offset, blocks in self._conn.execute(query, params)
+        ]
+
+
+def scan_set_offsets(xml_path):
+    """
+    (fingerprint, offset, blocks) of every set of a generic XML, reading it
+    line by line (the generic layout has one tag per line).
+    """
+    entries = []
+    offset = 0
+    current = None
+
+    with open_artifact(xml_path, "rb") as f:
+        for line in f:
+            tag = line.strip()
+            if tag.startswith(b"<set "):
+                node = ET.fromstring(tag + b"</set>")
+                current = (node.get("fingerprint"), offset, [])
+                entries.append(current)
+            elif tag.startswith(b"<block ") and current is not None:
+                node = ET.fromstring(tag)
+                current[2].append((
+                    node.get("sourceFile"), node.get("startLineNumber"), node.get("endLineNumber")
+                ))
+            offset += len(line)
+
+    return entries
+
+
+def read_set_at(xml_path, offset):
+    """Text of the <set> element that starts at offset, without parsing the rest."""
+    with open_artifact(xml_path, "rb") as f:
+        if detect_compression(xml_path) is None:
+            f.seek(offset)
+        else:
+            # Compressed streams cannot seek: skip the bytes before the set
+            remaining = offset
+            while remaining:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+
+        lines = []
+        for line in f:
+            lines.append(line)
+            if line.strip() == b"</set>":
+                break
+    return b"".join(lines).decode("utf-8")
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Repository-wide clone genealogy: for every project, the intervals of the
+merged commit order in which each clone fingerprint is present, so clones can
+be followed across PRs (the tracker of stage 8 starts over at every PR).
+
+The merged commit order lists the commits of all PRs of a project by merge
+date of their PR, then PR number, then commit number. Position i is the child
+snapshot of the i-th commit in that order. The base branch of a PR is the
+parent snapshot of its first commit.
+
+Build (after 7_parser_clones.py):
+    python3 genealogy_index.py
+
+Query:
+    python3 genealogy_index.py --project X --fingerprint FP --after-pr 30
+    python3 genealogy_index.py --project X --fingerprint FP --base-of-pr 12
+    python3 genealogy_index.py --project X --alive-after-pr 30
+"""
+import os
+import bisect
+import argparse
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from tracking_operations import extract_clone_columns
+from paths import metadata_path, search_results_path, genealogy_path, load_projects
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed integer intervals
+    [start, end], each carrying a value. Answers "which intervals contain
+    this point / overlap this range" without scanning all of them.
+    """
+
+    def __init__(self, starts, ends, values):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.values = np.asarray(values, dtype=object)
+        self._root = self._build(np.arange(self.starts.size))
+
+    def __len__(self):
+        return self.starts.size
+
+    def _build(self, idx):
+        if idx.size == 0:
+            return None
+
+        # Median of the interval midpoints keeps the tree balanced
+        center = int(np.median((self.starts[idx] + self.ends[idx]) // 2))
+        left = idx[self.ends[idx] < center]
+        right = idx[self.starts[idx] > center]
+        here = idx[(self.starts[idx] <= center) & (self.ends[idx] >= center)]
+
+        return (
+            center,
+            here[np.argsort(self.starts[here], kind="stable")],   # by start, ascending
+            here[np.argsort(-self.ends[here], kind="stable")],    # by end, descending
+            self._build(left),
+            self._build(right),
+        )
+
+    def stab(self, point):
+        """Values of the intervals containing point."""
+        found = []
+        node = self._root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if point < center:
+                for i in by_start:
+                    if self.starts[i] > point:
+                        break
+                    found.append(self.values[i])
+                node = left
+            elif point > center:
+                for i in by_end:
+                    if self.ends[i] < point:
+                        break
+                    found.append(self.values[i])
+                node = right
+            else:
+                found.extend(self.values[by_start])
+                break
+        return found
+
+    def overlap(self, low, high):
+        """Values of the intervals sharing at least one point with [low, high]."""
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, by_start, by_end, left, right = node
+            if high < center:
+                for i in by_start:
+                    if self.starts[i] > high:
+                        break
+                    found.append(self.values[i])
+                stack.append(left)
+            elif low > center:
+                for i in by_end:
+                    if self.ends[i] < low:
+                        break
+                    found.append(self.values[i])
+                stack.append(right)
+            else:
+                found.extend(self.values[by_start])
+                stack.append(left)
+                stack.append(right)
+        return found
+
+
+def merged_commit_order(df):
+    """
+    Rows of a project metadata CSV in merged commit order, with a
+    `position` column. PRs without merge date go last.
+    """
+    df = df.copy()
+    df["merged_at"] = pd.to_datetime(df["merged_at"], errors="coerce", utc=True)
+    df = df.sort_values(["merged_at", "number_pr", "number_commit"], na_position="last", kind="stable")
+    df = df.reset_index(drop=True)
+    df["position"] = np.arange(len(df), dtype=np.int64)
+    return df
+
+
+def snapshot_fingerprints(project, pr_id, number_commit, mode):
+    """Distinct fingerprints of one snapshot, as a sorted array."""
+    xml_path = os.path.join(
+        search_results_path,
+        f"nicad-result-{project}-{pr_id}-{number_commit}-{mode}.xml"
+    )
+    fingerprints = extract_clone_columns(xml_path)[0]
+    return np.unique(np.asarray(fingerprints, dtype=str))
+
+
+class GenealogyIndex:
+    """
+    Genealogy of the clones of one project:
+      - order: one row per commit (position, number_pr, number_commit, merged_at)
+      - intervals: (clone_fingerprint, start_position, end_position), the
+        maximal runs of consecutive positions whose snapshot has the clone
+      - base: (clone_fingerprint, position) for every PR whose base branch
+        has the clone, position being the PR's first commit
+    """
+
+    def __init__(self, project, order, intervals, base):
+        self.project = project
+        self.order = order.reset_index(drop=True)
+        self.intervals = intervals
+        self.base = base
+
+        # First and last position of each PR
+        by_pr = self.order.groupby("number_pr")["position"]
+        self._pr_first = by_pr.min().to_dict()
+        self._pr_last = by_pr.max().to_dict()
+
+        # Fingerprint -> sorted starts / ends (runs never overlap)
+        self._runs = {}
+        for fp, group in intervals.groupby("clone_fingerprint", sort=False):
+            self._runs[fp] = (
+                group["start_position"].tolist(),
+                group["end_position"].tolist()
+            )
+
+        self.tree = IntervalTree(
+            intervals["start_position"].to_numpy(),
+            intervals["end_position"].to_numpy(),
+            intervals["clone_fingerprint"].to_numpy()
+        )
+
+        # Hash prefilter: most fingerprints never appear on a base branch,
+        # those are answered without looking at the positions
+        self._base_fingerprints = frozenset(base["clone_fingerprint"])
+        self._base_positions = {
+            fp: set(group["position"].tolist())
+            for fp, group in base.groupby("clone_fingerprint", sort=False)
+        }
+
+    # ------------------------------------------------------------------
+    # Build / save / load
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, project, df):
+        """Read every snapshot of the project once, in merged commit order."""
+        order = merged_commit_order(df)
+        first_positions = set(order.groupby("number_pr")["position"].min().tolist())
+
+        starts, ends, fps = [], [], []
+        open_since = {}
+        previous = np.empty(0, dtype=str)
+        base_fps, base_positions = [], []
+
+        for row in tqdm(order.itertuples(index=False), total=len(order), desc=f"Genealogy - {project}"):
+            position = row.position
+            current = snapshot_fingerprints(project, row.number_pr, row.number_commit, "child")
+
+            # Runs that ended on the previous position
+            for fp in np.setdiff1d(previous, current, assume_unique=True):
+                fps.append(fp)
+                starts.append(open_since.pop(fp))
+                ends.append(position - 1)
+            for fp in np.setdiff1d(current, previous, assume_unique=True):
+                open_since[fp] = position
+            previous = current
+
+            if position in first_positions:
+                base = snapshot_fingerprints(project, row.number_pr, row.number_commit, "parent")
+                base_fps.extend(base.tolist())
+                base_positions.extend([position] * base.size)
+
+        last_position = len(order) - 1
+        for fp, start in open_since.items():
+            fps.append(fp)
+            starts.append(start)
+            ends.append(last_position)
+
+        intervals = pd.DataFrame({
+            "clone_fingerprint": fps,
+            "start_position": np.asarray(starts, dtype=np.int64),
+            "end_position": np.asarray(ends, dtype=np.int64),
+        }).sort_values(["clone_fingerprint", "start_position"], ignore_index=True)
+
+        base = pd.DataFrame({
+            "clone_fingerprint": base_fps,
+            "position": np.asarray(base_positions, dtype=np.int64),
+        })
+
+        order = order[["position", "number_pr", "number_commit", "merged_at"]]
+        return cls(project, order, intervals, base)
+
+    @staticmethod
+    def paths(project, folder=genealogy_path):
+        return {
+            "order": os.path.join(folder, f"{project}_commit_order.csv"),
+            "intervals": os.path.join(folder, f"{project}_intervals.csv"),
+            "base": os.path.join(folder, f"{project}_base.csv"),
+        }
+
+    def save(self, folder=genealogy_path):
+        os.makedirs(folder, exist_ok=True)
+        paths = self.paths(self.project, folder)
+        self.order.to_csv(paths["order"], index=False)
+        self.intervals.to_csv(paths["intervals"], index=False)
+        self.base.to_csv(paths["base"], index=False)
+        return paths
+
+    @classmethod
+    def load(cls, project, folder=genealogy_path):
+        paths = cls.paths(project, folder)
+        return cls(
+            project,
+            pd.read_csv(paths["order"]),
+            pd.read_csv(paths["intervals"], dtype={"clone_fingerprint": str}),
+            pd.read_csv(paths["base"], dtype={"clone_fingerprint": str}),
+        )
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def runs(self, fingerprint):
+        """List of (start_position, end_position) where the clone is present."""
+        starts, ends = self._runs.get(fingerprint, ([], []))
+        return list(zip(starts, ends))
+
+    def present_at(self, fingerprint, position):
+        starts, ends = self._runs.get(fingerprint, ([], []))
+        i = bisect.bisect_right(starts, position) - 1
+        return i >= 0 and ends[i] >= position
+
+    def introduced_in(self, fingerprint):
+        """(number_pr, number_commit) where the clone first appears, or None."""
+        starts, _ = self._runs.get(fingerprint, ([], []))
+        if not starts:
+            return None
+        row = self.order.iloc[starts[0]]
+        return int(row["number_pr"]), int(row["number_commit"])
+
+    def survives_pr(self, fingerprint, pr_id):
+        """Whether the clone is still present once pr_id is merged (its last commit)."""
+        if pr_id not in self._pr_last:
+            return False
+        return self.present_at(fingerprint, self._pr_last[pr_id])
+
+    def last_seen_after(self, fingerprint, position):
+        """Last position of the run that contains position, or None."""
+        starts, ends = self._runs.get(fingerprint, ([], []))
+        i = bisect.bisect_right(starts, position) - 1
+        if i >= 0 and ends[i] >= position:
+            return ends[i]
+        return None
+
+    def on_base_of(self, fingerprint, pr_id):
+        """Whether the clone already existed on the base branch of pr_id."""
+        if fingerprint not in self._base_fingerprints:
+            return False
+        return self._pr_first.get(pr_id) in self._base_positions[fingerprint]
+
+    def pre_existing(self, fingerprint):
+        """Whether the clone was on a base branch before it appeared in any PR."""
+        if fingerprint not in self._base_fingerprints:
+            return False
+        first_base = min(self._base_positions[fingerprint])
+        starts, _ = self._runs.get(fingerprint, ([], []))
+        return not starts or first_base <= starts[0]
+
+    def alive_at(self, position):
+        """Fingerprints present at position (interval tree stabbing query)."""
+        return sorted(self.tree.stab(position))
+
+    def alive_after_pr(self, pr_id):
+        if pr_id not in self._pr_last:
+            return []
+        return self.alive_at(self._pr_last[pr_id])
+
+    def present_between(self, first_position, last_position):
+        """Fingerprints present at some position of [first_position, last_position]."""
+        return sorted(set(self.tree.overlap(first_position, last_position)))
+
+
+def build_all(projects):
+    for project in projects:
+        csv_path = f"{metadata_path}/{project}.csv"
+        if not os.path.exists(csv_path):
+            print(f"⚠️ CSV not found: {csv_path}")
+            continue
+
+        df = pd.read_csv(csv_path)
+        if df.empty:
+            continue
+
+        index = GenealogyIndex.build(project, df)
+        index.save()
+        print(f"✅ Genealogy saved for {project}: {len(index.intervals)} intervals, "
+              f"{index.intervals['clone_fingerprint'].nunique()} fingerprints")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the clone genealogy index.")
+    parser.add_argument("--project", help="Project to query (builds every project if omitted)")
+    parser.add_argument("--fingerprint", help="Clone fingerprint to query")
+    parser.add_argument("--after-pr", type=int, help="Is the clone still present once this PR is merged?")
+    parser.add_argument("--base-of-pr", type=int, help="Was the clone already on the base branch of this PR?")
+    parser.add_argument("--alive-after-pr", type=int, help="List the clones present once this PR is merged")
+    args = parser.parse_args()
+
+    if not args.project:
+        build_all(load_projects())
+        return
+
+    index = GenealogyIndex.load(args.project)
+
+    if args.alive_after_pr is not None:
+        for fp in index.alive_after_pr(args.alive_after_pr):
+            print(fp)
+
+    if args.fingerprint:
+        fp = args.fingerprint
+        print(f"Runs (positions): {index.runs(fp)}")
+        print(f"Introduced in (pr, commit): {index.introduced_in(fp)}")
+        print(f"Pre-existing on a base branch: {index.pre_existing(fp)}")
+        if args.after_pr is not None:
+            print(f"Present after PR {args.after_pr} merged: {index.survives_pr(fp, args.after_pr)}")
+        if args.base_of_pr is not None:
+            print(f"On the base branch of PR {args.base_of_pr}: {index.on_base_of(fp, args.base_of_pr)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import io
+import os
+import re
+import subprocess
+
+
+class BlobReader:
+    """
+    Read files as they were at one commit straight from the git object
+    database (one `git cat-file --batch` process), without touching the
+    working tree. Use it as a context manager so the process is closed.
+    """
+
+    def __init__(self, repo_path, sha):
+        self.repo_path = os.path.abspath(repo_path)
+        self.sha = sha
+        self._process = None
+        self._lines_cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+    def relative_path(self, file_path):
+        """Path inside the repository, or None if file_path is outside it."""
+        if not os.path.isabs(file_path):
+            return file_path.replace(os.sep, "/")
+        rel = os.path.relpath(file_path, self.repo_path)
+        if rel.startswith(".."):
+            return None
+        return rel.replace(os.sep, "/")
+
+    def read_bytes(self, file_path):
+        """Raw content of file_path at self.sha, or None if it does not exist."""
+        rel = self.relative_path(file_path)
+        if rel is None:
+            return None
+
+        if self._process is None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.repo_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+
+        self._process.stdin.write(f"{self.sha}:{rel}\n".encode("utf-8"))
+        self._process.stdin.flush()
+
+        # "<oid> blob <size>" or "<name> missing"
+        header = self._process.stdout.readline().decode("utf-8", errors="ignore").split()
+        if len(header) != 3 or header[1] != "blob":
+            return None
+
+        size = int(header[2])
+        data = self._process.stdout.read(size)
+        self._process.stdout.read(1)  # trailing newline after the object
+        return data
+
+    def read_lines(self, file_path):
+        """
+        Lines of file_path at self.sha, split exactly like a text-mode
+        readlines() on the checked out file would do.
+        """
+        if file_path not in self._lines_cache:
+            data = self.read_bytes(file_path)
+            if data is None:
+                self._lines_cache[file_path] = None
+            else:
+                text = data.decode("utf-8", errors="ignore")
+                self._lines_cache[file_path] = io.StringIO(text, newline=None).readlines()
+        return self._lines_cache[file_path]
+
+    def get_snippet_content(self, file_path, start_line, end_line):
+        """Same contract as reading the snippet from the checked out file."""
+        lines = self.read_lines(file_path)
+        if lines is None:
+            return ""
+        # NiCad is 1-based (inclusive). Python is 0-based (end index is exclusive).
+        return "".join(lines[start_line - 1: end_line])
+
+
+def resolve_trees(repo_path, shas):
+    """
+    Map commit SHAs to their tree SHAs with a single
+    `git cat-file --batch-check`. Unknown commits are left out.
+    """
+    shas = [sha for sha in dict.fromkeys(shas) if sha]
+    if not shas or not os.path.isdir(repo_path):
+        return {}
+
+    try:
+        result = subprocess.run(
+            ["git", "cat-file", "--batch-check"],
+            cwd=repo_path,
+            input="".join(f"{sha}^{{tree}}\n" for sha in shas),
+            capture_output=True,
+            text=True
+        )
+    except OSError:
+        return {}
+
+    trees = {}
+    # One output line per input line: "<oid> tree <size>" or "<name> missing"
+    for sha, line in zip(shas, result.stdout.splitlines()):
+        parts = line.split()
+        if len(parts) == 3 and parts[1] == "tree":
+            trees[sha] = parts[0]
+    return trees
+
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+# Escapes of git's quoted paths ("a/caf\303\251.py") besides octal bytes
+ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13, '"': 34, "\\": 92}
+
+
+def unquote_path(raw):
+    """Path as git prints it in a diff: C-quoted when it has special characters."""
+    raw = raw.rstrip("\n")
+    if len(raw) < 2 or raw[0] != '"' or raw[-1] != '"':
+        return raw
+    data = bytearray()
+    i, body = 0, raw[1:-1]
+    while i < len(body):
+        char = body[i]
+        if char != "\\" or i + 1 == len(body):
+            data.extend(char.encode("utf-8"))
+            i += 1
+        elif body[i + 1] in "01234567":
+            data.append(int(body[i + 1:i + 4], 8))
+            i += 4
+        else:
+            escaped = body[i + 1]
+            data.extend(bytes([ESCAPES[escaped]]) if escaped in ESCAPES else escaped.encode("utf-8"))
+            i += 2
+    return data.decode("utf-8", errors="replace")
+
+
+def _diff_path(raw):
+    """'a/src/x.py' -> 'src/x.py', '/dev/null' -> None."""
+    # git ends the name with a tab when it has spaces
+    raw = unquote_path(raw.rstrip("\t"))
+    if raw == "/dev/null":
+        return None
+    return raw[2:] if raw[:2] in ("a/", "b/") else raw
+
+
+def diff_hunks(repo_path, old_sha, new_sha):
+    """
+    Changed line ranges between two commits, from `git diff -U0 -M`.
+
+    Returns {old_path: (new_path, [(old_start, old_count, new_start, new_count), ...])}
+    with repository-relative paths; new_path is None for deleted files and
+    differs from old_path for renames. Files added by new_sha are left out
+    (nothing in old_sha lives there). Returns None if git cannot diff.
+    """
+    if not os.path.isdir(repo_path):
+        return None
+
+    try:
+        result = subprocess.run(
+            ["git", "-c", "core.quotepath=false", "diff", "-U0", "-M", "--no-color", "--no-ext-diff",
+             "--src-prefix=a/", "--dst-prefix=b/", old_sha, new_sha],
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            errors="ignore"
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+
+    changes = {}
+    old_path = None
+    current = None
+    in_header = False
+
+    # Only "\n" ends a diff line: splitlines() would also cut a source line at \x0c or \r
+    for line in result.stdout.split("\n"):
+        if line.startswith("diff --git "):
+            old_path = None
+            current = None
+            in_header = True
+        elif line.startswith("@@"):
+            # Hunk lines start with " ", "+", "-" or "\\", so a removed "-- x" reads
+            # as "--- x": file headers are only read before the first hunk
+            in_header = False
+            match = HUNK_HEADER.match(line)
+            if match and current is not None:
+                old_start, old_count, new_start, new_count = match.groups()
+                current[1].append((
+                    int(old_start),
+                    1 if old_count is None else int(old_count),
+                    int(new_start),
+                    1 if new_count is None else int(new_count)
+                ))
+        elif not in_header:
+            continue
+        elif line.startswith("rename from "):
+            old_path = unquote_path(line[len("rename from "):])
+        elif line.startswith("rename to "):
+            current = changes.setdefault(old_path, [unquote_path(line[len("rename to "):]), []])
+        elif line.startswith("--- "):
+            old_path = _diff_path(line[4:])
+        elif line.startswith("+++ "):
+            if old_path is None:
+                current = None  # new file
+            else:
+                current = changes.setdefault(old_path, [_diff_path(line[4:]), []])
+
+    return {path: (new_path, hunks) for path, (new_path, hunks) in changes.items()}
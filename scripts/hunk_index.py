@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from git_objects import HUNK_HEADER
+
+# Rows of pr_commit_details.csv read at a time (the file is large)
+DETAILS_CHUNKSIZE = 50_000
+
+
+def added_ranges(patch):
+    """
+    Line ranges (start, end) of the new file added by a GitHub file patch,
+    adjacent ranges merged.
+    """
+    ranges = []
+    new_line = None
+    run_start = None
+
+    # Only "\n" ends a patch line: splitlines() would also cut a source line at \x0c or \u2028
+    for line in patch.split("\n"):
+        line = line.removesuffix("\r")
+        match = HUNK_HEADER.match(line)
+        if match:
+            if run_start is not None:
+                ranges.append((run_start, new_line - 1))
+                run_start = None
+            new_line = int(match.group(3))
+            continue
+        if new_line is None or line.startswith("\\"):
+            continue  # before the first hunk, or "\ No newline at end of file"
+
+        if line.startswith("+"):
+            if run_start is None:
+                run_start = new_line
+            new_line += 1
+        elif line.startswith("-"):
+            continue  # removed lines do not exist in the new file
+        else:
+            if run_start is not None:
+                ranges.append((run_start, new_line - 1))
+                run_start = None
+            new_line += 1
+
+    if run_start is not None:
+        ranges.append((run_start, new_line - 1))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class HunkIndex:
+    """
+    Added line ranges of every (commit sha, file) with patch data, as sorted
+    disjoint intervals plus prefix sums of their lengths, so the number of
+    added lines inside any range is two binary searches away.
+    """
+
+    def __init__(self):
+        self._files = {}
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, key):
+        return key in self._files
+
+    def add_patch(self, sha, filename, patch):
+        ranges = added_ranges(patch)
+        starts = np.array([s for s, _ in ranges], dtype=np.int64)
+        ends = np.array([e for _, e in ranges], dtype=np.int64)
+        lengths = np.concatenate([[0], np.cumsum(ends - starts + 1)])
+        self._files[(sha, filename)] = (starts, ends, lengths)
+
+    @classmethod
+    def from_details_csv(cls, details_csv, shas):
+        """
+        Index the patches of the given commits, reading pr_commit_details.csv
+        in chunks and keeping only the rows of those commits.
+        """
+        index = cls()
+        shas = set(shas)
+
+        for chunk in pd.read_csv(details_csv, usecols=["sha", "filename", "patch"],
+                                 chunksize=DETAILS_CHUNKSIZE):
+            chunk = chunk[chunk["sha"].isin(shas) & chunk["patch"].notna()]
+            for sha, filename, patch in zip(chunk["sha"], chunk["filename"], chunk["patch"]):
+                index.add_patch(sha, filename, patch)
+
+        return index
+
+    def total_added(self, sha, filename):
+        """Lines added to the file by the commit, or None without patch data."""
+        entry = self._files.get((sha, filename))
+        if entry is None:
+            return None
+        return int(entry[2][-1])
+
+    def added_lines(self, sha, filename, starts, ends):
+        """
+        Number of added lines inside each closed range [starts[i], ends[i]]
+        of the file at that commit (arrays in, array out), or None without
+        patch data.
+        """
+        entry = self._files.get((sha, filename))
+        if entry is None:
+            return None
+
+        added_starts, added_ends, lengths = entry
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if added_starts.size == 0:
+            return np.zeros(starts.size, dtype=np.int64)
+
+        # First added range ending at or after start, last one starting at or before end
+        first = np.searchsorted(added_ends, starts, side="left")
+        last = np.searchsorted(added_starts, ends, side="right") - 1
+        hit = first <= last
+
+        first_c = np.minimum(first, added_starts.size - 1)
+        last_c = np.maximum(last, 0)
+
+        total = lengths[last_c + 1] - lengths[first_c]
+        # The outer ranges may stick out of [start, end]
+        total -= np.maximum(0, starts - added_starts[first_c])
+        total -= np.maximum(0, added_ends[last_c] - ends)
+
+        return np.where(hit, total, 0)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Structured events of the pipeline, one JSON object per line in
+summary/events.jsonl (or the file of the LIFECYCLE_EVENTS variable; "off"
+disables them).
+
+Every event has the time, the run id, the stage and the process id, plus the
+fields given by the caller (project, pr, commit, side, seconds, bytes,
+counts...). Worker processes append to the same file; each event is a
+single write, so lines do not interleave. The run id is inherited by child
+processes, so the stages started by run_all.sh, the orchestrator or the
+runner of one sweep share it when they are started from one shell with
+LIFECYCLE_RUN_ID set, and each script gets its own otherwise.
+
+Usage in a stage:
+    import instrumentation
+    instrumentation.start_stage("7")
+    with instrumentation.timed("convert_xml", project=p, bytes=n) as event:
+        ...
+        event["n_sets"] = n_sets
+
+Summary (throughput, p50/p95 per stage and event, slowest projects):
+    python3 instrumentation.py summary
+    python3 instrumentation.py summary --last-run --top 20
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import argparse
+from contextlib import contextmanager
+from paths import summary_path
+
+EVENTS_PATH = os.environ.get("LIFECYCLE_EVENTS", os.path.join(summary_path, "events.jsonl"))
+ENABLED = EVENTS_PATH.lower() != "off"
+
+# Shared with the child processes
+RUN_ID = os.environ.setdefault("LIFECYCLE_RUN_ID", uuid.uuid4().hex[:12])
+
+_stage = None
+
+
+def emit(event, **fields):
+    """Append one event."""
+    if not ENABLED:
+        return
+    record = {"ts": round(time.time(), 3), "run": RUN_ID, "stage": _stage, "event": event,
+              "pid": os.getpid()}
+    record.update(fields)
+    line = json.dumps(record, default=str) + "\n"
+
+    os.makedirs(os.path.dirname(EVENTS_PATH) or ".", exist_ok=True)
+    # O_APPEND and a single write: concurrent writers do not mix their lines
+    fd = os.open(EVENTS_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def timed(event, **fields):
+    """
+    Emit the event with its duration in seconds when the block ends. The
+    yielded dict can receive more fields (sizes, counts) inside the block;
+    status is "error" when the block raised.
+    """
+    fields = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield fields
+    except BaseException:
+        fields["status"] = "error"
+        raise
+    finally:
+        fields.setdefault("status", "ok")
+        emit(event, seconds=round(time.perf_counter() - started, 4), **fields)
+
+
+def set_stage(stage):
+    """Stage of the next events of this process."""
+    global _stage
+    _stage = str(stage)
+
+
+def start_stage(stage):
+    """
+    Tag the events of this process with the stage, time the whole stage and
+    start the profilers asked for in LIFECYCLE_PROFILE.
+    """
+    set_stage(stage)
+    started = time.perf_counter()
+    emit("stage_start", argv=sys.argv[1:])
+    atexit.register(lambda: emit("stage_end", seconds=round(time.perf_counter() - started, 3)))
+
+    # Profilers requested by LIFECYCLE_PROFILE, if any (see profiling.py)
+    import profiling
+    profiling.start(stage)
+
+
+# ==========================================
+# Summary
+# ==========================================
+def load_events(path=EVENTS_PATH):
+    import pandas as pd
+
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # line cut by a killed process
+    return pd.DataFrame(records)
+
+
+def stage_order(index):
+    """Sort key of a stage index: pipeline order ("3" before "10"), the rest last."""
+    return index.map(lambda stage: int(stage) if stage.isdigit() else 99)
+
+
+def summarize(events, top=10):
+    import pandas as pd
+
+    pd.set_option("display.width", 160)
+    stage_ends = events[events["event"] == "stage_end"]
+    units = events[~events["event"].isin(["stage_start", "stage_end"]) & events["seconds"].notna()]
+
+    print(f"📊 {len(events)} events, {events['run'].nunique()} run(s)\n")
+
+    print("=== Stage wall time ===")
+    if stage_ends.empty:
+        print("(no finished stage)")
+    else:
+        walls = stage_ends.groupby("stage")["seconds"].agg(runs="count", total_s="sum").sort_index(key=stage_order)
+        print(walls.round(1).to_string())
+
+    if units.empty:
+        return
+
+    print("\n=== Events per stage ===")
+    grouped = units.groupby(["stage", "event"])
+    table = grouped["seconds"].agg(
+        n="count",
+        total_s="sum",
+        p50_s=lambda s: s.quantile(0.5),
+        p95_s=lambda s: s.quantile(0.95),
+        max_s="max",
+    )
+    table = table.sort_index(level="stage", key=stage_order, sort_remaining=True)
+    if "status" in units:
+        table["errors"] = grouped["status"].agg(lambda s: int((s == "error").sum()))
+    if "bytes" in units:
+        table["MB"] = grouped["bytes"].sum() / 1e6
+
+    # Throughput over the wall time of the stage (workers overlap)
+    wall = stage_ends.groupby("stage")["seconds"].sum() if not stage_ends.empty else pd.Series(dtype=float)
+    table["per_s"] = [
+        n / wall[stage] if stage in wall and wall[stage] > 0 else float("nan")
+        for (stage, _), n in table["n"].items()
+    ]
+    print(table.round(3).to_string())
+
+    if "project" in units:
+        print(f"\n=== Slowest projects (top {top}) ===")
+        by_project = units.dropna(subset=["project"]).pivot_table(
+            index="project", columns="stage", values="seconds", aggfunc="sum", fill_value=0
+        )
+        by_project = by_project.sort_index(axis=1, key=stage_order)
+        by_project["total"] = by_project.sum(axis=1)
+        print(by_project.sort_values("total", ascending=False).head(top).round(1).to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline events.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("summary", help="Throughput, latency percentiles and slowest projects")
+    p.add_argument("--events", default=EVENTS_PATH, help=f"Events file (default: {EVENTS_PATH})")
+    p.add_argument("--last-run", action="store_true", help="Only the events of the last run")
+    p.add_argument("--top", type=int, default=10, help="Number of slowest projects shown")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.events):
+        sys.exit(f"No events file at {args.events}")
+
+    import pandas as pd
+
+    events = load_events(args.events)
+    if events.empty:
+        sys.exit("No events recorded.")
+    for column in ("seconds", "project", "status", "bytes"):
+        if column not in events:
+            events[column] = None
+    events["seconds"] = pd.to_numeric(events["seconds"], errors="coerce")
+    events["bytes"] = pd.to_numeric(events["bytes"], errors="coerce")
+    events["stage"] = events["stage"].fillna("-").astype(str)
+    if args.last_run:
+        events = events[events["run"] == events["run"].iloc[-1]]
+
+    summarize(events, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+MinHash/LSH index of the functions of a repository, and the "minhash" clone
+detector of stage 6 built on it.
+
+Every function (extracted like clone_detectors.PythonDetector does) gets a
+MinHash signature of its token shingles; the signature is cut into LSH bands
+and two functions that share a band bucket are candidate clones. Candidates
+are confirmed with NiCad's UPI similarity, so every clone reported is one
+NiCad's default configuration would report too, found without comparing
+every pair of functions. The converse does not hold: LSH trades recall for
+that speed. A pair is only confirmed if it became a candidate, which for
+shingle sets with a Jaccard similarity of 0.3 happens about 68% of the time
+(see BANDS), and a UPI clone can have an even lower Jaccard similarity.
+Near-identical clones are almost always found; for the complete set of a
+snapshot, use the python detector, which compares every pair.
+
+The index is persistent, one SQLite file per repository in
+search_results/minhash/, and keyed by git blob: a file that did not change
+between two snapshots is never extracted nor hashed again, so each snapshot
+only adds the blobs it introduces. The index also records where each blob
+lived and the first indexed commit that had it, which lets the functions of
+a commit be matched against the code of every indexed snapshot, including
+code that was deleted or rewritten since.
+
+Usage (from a workspace with metadata and git_repos):
+    python3 minhash_index.py build --project my_repo
+    python3 minhash_index.py history --project my_repo --sha <commit> [--all]
+"""
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import subprocess
+from collections import defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from paths import git_repos_path, search_results_path, summary_path, load_settings
+from languages import LANGUAGES
+from git_objects import BlobReader
+from pipeline_stages import read_metadata
+from fingerprint_index import JOURNAL_MODE
+from clone_detectors import (THRESHOLD, CloneDetector, cluster_pairs, functions_of_source,
+                             upi_similarity, write_nicad_xml)
+
+INDEX_DIR = os.path.join(search_results_path, "minhash")
+
+# 42 bands of 3 rows: functions whose shingle sets have a Jaccard similarity
+# of 0.3 are candidates with a probability of 0.68, of 0.5 with 0.996
+NUM_PERM = 126
+BANDS = 42
+SHINGLE = 3
+SEED = 1
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    blob TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS functions (
+    id INTEGER PRIMARY KEY,
+    blob TEXT NOT NULL REFERENCES blobs(blob),
+    start_line INTEGER NOT NULL,
+    end_line INTEGER NOT NULL,
+    lines TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS functions_by_blob ON functions (blob);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    function_id INTEGER NOT NULL REFERENCES functions(id)
+);
+CREATE INDEX IF NOT EXISTS bands_by_hash ON bands (band, hash);
+CREATE INDEX IF NOT EXISTS bands_by_function ON bands (function_id);
+CREATE TABLE IF NOT EXISTS paths (
+    blob TEXT NOT NULL REFERENCES blobs(blob),
+    path TEXT NOT NULL,
+    first_commit TEXT NOT NULL,
+    PRIMARY KEY (blob, path)
+);
+CREATE TABLE IF NOT EXISTS commits (
+    sha TEXT PRIMARY KEY
+);
+"""
+
+
+class MinHasher:
+    """MinHash signatures of the token shingles of normalized lines."""
+
+    def __init__(self, num_perm=NUM_PERM, shingle=SHINGLE, seed=SEED):
+        self.shingle = shingle
+        rng = np.random.RandomState(seed)
+        # h(x) = (a * x + b) mod p; a, b < 2^32 so a * x + b fits in 64 bits
+        self.a = rng.randint(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, lines):
+        """crc32 of the token k-grams (the whole function when it is shorter)."""
+        tokens = [token for line in lines for token in line.split(" ")]
+        k = min(self.shingle, len(tokens))
+        grams = {"\x00".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64,
+                           count=len(grams))
+
+    def signature(self, lines):
+        hashes = self.shingles(lines)[:, None]
+        return ((hashes * self.a + self.b) % MERSENNE_PRIME & MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature, bands=BANDS):
+    """[(band, bucket)] of a signature; buckets are signed 64-bit, as SQLite stores them."""
+    rows = len(signature) // bands
+    return [(band, int.from_bytes(hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(),
+                                                  digest_size=8).digest(), "little", signed=True))
+            for band in range(bands)]
+
+
+def project_index_path(project):
+    return os.path.join(INDEX_DIR, f"{project}.sqlite")
+
+
+def tree_files(repo_path, sha, extension):
+    """[(path, blob)] of the files of the language at sha, from `git ls-tree`."""
+    result = subprocess.run(["git", "ls-tree", "-r", "-z", sha], cwd=repo_path, capture_output=True,
+                            check=True)
+    suffix = f".{extension}"
+    files = []
+    for entry in result.stdout.decode("utf-8", errors="surrogateescape").split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        _, kind, blob = info.split()
+        if kind == "blob" and path.endswith(suffix):
+            files.append((path, blob))
+    return sorted(files)
+
+
+def extract_source(data):
+    return functions_of_source(data.decode("utf-8", errors="replace"))
+
+
+class MinHashIndex:
+    """
+    Persistent blob -> functions (lines, MinHash signature, LSH buckets)
+    table of one repository. Blobs are added once, one transaction per
+    snapshot; what was read is cached, so a detector that goes through the
+    snapshots of a repository only reads the blobs each snapshot adds.
+    """
+
+    def __init__(self, path, num_perm=NUM_PERM, bands=BANDS, shingle=SHINGLE):
+        self.path = path
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle)
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        self._conn.executescript(SCHEMA)
+        self._check_parameters({"num_perm": num_perm, "bands": bands, "shingle": shingle, "seed": SEED})
+
+        self._functions = {}  # blob -> [(id, start, end)]
+        self._lines = {}      # id -> normalized lines
+        self._buckets = {}    # id -> [(band, bucket)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _check_parameters(self, parameters):
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                                   [(key, str(value)) for key, value in parameters.items()])
+        stored = dict(self._conn.execute("SELECT key, value FROM meta"))
+        different = {key for key, value in parameters.items() if stored.get(key) != str(value)}
+        if different:
+            raise ValueError(f"{self.path} was built with other {', '.join(sorted(different))}; "
+                             f"delete it to rebuild it")
+
+    # --- Writing ---
+    def indexed_commits(self):
+        return {sha for (sha,) in self._conn.execute("SELECT sha FROM commits")}
+
+    def missing_blobs(self, blobs):
+        blobs = set(blobs) - set(self._functions)
+        known = set()
+        for chunk in chunks(sorted(blobs)):
+            known.update(blob for (blob,) in self._conn.execute(
+                f"SELECT blob FROM blobs WHERE blob IN ({','.join('?' * len(chunk))})", chunk))
+        return blobs - known
+
+    def add_commit(self, repo_path, sha, extension, map_function=map):
+        """
+        Index the files of the language at sha: extract and hash the blobs not
+        indexed yet (with map_function, e.g. Pool.map) and record the paths.
+        Returns the [(path, blob)] of the snapshot.
+        """
+        sha = subprocess.run(["git", "rev-parse", sha], cwd=repo_path, capture_output=True, text=True,
+                             check=True).stdout.strip()
+        files = tree_files(repo_path, sha, extension)
+        missing = sorted(self.missing_blobs(blob for _, blob in files))
+
+        sources = []
+        if missing:
+            path_of = {blob: path for path, blob in files}
+            with BlobReader(repo_path, sha) as reader:
+                sources = [reader.read_bytes(path_of[blob]) or b"" for blob in missing]
+        extracted = list(map_function(extract_source, sources)) if sources else []
+
+        with self._conn:
+            for blob, functions in zip(missing, extracted):
+                self._conn.execute("INSERT INTO blobs (blob) VALUES (?)", (blob,))
+                for start, end, lines in functions:
+                    signature = self.hasher.signature(lines)
+                    cursor = self._conn.execute(
+                        "INSERT INTO functions (blob, start_line, end_line, lines, signature) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (blob, start, end, json.dumps(lines), signature.tobytes()))
+                    self._conn.executemany(
+                        "INSERT INTO bands (band, hash, function_id) VALUES (?, ?, ?)",
+                        [(band, bucket, cursor.lastrowid) for band, bucket in band_hashes(signature, self.bands)])
+            self._conn.executemany("INSERT OR IGNORE INTO paths (blob, path, first_commit) VALUES (?, ?, ?)",
+                                   [(blob, path, sha) for path, blob in files])
+            self._conn.execute("INSERT OR IGNORE INTO commits (sha) VALUES (?)", (sha,))
+        return files
+
+    # --- Reading ---
+    def functions(self, blobs):
+        """{blob: [(function id, start, end)]}."""
+        blobs = list(blobs)
+        pending = [blob for blob in set(blobs) if blob not in self._functions]
+        for blob in pending:
+            self._functions[blob] = []
+        for chunk in chunks(pending):
+            rows = self._conn.execute(
+                f"SELECT id, blob, start_line, end_line FROM functions "
+                f"WHERE blob IN ({','.join('?' * len(chunk))}) ORDER BY start_line, end_line", chunk)
+            for function_id, blob, start, end in rows:
+                self._functions[blob].append((function_id, start, end))
+        return {blob: self._functions[blob] for blob in blobs}
+
+    def lines(self, function_ids):
+        """{function id: normalized lines}."""
+        function_ids = list(function_ids)
+        pending = [i for i in set(function_ids) if i not in self._lines]
+        for chunk in chunks(pending):
+            for function_id, lines in self._conn.execute(
+                    f"SELECT id, lines FROM functions WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                self._lines[function_id] = tuple(json.loads(lines))
+        return {i: self._lines[i] for i in function_ids}
+
+    def buckets(self, function_ids):
+        """{function id: [(band, bucket)]}."""
+        function_ids = list(function_ids)
+        pending = [i for i in set(function_ids) if i not in self._buckets]
+        for i in pending:
+            self._buckets[i] = []
+        for chunk in chunks(pending):
+            for band, bucket, function_id in self._conn.execute(
+                    f"SELECT band, hash, function_id FROM bands "
+                    f"WHERE function_id IN ({','.join('?' * len(chunk))})", chunk):
+                self._buckets[function_id].append((band, bucket))
+        return {i: self._buckets[i] for i in function_ids}
+
+    def colliding(self, function_id):
+        """Ids of the indexed functions sharing an LSH bucket with function_id."""
+        return {other for (other,) in self._conn.execute(
+            "SELECT DISTINCT b.function_id FROM bands a JOIN bands b ON a.band = b.band AND a.hash = b.hash "
+            "WHERE a.function_id = ? AND b.function_id != ?", (function_id, function_id))}
+
+    def locations(self, function_ids):
+        """{function id: [(path, blob, start, end, first commit)]} of every place the function was seen."""
+        locations = defaultdict(list)
+        for chunk in chunks(sorted(set(function_ids))):
+            rows = self._conn.execute(
+                f"SELECT f.id, p.path, f.blob, f.start_line, f.end_line, p.first_commit "
+                f"FROM functions f JOIN paths p ON p.blob = f.blob "
+                f"WHERE f.id IN ({','.join('?' * len(chunk))})", chunk)
+            for function_id, *location in rows:
+                locations[function_id].append(tuple(location))
+        return locations
+
+
+def chunks(items, size=500):
+    """Slices of at most `size` items (SQLite limits the parameters of a query)."""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def snapshot_pairs(index, fragments, threshold=THRESHOLD):
+    """
+    {(i, j): similarity} of the fragments [(file, start, end, function id)]
+    of one snapshot that are clones: the pairs sharing an LSH bucket,
+    confirmed with the UPI similarity. Copies of the same function (same
+    id) share every bucket and are confirmed the same way.
+    """
+    ids = [fragment[3] for fragment in fragments]
+    buckets = index.buckets(ids)
+    lines = index.lines(ids)
+
+    members = defaultdict(list)
+    for k, function_id in enumerate(ids):
+        for bucket in buckets[function_id]:
+            members[bucket].append(k)
+
+    candidates = set()
+    for group in members.values():
+        for x in range(len(group)):
+            for y in range(x + 1, len(group)):
+                candidates.add((group[x], group[y]))
+
+    pairs = {}
+    similarities = {}  # the same two functions are often copied around unchanged
+    for i, j in sorted(candidates):
+        file_i, start_i, end_i, id_i = fragments[i]
+        file_j, start_j, end_j, id_j = fragments[j]
+        if file_i == file_j and start_i <= end_j and start_j <= end_i:
+            continue  # a function and a function nested in it
+        key = (min(id_i, id_j), max(id_i, id_j))
+        if key not in similarities:
+            a, b = lines[id_i], lines[id_j]
+            if min(len(a), len(b)) < (1 - threshold) * max(len(a), len(b)) - 1:
+                similarities[key] = None  # too different in size to share enough lines
+            else:
+                similarities[key] = upi_similarity(a, b, threshold)
+        if similarities[key] is not None:
+            pairs[(i, j)] = similarities[key]
+    return pairs
+
+
+class MinHashDetector(CloneDetector):
+    """
+    Clones of Python functions found through the MinHash/LSH index of the
+    repository (search_results/minhash/<project>.sqlite). The source tree
+    must be a git repository: the snapshot is its HEAD, and only the blobs
+    no earlier snapshot had are extracted, by `workers` processes.
+    """
+
+    name = "minhash"
+    extensions = {"py"}
+
+    def __init__(self, workers=1, threshold=THRESHOLD, index_dir=None):
+        self.workers = workers
+        self.threshold = threshold
+        self.index_dir = index_dir or INDEX_DIR
+        self.pool = None
+        self.indexes = {}  # project -> MinHashIndex
+
+    def index_for(self, project):
+        if project not in self.indexes:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self.indexes[project] = MinHashIndex(os.path.join(self.index_dir, f"{project}.sqlite"))
+        return self.indexes[project]
+
+    def map(self, function, items):
+        if self.workers > 1 and len(items) > 1:
+            if self.pool is None:
+                self.pool = Pool(self.workers)
+            return self.pool.map(function, items, chunksize=8)
+        return [function(item) for item in items]
+
+    def find_classes(self, source_dir, language, sha="HEAD"):
+        source_dir = os.path.abspath(source_dir.rstrip("/"))
+        index = self.index_for(os.path.basename(source_dir))
+        files = index.add_commit(source_dir, sha, language, self.map)
+
+        blob_functions = index.functions(blob for _, blob in files)
+        fragments = [(os.path.join(source_dir, path), start, end, function_id)
+                     for path, blob in files
+                     for function_id, start, end in blob_functions[blob]]
+        pairs = snapshot_pairs(index, fragments, self.threshold)
+
+        lines = index.lines([function_id for *_, function_id in fragments])
+        return cluster_pairs([(file, start, end, lines[function_id]) for file, start, end, function_id in fragments],
+                             pairs)
+
+    def detect(self, source_dir, language, output_xml):
+        if language not in self.extensions:
+            raise ValueError(f"The minhash detector only supports Python sources, not .{language}")
+        if not os.path.isdir(os.path.join(source_dir, ".git")):
+            raise ValueError(f"The minhash detector needs a git repository: {source_dir}")
+        classes = self.find_classes(source_dir, language)
+        write_nicad_xml(output_xml, os.path.basename(source_dir.rstrip("/")), classes)
+
+    def close(self):
+        for index in self.indexes.values():
+            index.close()
+        self.indexes = {}
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+# ==========================================
+# Command line
+# ==========================================
+def snapshot_shas(project):
+    """Parent and child SHAs of the commits of the project's metadata, in order."""
+    df = read_metadata(project)
+    if df is None:
+        sys.exit(f"No metadata for {project}")
+    shas = []
+    for _, row in df.iterrows():
+        for mode in ("parent", "child"):
+            sha = str(row[mode]).strip()
+            if sha not in ["", "None", "nan"] and len(sha) > 5:
+                shas.append(sha)
+    return list(dict.fromkeys(shas))
+
+
+def build(args, extension):
+    repo_path = os.path.join(git_repos_path, args.project)
+    detector = MinHashDetector(workers=args.workers)
+    try:
+        index = detector.index_for(args.project)
+        done = index.indexed_commits()
+        shas = [sha for sha in snapshot_shas(args.project) if sha not in done]
+        for n, sha in enumerate(shas, start=1):
+            files = index.add_commit(repo_path, sha, extension, detector.map)
+            print(f"[{n}/{len(shas)}] {sha[:10]}: {len(files)} files")
+    finally:
+        detector.close()
+    print(f"✅ {project_index_path(args.project)}: {len(done) + len(shas)} snapshots indexed")
+
+
+def history(args, extension):
+    """
+    Clones of the functions of a commit (of the files it changed, or --all)
+    in every indexed snapshot, one row per place the match was seen.
+    """
+    repo_path = os.path.join(git_repos_path, args.project)
+    with MinHashIndex(project_index_path(args.project)) as index:
+        files = index.add_commit(repo_path, args.sha, extension)
+        snapshot = set(files)
+        if not args.all:
+            # A root commit has no parent: rev-parse then fails, but still echoes "<sha>^"
+            parent = subprocess.run(["git", "rev-parse", "--verify", "--quiet", f"{args.sha}^"],
+                                    cwd=repo_path, capture_output=True, text=True)
+            if parent.returncode == 0:
+                before = {blob for _, blob in tree_files(repo_path, parent.stdout.strip(), extension)}
+            else:
+                before = set()
+            files = [(path, blob) for path, blob in files if blob not in before]
+
+        rows = []
+        blob_functions = index.functions(blob for _, blob in files)
+        for path, blob in files:
+            for function_id, start, end in blob_functions[blob]:
+                others = index.colliding(function_id)
+                lines = index.lines([function_id, *others])
+                for other, locations in index.locations(others).items():
+                    similarity = upi_similarity(lines[function_id], lines[other], args.threshold)
+                    if similarity is None:
+                        continue
+                    for other_path, other_blob, other_start, other_end, first_commit in locations:
+                        rows.append({"path": path, "start": start, "end": end,
+                                     "match_path": other_path, "match_start": other_start,
+                                     "match_end": other_end, "match_first_commit": first_commit,
+                                     # still in the commit, or only in earlier snapshots
+                                     "in_snapshot": (other_path, other_blob) in snapshot,
+                                     "similarity": similarity})
+
+    os.makedirs(summary_path, exist_ok=True)
+    output_csv = os.path.join(summary_path, f"minhash_history_{args.project}_{args.sha[:10]}.csv")
+    pd.DataFrame(rows, columns=["path", "start", "end", "match_path", "match_start", "match_end",
+                                "match_first_commit", "in_snapshot", "similarity"]).to_csv(output_csv, index=False)
+    print(f"✅ {len(rows)} matches for {len(files)} files of {args.sha[:10]}: {output_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH index of the functions of a repository.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Index every snapshot of the project's metadata")
+    build_parser.add_argument("--project", required=True, help="Project (metadata/<project>.csv)")
+    build_parser.add_argument("--workers", type=int, default=1, help="Processes extracting the functions")
+
+    history_parser = commands.add_parser("history", help="Clones of a commit's code in the indexed history")
+    history_parser.add_argument("--project", required=True, help="Project (git_repos/<project>)")
+    history_parser.add_argument("--sha", required=True, help="Commit whose functions are searched")
+    history_parser.add_argument("--all", action="store_true",
+                                help="Every function of the commit, not only the files it changed")
+    history_parser.add_argument("--threshold", type=float, default=THRESHOLD, help="UPI threshold")
+    args = parser.parse_args()
+
+    extension = LANGUAGES[load_settings()["language"]]
+    if extension not in MinHashDetector.extensions:
+        sys.exit(f"The minhash index only supports Python sources, not .{extension}")
+    if args.command == "build":
+        build(args, extension)
+    else:
+        history(args, extension)
+
+
+if __name__ == "__main__":
+    main()
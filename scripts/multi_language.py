@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Run the pipeline for several languages in one sweep.
+
+The AIDev tables are read once and the merged PRs are split by language in a
+single pass (stages 1-5). Every language then gets its own workspace,
+languages/<extension>/, holding its settings.ini, metadata, search_results,
+lifetimes, clones_classified and summary, while git_repos and AIDev_Dataset
+are links to the shared folders: each repository is cloned once, and all
+languages read the same git object databases.
+
+Stages 6-11 run as the numbered scripts inside each workspace, languages in
+parallel (--jobs). NiCad runs of every language go through one queue, one
+project at a time, since they share their working files in git_repos.
+At the end, summary/summary_pr_by_category_by_language.csv gathers the
+summaries of every language.
+
+Usage (from the scripts folder):
+    python3 multi_language.py --languages Java,Python,Ruby --jobs 3
+    python3 multi_language.py --skip-metadata   # reuse the metadata of a previous sweep
+"""
+import os
+import sys
+import argparse
+import threading
+import subprocess
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pipeline_stages as stages
+from languages import LANGUAGES
+from paths import aidev_path, git_repos_path, summary_path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LANGUAGES_DIR = os.path.abspath("languages")
+
+# Stages run inside every language workspace, after the metadata
+PROJECT_STAGES = [
+    "6_detect_clone.py",
+    "7_parser_clones.py",
+    "8_track_clones.py",
+    "9_made_lifecycle.py",
+    "10_count_lifecycle.py",
+    "11_attribute_added_lines.py",
+]
+PARALLEL_STAGES = {"7_parser_clones.py", "8_track_clones.py"}
+
+# One NiCad run at a time, whatever the language
+nicad_lock = threading.Lock()
+
+
+def workspace(language):
+    return os.path.join(LANGUAGES_DIR, LANGUAGES[language])
+
+
+def prepare_workspace(language):
+    """Create the workspace: its settings.ini and the links to the shared folders."""
+    path = workspace(language)
+    os.makedirs(os.path.join(path, "metadata"), exist_ok=True)
+
+    config = configparser.ConfigParser()
+    config.read("settings.ini")
+    config["DETAILS"]["language"] = language
+    with open(os.path.join(path, "settings.ini"), "w", encoding="utf-8") as f:
+        config.write(f)
+
+    for shared in (git_repos_path, aidev_path):
+        os.makedirs(shared, exist_ok=True)
+        link = os.path.join(path, os.path.basename(shared))
+        if not os.path.lexists(link):
+            os.symlink(shared, link)
+    return path
+
+
+# ==========================================
+# Stages 1-5, every language at once
+# ==========================================
+def build_metadata(languages):
+    if not all(os.path.exists(os.path.join(aidev_path, f"{name}.csv")) for name in stages.AIDEV_TABLES):
+        print("📥 AIDev CSVs not found, downloading them")
+        stages.save_aidev(stages.download_aidev())
+
+    headers = stages.github_headers()
+    commits = stages.select_pr_commits_by_language(stages.load_aidev(), languages, headers)
+
+    for language, commit_df in commits.items():
+        metadata_dir = os.path.join(workspace(language), "metadata")
+        stages.save_pr_commits(commit_df, stages.commits_per_pr(commit_df), language, metadata_dir)
+        print(f"✅ {language}: {commit_df['id_pr'].nunique()} PRs, {len(commit_df)} commits")
+
+    # Repositories of every language in one pass over the shared folder
+    stages.clone_repositories(
+        pd.concat(commits.values(), ignore_index=True), ", ".join(languages), headers
+    )
+
+    for language, commit_df in commits.items():
+        path = workspace(language)
+        with_parents = stages.add_parents(commit_df)
+        with_parents.to_csv(
+            os.path.join(path, "metadata", f"{language.lower()}_pr_commits_with_parents.csv"), index=False
+        )
+
+        frames = stages.split_by_repository(with_parents)
+        stages.save_project_frames(frames, os.path.join(path, "metadata"))
+        stages.save_project_list(sorted(frames), os.path.join(path, "projects_filtered.txt"))
+
+
+# ==========================================
+# Stages 6-11, one scheduler for every language
+# ==========================================
+def run_stage(language, script, projects=None, workers=1):
+    """Run one numbered script in the language workspace. True on success."""
+    path = workspace(language)
+    log_dir = os.path.join(path, "summary", "pipeline_logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    env = dict(os.environ)
+    suffix = "all"
+    if projects is not None:
+        env["LIFECYCLE_PROJECTS"] = ",".join(projects)
+        suffix = projects[0] if len(projects) == 1 else suffix
+
+    command = [sys.executable, os.path.join(SCRIPT_DIR, script)]
+    if script in PARALLEL_STAGES:
+        command += ["--workers", str(workers)]
+
+    log_path = os.path.join(log_dir, f"{script[:-3]}-{suffix}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        result = subprocess.run(command, cwd=path, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    if result.returncode != 0:
+        print(f"❌ [{language}] {script} failed (log: {log_path})")
+        return False
+    return True
+
+
+def run_language(language, workers):
+    path = workspace(language)
+    with open(os.path.join(path, "projects_filtered.txt"), "r", encoding="utf-8") as f:
+        projects = [p for p in f.read().split('\n') if p]
+    print(f"▶️ [{language}] {len(projects)} project(s)")
+
+    for script in PROJECT_STAGES:
+        if script == "6_detect_clone.py":
+            # Project by project, so the languages take turns in the NiCad queue
+            for project in projects:
+                with nicad_lock:
+                    if not run_stage(language, script, [project]):
+                        return False
+            continue
+
+        if not run_stage(language, script, workers=workers):
+            return False
+
+    print(f"✅ [{language}] done")
+    return True
+
+
+def merge_summaries(languages):
+    frames = []
+    for language in languages:
+        summary_csv = os.path.join(workspace(language), "summary", "summary_pr_by_category.csv")
+        if os.path.exists(summary_csv):
+            df = pd.read_csv(summary_csv)
+            df.insert(0, "language", language)
+            frames.append(df)
+
+    if not frames:
+        print("⚠️ No language summary found.")
+        return
+
+    os.makedirs(summary_path, exist_ok=True)
+    output_csv = os.path.join(summary_path, "summary_pr_by_category_by_language.csv")
+    pd.concat(frames, ignore_index=True).to_csv(output_csv, index=False)
+    print(f"📄 Summary of every language saved to: {output_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline for several languages in one sweep.")
+    parser.add_argument("--languages", default=",".join(LANGUAGES),
+                        help=f"Comma-separated languages (default: {','.join(LANGUAGES)})")
+    parser.add_argument("--jobs", type=int, default=2, help="Languages processed at the same time")
+    parser.add_argument("--workers", type=int, default=1, help="Processes of stages 7 and 8 per language")
+    parser.add_argument("--skip-metadata", action="store_true",
+                        help="Reuse the metadata of the workspaces (skip stages 1-5)")
+    args = parser.parse_args()
+
+    languages = [language.strip() for language in args.languages.split(",") if language.strip()]
+    unknown = [language for language in languages if language not in LANGUAGES]
+    if unknown:
+        parser.error(f"unknown language(s): {', '.join(unknown)} (see languages.py)")
+
+    for language in languages:
+        prepare_workspace(language)
+
+    if not args.skip_metadata:
+        build_metadata(languages)
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = dict(zip(languages, executor.map(lambda l: run_language(l, args.workers), languages)))
+
+    merge_summaries([language for language in languages if results[language]])
+
+    failed = [language for language, ok in results.items() if not ok]
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
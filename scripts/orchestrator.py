@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Incremental pipeline runner: runs the numbered stages like run_all.sh, but
+only the parts whose inputs changed since the last successful run.
+
+Stages 0-5 build the metadata and run once for the whole dataset. Stages
+6-9 and 11 run per project, and stage 10 once over all projects. Every
+(stage, project) gets a signature: a hash of the stage code, the settings it
+reads, the content of its source inputs (e.g. metadata/<project>.csv) and the
+signatures of the stages it depends on. A part is re-run when its signature
+differs from the one recorded in .pipeline_state.json, make-style; editing
+the metadata of one repository only re-runs that repository downstream.
+A part is recorded only when the files it must write exist; a part that
+fails (or raises) only stops the parts that depend on it.
+
+Independent projects run concurrently (--jobs). Stage 6 always runs on one
+project at a time: NiCad shares its working files inside git_repos.
+
+Usage (from the scripts folder):
+    python3 orchestrator.py --jobs 4
+    python3 orchestrator.py --dry-run      # list what would run
+    python3 orchestrator.py --force        # ignore the recorded state
+"""
+import os
+import sys
+import csv
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+import subprocess
+import configparser
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from paths import aidev_path, metadata_path, summary_path, search_results_path, lifetimes_path, \
+    clones_classified_path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = ".pipeline_state.json"
+LOGS_DIR = os.path.join(summary_path, "pipeline_logs")
+# Code every stage runs through
+COMMON_CODE = ["pipeline_stages.py", "paths.py"]
+
+
+class Stage:
+    """
+    One numbered script.
+      scope: "global" (runs once), "project" (one run per project, projects in
+             parallel) or "batch" (per-project signatures, but one run with
+             every stale project, for stages that read a big shared input)
+      deps: names of the stages it depends on
+      code: helper modules whose content is part of the signature
+      settings: keys of [DETAILS] it reads
+      inputs: function(project) -> source files (global stages get None)
+      outputs: files that must exist for the stage to be up to date:
+               function() for global stages, function(project) otherwise
+      serial: never run two partitions of this stage at the same time
+    """
+
+    def __init__(self, name, script, scope, deps=(), code=(), settings=(),
+                 inputs=None, outputs=None, serial=False):
+        self.name = name
+        self.script = script
+        self.scope = scope
+        self.deps = list(deps)
+        self.code = list(code)
+        self.settings = list(settings)
+        self.inputs = inputs or (lambda project: [])
+        self.outputs = outputs or (lambda *_: [])
+        self.serial = serial
+        self.lock = threading.Lock()
+
+
+def language():
+    config = configparser.ConfigParser()
+    config.read("settings.ini")
+    return config.get("DETAILS", "language", fallback="").lower()
+
+
+AIDEV_FILES = ["repository.csv", "pull_request.csv", "pr_commits.csv", "pr_commit_details.csv"]
+
+
+def project_csv(project):
+    return [os.path.join(metadata_path, f"{project}.csv")]
+
+
+def snapshot_xmls(project):
+    """search_results XML of every snapshot of the project's metadata (any compression)."""
+    from artifact_io import find_artifact
+
+    path = os.path.join(metadata_path, f"{project}.csv")
+    if not os.path.exists(path):
+        return []
+    xmls = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for mode in ("parent", "child"):
+                sha = (row.get(mode) or "").strip()
+                if sha in ["", "None", "nan"] or len(sha) <= 5:
+                    continue
+                xml = os.path.join(search_results_path,
+                                   f"nicad-result-{project}-{row['number_pr']}-{row['number_commit']}-{mode}.xml")
+                xmls.append(find_artifact(xml) or xml)
+    return xmls
+
+
+def has_rows(path):
+    """The CSV exists and has a data row."""
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8") as f:
+        return bool(f.readline()) and bool(f.readline().strip())
+
+
+def lifetimes_csv(project):
+    return os.path.join(lifetimes_path, f"{project}_clone_lifetimes.csv")
+
+
+# Stages 8, 9 and 11 write nothing for a project without clones, so their
+# outputs are only required when the data they read has clones
+def tracked_outputs(project):
+    index_path = os.path.join(search_results_path, "fingerprint_index.sqlite")
+    if not os.path.exists(index_path):
+        return []
+    conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True, timeout=60)
+    try:
+        has_clones = conn.execute(
+            "SELECT 1 FROM sets JOIN snapshots ON snapshots.id = sets.snapshot_id "
+            "WHERE snapshots.name GLOB ? LIMIT 1", (f"nicad-result-{project}-*-child.xml",)
+        ).fetchone() is not None
+    finally:
+        conn.close()
+    return [lifetimes_csv(project)] if has_clones else []
+
+
+def classified_outputs(project):
+    if not has_rows(lifetimes_csv(project)):
+        return []
+    return [os.path.join(clones_classified_path, f"{project}_clone_classified.csv")]
+
+
+def attributed_outputs(project):
+    if not has_rows(lifetimes_csv(project)) or not os.path.exists(project_csv(project)[0]):
+        return []
+    return [os.path.join(lifetimes_path, f"{project}_clone_lifetimes_attributed.csv")]
+
+
+STAGES = [
+    Stage("0", "0_get_aidev_csv.py", "global",
+          outputs=lambda: [os.path.join(aidev_path, f) for f in AIDEV_FILES]),
+    Stage("1", "1_prs_project.py", "global", deps=["0"], settings=["language"],
+          inputs=lambda _: [os.path.join(aidev_path, f) for f in AIDEV_FILES],
+          outputs=lambda: [os.path.join(metadata_path, f"{language()}_pr_commits_without_parents.csv")]),
+    Stage("2", "2_mining_repos.py", "global", deps=["1"], settings=["language"],
+          inputs=lambda _: [os.path.join(metadata_path, f"{language()}_pr_commits_without_parents.csv")]),
+    Stage("3", "3_get_commits_prs_correct.py", "global", deps=["2"], settings=["language"],
+          inputs=lambda _: [os.path.join(metadata_path, f"{language()}_pr_commits_without_parents.csv")],
+          outputs=lambda: [os.path.join(metadata_path, f"{language()}_pr_commits_with_parents.csv")]),
+    Stage("4", "4_break_projects.py", "global", deps=["3"], settings=["language"],
+          inputs=lambda _: [os.path.join(metadata_path, f"{language()}_pr_commits_with_parents.csv")]),
+    Stage("5", "5_take_projects.py", "global", deps=["4"],
+          inputs=lambda _: sorted(
+              os.path.join(metadata_path, f) for f in os.listdir(metadata_path) if f.endswith(".csv")
+          ) if os.path.isdir(metadata_path) else [],
+          outputs=lambda: ["projects_filtered.txt"]),
+    Stage("6", "6_detect_clone.py", "project", serial=True,
+          code=["nicad_operations.py", "clone_detectors.py", "minhash_index.py", "languages.py",
+                "artifact_io.py"],
+          settings=["language", "compression", "detector"], inputs=project_csv, outputs=snapshot_xmls),
+    Stage("7", "7_parser_clones.py", "project", deps=["6"],
+          code=["parser_operations.py", "git_objects.py", "clone_store.py", "artifact_io.py",
+                "fingerprint_index.py"],
+          inputs=project_csv,
+          outputs=lambda project: snapshot_xmls(project)
+          + [os.path.join(search_results_path, "fingerprint_index.sqlite")]),
+    Stage("8", "8_track_clones.py", "project", deps=["7"],
+          code=["tracking_operations.py", "clone_tracking.py", "git_objects.py", "clone_store.py",
+                "artifact_io.py"],
+          settings=["line_mapping"], inputs=project_csv, outputs=tracked_outputs),
+    Stage("9", "9_made_lifecycle.py", "project", deps=["8"], outputs=classified_outputs),
+    Stage("10", "10_count_lifecycle.py", "global", deps=["9"]),
+    Stage("11", "11_attribute_added_lines.py", "batch", deps=["8"], code=["hunk_index.py", "git_objects.py"],
+          inputs=lambda project: project_csv(project) + [os.path.join(aidev_path, "pr_commit_details.csv")],
+          outputs=attributed_outputs),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+# ==========================================
+# Content hashes
+# ==========================================
+class HashCache:
+    """File digests, recomputed only when size or mtime changed."""
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def digest(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return "missing"
+
+        entry = self.entries.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self.entries[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+
+def signature(stage, project, upstream, hashes):
+    """Hash of everything the (stage, project) part depends on."""
+    config = configparser.ConfigParser()
+    config.read("settings.ini")
+    payload = {
+        "code": [
+            (f, hashes.digest(os.path.join(SCRIPT_DIR, f)))
+            for f in [stage.script] + COMMON_CODE + stage.code
+        ],
+        "settings": [(k, config.get("DETAILS", k, fallback=None)) for k in stage.settings],
+        "inputs": [(os.path.relpath(f), hashes.digest(f)) for f in stage.inputs(project)],
+        "upstream": upstream,
+    }
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+# ==========================================
+# Running
+# ==========================================
+class Pipeline:
+    def __init__(self, jobs, force, dry_run):
+        self.jobs = jobs
+        self.force = force
+        self.dry_run = dry_run
+        self.state = self._load_state()
+        self.hashes = HashCache(self.state.setdefault("hashes", {}))
+        self.state_lock = threading.Lock()
+        self.ran = []
+        self.failed = []
+
+    def _load_state(self):
+        if os.path.exists(STATE_FILE):
+            try:
+                with open(STATE_FILE, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print(f"⚠️ Unreadable {STATE_FILE}, everything will be re-run.")
+        return {}
+
+    def _save_state(self):
+        tmp = STATE_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, STATE_FILE)
+
+    def recorded(self, stage, partition):
+        return self.state.get("signatures", {}).get(stage.name, {}).get(partition)
+
+    def record(self, stage, partitions, sig_by_partition):
+        with self.state_lock:
+            signatures = self.state.setdefault("signatures", {}).setdefault(stage.name, {})
+            for partition in partitions:
+                signatures[partition] = sig_by_partition[partition]
+            self._save_state()
+
+    def is_stale(self, stage, partition, sig):
+        return self.force or self.recorded(stage, partition) != sig
+
+    def run_script(self, stage, projects=None):
+        """Run the stage script, restricted to projects if given. True on success."""
+        label = f"{stage.script}" + (f" [{', '.join(projects)}]" if projects else "")
+        if self.dry_run:
+            print(f"🔸 would run {label}")
+            return True
+
+        env = dict(os.environ)
+        if projects is not None:
+            env["LIFECYCLE_PROJECTS"] = ",".join(projects)
+
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        suffix = projects[0] if projects and len(projects) == 1 else "all"
+        log_path = os.path.join(LOGS_DIR, f"{stage.name}-{suffix}.log")
+
+        print(f"▶️ {label}")
+        with (stage.lock if stage.serial else _no_lock), open(log_path, "w", encoding="utf-8") as log:
+            result = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, stage.script)], env=env,
+                                    stdout=log, stderr=subprocess.STDOUT)
+
+        if result.returncode != 0:
+            print(f"❌ {label} failed (log: {log_path})")
+            self.failed.append(label)
+            return False
+        print(f"✅ {label}")
+        self.ran.append(label)
+        return True
+
+    # --- Stages 0-5: once, in order ---
+    def run_global_prefix(self):
+        previous = None
+        for stage in STAGES:
+            if int(stage.name) > 5:
+                break
+
+            sig = signature(stage, None, previous, self.hashes)
+            missing = [p for p in stage.outputs() if not os.path.exists(p)]
+            if self.is_stale(stage, "all", sig) or missing:
+                if not self.run_script(stage):
+                    return False
+                if not self.dry_run:
+                    self.record(stage, ["all"], {"all": sig})
+            previous = sig
+        return True
+
+    # --- Stages 6-11: per project, as a graph ---
+    def run_projects(self, projects):
+        # Signatures of every (stage, project), computed up front: a part
+        # depends on the signatures of its upstream parts, not on their outputs
+        sigs = {}
+        for stage in STAGES:
+            if int(stage.name) <= 5:
+                continue
+            if stage.scope == "global":
+                upstream = [(p, sigs[(dep, p)]) for dep in stage.deps for p in projects]
+                sigs[(stage.name, "all")] = signature(stage, None, upstream, self.hashes)
+            else:
+                for project in projects:
+                    upstream = [sigs[(dep, project)] for dep in stage.deps]
+                    sigs[(stage.name, project)] = signature(stage, project, upstream, self.hashes)
+
+        # Nodes: (stage name, partition) -> (stage, projects it runs, dependencies)
+        nodes = {}
+        for stage in STAGES:
+            if int(stage.name) <= 5:
+                continue
+            if stage.scope == "project":
+                for project in projects:
+                    nodes[(stage.name, project)] = (
+                        stage, [project], [(dep, project) for dep in stage.deps]
+                    )
+            elif stage.scope == "batch":
+                nodes[(stage.name, "batch")] = (
+                    stage, list(projects), [(dep, p) for dep in stage.deps for p in projects]
+                )
+            else:
+                nodes[(stage.name, "all")] = (
+                    stage, None, [(dep, p) for dep in stage.deps for p in projects]
+                )
+
+        done, failed = set(), set()
+        pending = dict(nodes)
+        running = {}
+
+        def node_task(key):
+            stage, node_projects, _ = nodes[key]
+            if stage.scope == "global":
+                if not self.is_stale(stage, "all", sigs[key]):
+                    return True
+                ok = self.run_script(stage)
+                if ok and not self.dry_run:
+                    self.record(stage, ["all"], {"all": sigs[key]})
+                return ok
+
+            stale = [p for p in node_projects if self.is_stale(stage, p, sigs[(stage.name, p)])]
+            if not stale:
+                return True
+            ok = self.run_script(stage, stale)
+            if not ok or self.dry_run:
+                return ok
+
+            # A project is done only when what the stage writes for it exists
+            complete = []
+            for project in stale:
+                missing = [f for f in stage.outputs(project) if not os.path.exists(f)]
+                if missing:
+                    print(f"❌ {stage.script} [{project}]: {len(missing)} missing output(s), e.g. {missing[0]}")
+                    self.failed.append(f"{stage.script} [{project}] (missing outputs)")
+                else:
+                    complete.append(project)
+            self.record(stage, complete, {p: sigs[(stage.name, p)] for p in complete})
+            return len(complete) == len(stale)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                for key in list(pending):
+                    deps = pending[key][2]
+                    if any(d in failed for d in deps):
+                        failed.add(key)
+                        del pending[key]
+                    elif all(d in done for d in deps):
+                        running[executor.submit(node_task, key)] = key
+                        del pending[key]
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        # Only this part fails; the others go on and keep their state
+                        print(f"❌ stage {key[0]} [{key[1]}] raised {e!r}")
+                        self.failed.append(f"stage {key[0]} [{key[1]}] ({e!r})")
+                        ok = False
+                    (done if ok else failed).add(key)
+
+        # Stage 7 runs write the timings of their projects only: merge them
+        if any(label.startswith(STAGES_BY_NAME["7"].script) for label in self.ran + self.failed):
+            from pipeline_stages import merge_conversion_timings
+            merge_conversion_timings()
+
+        return not failed
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_no_lock = _NoLock()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline, re-running only what changed.")
+    parser.add_argument("--jobs", type=int, default=4, help="Parts (stage, project) run at the same time")
+    parser.add_argument("--force", action="store_true", help="Re-run everything")
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would run")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(args.jobs, args.force, args.dry_run)
+
+    ok = pipeline.run_global_prefix()
+    if ok:
+        if not os.path.exists("projects_filtered.txt"):
+            print("⚠️ projects_filtered.txt not found (did stage 5 run?)")
+            ok = False
+        else:
+            with open("projects_filtered.txt", "r", encoding="utf-8") as f:
+                projects = [p for p in f.read().split('\n') if p]
+            ok = pipeline.run_projects(projects)
+
+    if not args.dry_run:
+        print(f"\n📋 {len(pipeline.ran)} part(s) run, {len(pipeline.failed)} failed")
+        for label in pipeline.failed:
+            print(f"   ❌ {label}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import os
+import time
+import hashlib
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from git_objects import BlobReader
+from artifact_io import open_artifact, detect_compression, COMPRESSION_EXTENSIONS
+from clone_store import HAS_PYARROW, SnapshotWriter, snapshot_table_path, write_snapshot_from_xml
+from fingerprint_index import scan_set_offsets
+
+
+def normalize_text(text):
+    """Normalize text for fingerprint (remove spaces and lowercase)."""
+    return "".join(text.split()).lower()
+
+
+def get_snippet_content(filepath, start_line, end_line):
+    """Read the snippet (code chunk) from the physical file on disk."""
+    if not os.path.exists(filepath):
+        return ""
+    try:
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = f.readlines()
+            # NiCad is 1-based (inclusive). Python is 0-based (end index is exclusive).
+            snippet = "".join(lines[start_line - 1: end_line])
+            return snippet
+    except Exception:
+        return ""
+
+
+def generate_sticky_fingerprint(nicad_class_node, read_snippet=get_snippet_content):
+    """
+    Generate MD5 hash based on the content of the FIRST clone (exemplar).
+    read_snippet(file, start, end) returns the code of a fragment; by default
+    it reads the checked out file on disk.
+    """
+    sources = nicad_class_node.findall("source")
+    if not sources:
+        return "0000000000000000"
+
+    # Take the first as representative
+    exemplar = sources[0]
+
+    file_path = exemplar.get("file")
+    start = int(exemplar.get("startline"))
+    end = int(exemplar.get("endline"))
+
+    content = read_snippet(file_path, start, end)
+
+    # Fallback: if the first file does not exist/is empty, try the second
+    if not content and len(sources) > 1:
+        exemplar = sources[1]
+        content = read_snippet(
+            exemplar.get("file"),
+            int(exemplar.get("startline")),
+            int(exemplar.get("endline"))
+        )
+
+    if not content:
+        return "0000000000000000"
+
+    normalized_content = normalize_text(content)
+    return hashlib.md5(normalized_content.encode('utf-8')).hexdigest()
+
+
+# Attributes of the generic <check> node (kept from the Simian layout)
+CHECK_ATTRIBUTES = {
+    "failOnDuplication": "true",
+    "ignoreCharacterCase": "true",
+    "ignoreCurlyBraces": "true",
+    "ignoreIdentifierCase": "true",
+    "ignoreModifiers": "true",
+    "ignoreStringCase": "true",
+    "threshold": "6",
+}
+
+INDENT = "    "
+
+
+def escape_attribute(value):
+    """Escape an attribute value the same way minidom does."""
+    return escape(str(value), {'"': "&quot;"})
+
+
+def format_tag(tag, attributes, depth, self_closing=False):
+    """Format one indented XML tag line."""
+    attrs = " ".join(
+        f'{name}="{escape_attribute(value)}"' for name, value in attributes.items()
+    )
+    end = "/>" if self_closing else ">"
+    return f"{INDENT * depth}<{tag} {attrs}{end}\n"
+
+
+def is_already_converted(xml_path):
+    """
+    Check whether the XML already has the generic <clones><check> layout.
+    Only the first two start tags are read, the document is never fully parsed.
+    """
+    seen_root = False
+    with open_artifact(xml_path, "rb") as f:
+        for _, elem in ET.iterparse(f, events=("start",)):
+            if not seen_root:
+                if elem.tag != "clones":
+                    return False
+                seen_root = True
+                continue
+            # NiCad also uses <clones> as root; the first child tells them apart
+            return elem.tag == "check"
+    return False
+
+
+def write_generic_xml(xml_path, out, read_snippet=get_snippet_content, table_writer=None,
+                      set_index=None):
+    """
+    Stream the NiCad <class> elements of xml_path and write the generic
+    <set>/<block> structure to the open file object out.
+    Each <class> is discarded once written, so memory does not grow with the
+    number of clone classes. When table_writer (a clone_store.SnapshotWriter)
+    is given, every set is also added to the columnar snapshot file.
+    When set_index (a list) is given, (fingerprint, byte offset of the <set>
+    tag, blocks) is appended to it for every set (see fingerprint_index).
+    Returns the number of sets written.
+    """
+    offset = 0
+
+    def write(text):
+        nonlocal offset
+        out.write(text)
+        if set_index is not None:
+            offset += len(text.encode("utf-8"))
+
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write("<clones>\n")
+
+    wrote_check = False
+    root = None
+    n_sets = 0
+
+    with open_artifact(xml_path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+
+            if elem.tag != "class":
+                continue
+
+            # 1. Extract metadata
+            nlines = elem.get("nlines", "0")
+            similarity = elem.get("similarity", "100")
+            sources = elem.findall("source")
+
+            # 2. Generate fingerprint
+            fingerprint = generate_sticky_fingerprint(elem, read_snippet)
+
+            if not wrote_check:
+                write(format_tag("check", CHECK_ATTRIBUTES, 1))
+                wrote_check = True
+
+            # 3. Write <set> node
+            blocks = [(s.get("file"), s.get("startline"), s.get("endline")) for s in sources]
+            if set_index is not None:
+                set_index.append((fingerprint, offset, blocks))
+
+            write(format_tag("set", {
+                "lineCount": nlines,
+                "fingerprint": fingerprint,
+                "similarity": similarity,
+                "nclones": str(len(sources)),
+            }, 2))
+
+            # 4. Write <block> nodes for each source
+            for file_path, start, end in blocks:
+                write(format_tag("block", {
+                    "sourceFile": file_path,
+                    "startLineNumber": start,
+                    "endLineNumber": end,
+                }, 3, self_closing=True))
+
+            write(f"{INDENT * 2}</set>\n")
+            n_sets += 1
+
+            if table_writer is not None:
+                table_writer.add_set(fingerprint, nlines, similarity, blocks)
+
+            # Drop the processed class so the partial tree stays empty
+            elem.clear()
+            root.clear()
+
+    if wrote_check:
+        out.write(f"{INDENT}</check>\n")
+    else:
+        out.write(format_tag("check", CHECK_ATTRIBUTES, 1, self_closing=True))
+
+    out.write("</clones>")
+    return n_sets
+
+
+def convert_and_overwrite(xml_path, read_snippet=get_snippet_content, write_table=False,
+                          set_index=None):
+    """
+    Read the XML (NiCad format) as a stream, write the NEW generic structure
+    to a temporary file and atomically replace the original with it.
+    Compressed XMLs (.gz/.zst) are read and rewritten with the same
+    compression. With write_table, the columnar snapshot file (clone_store) is written in
+    the same pass, and so are the fingerprint index entries when set_index
+    (a list) is given.
+    Returns (status, number of sets) where status is "converted",
+    "skipped" (already generic) or "failed".
+    """
+    try:
+        # If it has already been converted (root tag is 'clones' and has 'check'), do nothing
+        if is_already_converted(xml_path):
+            return "skipped", 0
+    except Exception as e:
+        print(f"❌ Error reading XML {xml_path}: {e}")
+        return "failed", 0
+
+    # The temporary file lives next to the original so os.replace stays atomic
+    directory = os.path.dirname(os.path.abspath(xml_path))
+    compression = detect_compression(xml_path)
+    suffix = ".xml" + (COMPRESSION_EXTENSIONS[compression] if compression else "")
+    fd, tmp_path = tempfile.mkstemp(prefix=".converting-", suffix=suffix, dir=directory)
+    os.close(fd)
+    tmp_table_path = None
+    table_writer = None
+
+    try:
+        if write_table:
+            table_fd, tmp_table_path = tempfile.mkstemp(
+                prefix=".converting-", suffix=".parquet", dir=directory
+            )
+            os.close(table_fd)
+            table_writer = SnapshotWriter(tmp_table_path)
+
+        with open_artifact(tmp_path, "wt", encoding="utf-8") as out:
+            n_sets = write_generic_xml(xml_path, out, read_snippet, table_writer, set_index)
+
+        # mkstemp creates 0600 files; keep the permissions of the original
+        shutil.copymode(xml_path, tmp_path)
+        os.replace(tmp_path, xml_path)
+
+        # The XML goes first: if we stop here, the next run rebuilds the table from it
+        if table_writer is not None:
+            table_writer.close()
+            shutil.copymode(xml_path, tmp_table_path)
+            os.replace(tmp_table_path, snapshot_table_path(xml_path))
+
+        return "converted", n_sets
+    except Exception as e:
+        print(f"❌ Error converting {xml_path}: {e}")
+        if table_writer is not None:
+            table_writer.close()
+        for path in (tmp_path, tmp_table_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return "failed", 0
+
+
+def convert_snapshot(task):
+    """
+    Worker for one search_results XML: task is (xml_path, repo_path, sha,
+    needs_index). Fingerprints are computed from the blobs at sha, so the
+    shared working tree is never checked out and tasks can run in parallel.
+    The columnar snapshot file is written too when pyarrow is available.
+    The fingerprint index entries are returned (the caller writes them) for
+    converted XMLs, and for skipped ones when needs_index is set.
+    """
+    xml_path, repo_path, sha, needs_index = task
+    started = time.perf_counter()
+    set_index = []
+
+    with BlobReader(repo_path, sha) as reader:
+        status, n_sets = convert_and_overwrite(
+            xml_path, reader.get_snippet_content, write_table=HAS_PYARROW, set_index=set_index
+        )
+
+    # XMLs converted before the tables existed only need the table
+    if status == "skipped" and HAS_PYARROW and not os.path.exists(snapshot_table_path(xml_path)):
+        try:
+            write_snapshot_from_xml(xml_path)
+        except Exception as e:
+            print(f"❌ Error writing snapshot table for {xml_path}: {e}")
+
+    index_entries = None
+    if status == "converted":
+        index_entries = set_index
+    elif status == "skipped" and needs_index:
+        try:
+            index_entries = scan_set_offsets(xml_path)
+        except Exception as e:
+            print(f"❌ Error indexing fingerprints of {xml_path}: {e}")
+
+    return {
+        "xml_path": xml_path,
+        "status": status,
+        "n_sets": n_sets,
+        "bytes": os.path.getsize(xml_path) if os.path.exists(xml_path) else 0,
+        "seconds": round(time.perf_counter() - started, 4),
+        "index_entries": index_entries,
+    }
@@ -1,3 +1,5 @@
+import os
+import configparser
 from pathlib import Path
 
 aidev_path = Path("AIDev_Dataset").resolve()
@@ -8,3 +10,25 @@ search_results_path = Path("search_results").resolve()
 lifetimes_path = Path("lifetimes").resolve()
 clones_classified_path = Path("clones_classified").resolve()
 summary_path = Path("summary").resolve()
+genealogy_path = Path("genealogy").resolve()
+
+
+def load_projects(path="projects_filtered.txt"):
+    """
+    Projects to process: the ones listed in projects_filtered.txt, or only
+    those in the comma-separated LIFECYCLE_PROJECTS environment variable
+    (the orchestrator uses it to run a stage on some projects only).
+    """
+    selected = os.environ.get("LIFECYCLE_PROJECTS")
+    if selected is not None:
+        return [p for p in selected.split(",") if p]
+
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().split('\n')
+
+
+def load_settings(path="settings.ini"):
+    """The [DETAILS] section of settings.ini."""
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config["DETAILS"]
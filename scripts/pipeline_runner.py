@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Run several stages in one process, passing DataFrames from a stage to the
+next instead of writing and re-reading CSVs.
+
+settings.ini and projects_filtered.txt are read once, and a stage only
+loads its inputs from disk when the stage that produces them is not part of
+the run. The outputs of every stage are still written, as the numbered
+scripts do, unless --final-only is given.
+
+Usage (from the scripts folder):
+    python3 pipeline_runner.py --stages 1-4
+    python3 pipeline_runner.py --stages 7-10 --workers 8
+    python3 pipeline_runner.py --stages 1,3,4 --figures
+"""
+import os
+import glob
+import time
+import argparse
+import pipeline_stages as stages
+import instrumentation
+from languages import LANGUAGES
+from clone_detectors import detector_from_settings
+from paths import clones_classified_path, summary_path, load_projects, load_settings
+
+STAGE_NAMES = {
+    0: "download the AIDev dataset",
+    1: "select the PR commits",
+    2: "clone the repositories",
+    3: "find the parent commits",
+    4: "split the commits per project",
+    5: "list the projects",
+    6: "detect the clones",
+    7: "convert the XMLs",
+    8: "track the clones",
+    9: "classify the lifecycles",
+    10: "count PRs by category",
+}
+
+
+def parse_stages(text):
+    """'7-10' or '1,3,4' -> sorted stage numbers."""
+    numbers = set()
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            numbers.update(range(int(first), int(last) + 1))
+        else:
+            numbers.add(int(part))
+
+    unknown = numbers - set(STAGE_NAMES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stage(s): {sorted(unknown)}")
+    return sorted(numbers)
+
+
+class Runner:
+    """Holds the settings and the frames produced so far."""
+
+    def __init__(self, selected, workers=1, chunksize=None, figures=False, final_only=False):
+        self.selected = selected
+        self.workers = workers
+        self.chunksize = chunksize
+        self.figures = figures
+        self.final_only = final_only
+        self.settings = load_settings()
+        self.language = self.settings["language"]
+
+        self.aidev = None            # stages 0 -> 1
+        self.commits = None          # stage 1 -> 2, 3
+        self.commits_parents = None  # stage 3 -> 4
+        self.metadata = None         # stage 4 -> 5..8, {project: commits}
+        self.projects = None         # stage 5 -> 6..9
+        self.lifetimes = None        # stage 8 -> 9, {project: lifetimes}
+        self.clones = None           # stage 9 -> 10
+
+    def writes(self, stage):
+        return not self.final_only or stage == self.selected[-1]
+
+    def get_projects(self):
+        if self.projects is None:
+            self.projects = load_projects()
+        return self.projects
+
+    # --- Stages ---
+    def stage_0(self):
+        self.aidev = stages.download_aidev()
+        if self.writes(0):
+            stages.save_aidev(self.aidev)
+
+    def stage_1(self):
+        aidev = self.aidev if self.aidev is not None else stages.load_aidev()
+        self.aidev = None  # only stage 1 needs the raw tables
+        self.commits = stages.select_pr_commits(aidev, self.language, stages.github_headers())
+        counts = stages.commits_per_pr(self.commits)
+        if self.writes(1):
+            stages.save_pr_commits(self.commits, counts, self.language)
+        if self.figures:
+            print(f"🖼️ {stages.plot_commits_per_pr(counts, self.language)}")
+        print(f"PRs: {len(counts)}, commits: {len(self.commits)}")
+
+    def stage_2(self):
+        commits = self.commits if self.commits is not None else stages.load_pr_commits(self.language)
+        stages.clone_repositories(commits, self.language, stages.github_headers())
+
+    def stage_3(self):
+        commits = self.commits if self.commits is not None else stages.load_pr_commits(self.language)
+        self.commits_parents = stages.add_parents(commits)
+        if self.writes(3):
+            output_csv = f"{stages.metadata_path}/{self.language.lower()}_pr_commits_with_parents.csv"
+            self.commits_parents.to_csv(output_csv, index=False)
+
+    def stage_4(self):
+        commits = self.commits_parents
+        if commits is None:
+            commits = stages.load_pr_commits(self.language, with_parents=True)
+        self.metadata = stages.split_by_repository(commits)
+        if self.writes(4):
+            stages.save_project_frames(self.metadata)
+
+    def stage_5(self):
+        # The metadata files, as 5_take_projects.py lists them, and the
+        # projects stage 4 split in this run even when it did not write them
+        self.projects = stages.list_projects(self.metadata or ())
+        if self.writes(5):
+            stages.save_project_list(self.projects)
+
+    def metadata_of(self, project):
+        if self.metadata is not None and project in self.metadata:
+            return self.metadata[project]
+        return stages.read_metadata(project)
+
+    def stage_6(self):
+        language = LANGUAGES[self.language]
+        compression = self.settings.get("compression", fallback="none")
+        with detector_from_settings(self.settings, language) as detector:
+            for project in self.get_projects():
+                df = self.metadata_of(project)
+                if df is not None:
+                    stages.detect_project_clones(project, df, language, compression, detector)
+
+    def stage_7(self):
+        timings = stages.convert_xmls(self.get_projects(), self.workers, self.chunksize or 16,
+                                      self.metadata)
+        if timings and self.writes(7):
+            stages.write_conversion_summary(timings)
+
+    def stage_8(self):
+        self.lifetimes = stages.track_clones(
+            self.get_projects(), self.workers, self.chunksize or 4,
+            self.settings.getint("snapshot_cache_size", fallback=256),
+            self.settings.getboolean("line_mapping", fallback=True),
+            self.metadata
+        )
+        if self.writes(8):
+            stages.save_lifetimes(self.lifetimes)
+
+    def stage_9(self):
+        if self.lifetimes is not None:
+            frames = (
+                stages.clean_lifetimes(project, df, f"lifetimes of {project}")
+                for project, df in self.lifetimes.items()
+            )
+        else:
+            frames = (stages.load_lifetimes(project) for project in self.get_projects())
+
+        self.clones = stages.classify_lifecycle(frames)
+        if self.clones is None:
+            print("⚠️ No lifetimes to classify.")
+        elif self.writes(9):
+            stages.save_classified(self.clones)
+
+    def stage_10(self):
+        if self.clones is not None:
+            totals = stages.count_prs_by_category(self.clones) if not self.clones.empty else {}
+        else:
+            # From the files, through the same manifest as 10_count_lifecycle.py:
+            # only new or changed files are read
+            files = sorted(glob.glob(os.path.join(clones_classified_path, "*_clone_classified.csv")))
+            manifest, n_read, n_reused, n_removed = stages.update_summary_manifest(
+                files, stages.load_summary_manifest())
+            print(f"♻️ {n_read} file(s) read, {n_reused} reused from the manifest, {n_removed} removed.")
+            instrumentation.emit("summary_files", read=n_read, reused=n_reused, removed=n_removed)
+            if self.writes(10):
+                stages.save_summary_manifest(manifest)
+            totals = stages.merge_partial_counts(manifest)
+
+        if not totals:
+            print("🚨 No valid data was loaded.")
+            return
+
+        summary_df = stages.summarize_categories(totals)
+        print(summary_df)
+        if self.writes(10):
+            os.makedirs(summary_path, exist_ok=True)
+            summary_file = os.path.join(summary_path, "summary_pr_by_category.csv")
+            summary_df.to_csv(summary_file, index=False)
+            print(f"✅ Result saved to: {summary_file}")
+
+    def run(self):
+        timings = []
+        for stage in self.selected:
+            print(f"\n===== Stage {stage}: {STAGE_NAMES[stage]} =====")
+            instrumentation.set_stage(stage)
+            started = time.perf_counter()
+            getattr(self, f"stage_{stage}")()
+            timings.append((stage, time.perf_counter() - started))
+            instrumentation.emit("stage_end", seconds=round(timings[-1][1], 3))
+
+        print("\n📋 Stage times:")
+        for stage, seconds in timings:
+            print(f"  {stage:>2} {STAGE_NAMES[stage]}: {seconds:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several stages in one process.")
+    parser.add_argument("--stages", type=parse_stages, default=parse_stages("1-10"),
+                        help="Stages to run, e.g. 1-4, 7-10 or 1,3,4 (default: 1-10)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes of stages 7 and 8 (1 = serial, in this process)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Work units dispatched to a worker at a time (stage default if omitted)")
+    parser.add_argument("--figures", action="store_true", help="Draw the figures of stage 1")
+    parser.add_argument("--final-only", action="store_true",
+                        help="Only write the outputs of the last stage")
+    args = parser.parse_args()
+
+    Runner(args.stages, args.workers, args.chunksize, args.figures, args.final_only).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,916 @@
+"""
+The numbered stages as functions with explicit inputs and outputs.
+
+Each numbered script reads its inputs from disk, calls the functions of its
+stage and writes the results; pipeline_runner.py calls the same functions in
+one process and hands the DataFrames of a stage straight to the next one.
+Nothing here reads settings.ini or projects_filtered.txt: callers pass the
+values in (see paths.load_settings and paths.load_projects).
+"""
+import os
+import glob
+import json
+import hashlib
+import subprocess
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+import instrumentation
+from languages import LANGUAGES
+from paths import (aidev_path, metadata_path, figures_path, git_repos_path, search_results_path,
+                   lifetimes_path, clones_classified_path, summary_path)
+
+AIDEV_TABLES = ["repository", "pull_request", "pr_commits", "pr_commit_details"]
+
+
+def github_headers():
+    """Authorization header with the token of the .env file."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return {"Authorization": f"token {os.getenv('GITHUB_TOKEN')}"}
+
+
+def read_metadata(project):
+    """Commits of one project (metadata/<project>.csv), or None."""
+    metadata_csv = f"{metadata_path}/{project}.csv"
+    if not os.path.exists(metadata_csv):
+        print(f"⚠️ CSV not found: {metadata_csv}")
+        return None
+    try:
+        return pd.read_csv(metadata_csv)
+    except Exception:
+        return None
+
+
+# ==========================================
+# Stage 0: AIDev dataset
+# ==========================================
+def download_aidev():
+    """The AIDev tables from Hugging Face, by name."""
+    return {
+        name: pd.read_parquet(f"hf://datasets/hao-li/AIDev/{name}.parquet")
+        for name in AIDEV_TABLES
+    }
+
+
+def save_aidev(tables):
+    os.makedirs(aidev_path, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(os.path.join(aidev_path, f"{name}.csv"), index=False)
+
+
+def load_aidev():
+    return {name: pd.read_csv(os.path.join(aidev_path, f"{name}.csv")) for name in AIDEV_TABLES}
+
+
+# ==========================================
+# Stage 1: commits of the merged PRs of a language
+# ==========================================
+PR_COMMIT_COLUMNS = [
+    "id",
+    "number_pr",
+    "number_commit",
+    "repo_url",
+    "merged_at",
+    "id_pr",
+    "sha_commit",
+    "url_commit",
+    "url_pr",
+    "parent",
+    "child"
+]
+
+
+def get_base_sha(repo_url: str, pr_number: int, headers) -> str:
+    import requests
+
+    try:
+        parts = repo_url.replace("https://github.com/", "").split("/")
+        owner, repo = parts[4], parts[5]
+        api_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
+
+        with instrumentation.timed("api_request", call="pull", pr=int(pr_number)) as event:
+            r = requests.get(api_url, headers=headers)
+            event["http_status"] = r.status_code
+        if r.status_code == 200:
+            data = r.json()
+            return data.get("base", {}).get("sha", None)
+        else:
+            print(f"Failed to fetch base SHA for {api_url} ({r.status_code})")
+            return None
+    except Exception as e:
+        print(f"Error while fetching base SHA: {e}")
+        return None
+
+
+def select_pr_commits_by_language(aidev, languages, headers=None):
+    """
+    One row per commit (with additions) of the merged PRs of every language,
+    numbered in commit order inside each PR, in a single pass over the
+    tables. Returns {language: commits}. headers are used to query the base
+    SHA of every PR (None skips the GitHub API).
+    """
+    repo_df = aidev["repository"]
+    pr_df = aidev["pull_request"]
+    pr_commits = aidev["pr_commits"]
+    pr_commit_details = aidev["pr_commit_details"]
+
+    # Merged PRs of the languages, with their repository
+    merged_prs = pr_df[pr_df["merged_at"].notna()].merge(
+        repo_df,
+        left_on="repo_url",
+        right_on="url",
+        how="left",
+        suffixes=("_pr", "_repo")
+    )
+    valid_prs = merged_prs[merged_prs["language"].isin(languages)]
+    pr_info_by_id = valid_prs.drop_duplicates("id_pr").set_index("id_pr")
+
+    # Unique commits with at least one addition
+    commits_with_details = pr_commits.merge(
+        pr_commit_details.drop(columns=["pr_id"]),
+        on="sha",
+        how="inner"
+    )
+    commits_with_additions = commits_with_details[commits_with_details["additions"] > 0]
+    commits_unique = commits_with_additions.drop_duplicates(subset=["sha", "pr_id"])
+    commits_unique = commits_unique[commits_unique["pr_id"].isin(pr_info_by_id.index)]
+
+    rows = {language: [] for language in languages}
+    desc = f"Processing PRs ({', '.join(languages)})"
+    for pr_id, group in tqdm(commits_unique.groupby("pr_id"), desc=desc):
+        group_sorted = group.sort_values("committed_at") if "committed_at" in group.columns else group
+
+        pr_info = pr_info_by_id.loc[pr_id]
+        repo_url = pr_info["repo_url"]
+        pr_number = pr_info["number"]
+        pr_html_url = pr_info["html_url"]
+        merged_at = pr_info["merged_at"]
+
+        if headers is not None:
+            get_base_sha(repo_url, pr_number, headers)
+
+        for i, (_, row) in enumerate(group_sorted.iterrows(), start=1):
+            current_sha = row["sha"]
+            rows[pr_info["language"]].append({
+                "id": f"{pr_number}_rev{i}",
+                "number_pr": pr_number,
+                "number_commit": i,
+                "repo_url": repo_url,
+                "merged_at": merged_at,
+                "id_pr": pr_id,
+                "sha_commit": current_sha,
+                "url_commit": f"{repo_url}/commit/{current_sha}",
+                "url_pr": pr_html_url,
+                "parent": None,
+                "child": current_sha
+            })
+
+    return {
+        language: pd.DataFrame(language_rows, columns=PR_COMMIT_COLUMNS)
+        for language, language_rows in rows.items()
+    }
+
+
+def select_pr_commits(aidev, language, headers=None):
+    """Commits of the merged PRs of one language (see select_pr_commits_by_language)."""
+    return select_pr_commits_by_language(aidev, [language], headers)[language]
+
+
+def commits_per_pr(commit_df):
+    counts = commit_df.groupby("id_pr")["sha_commit"].count().reset_index()
+    return counts.rename(columns={"sha_commit": "num_commits"})
+
+
+def plot_commits_per_pr(counts, language):
+    """Boxplot of the commits per PR; matplotlib is only imported here."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(figures_path, exist_ok=True)
+    figure_path = f"{figures_path}/boxplot_{language.lower()}.png"
+
+    plt.figure(figsize=(10, 6))
+    plt.boxplot(counts["num_commits"], vert=True, patch_artist=True,
+                boxprops=dict(facecolor="skyblue", color="blue"),
+                medianprops=dict(color="red"),
+                whiskerprops=dict(color="blue"),
+                capprops=dict(color="blue"))
+    plt.title(f"Distribution of commits per PR ({language})")
+    plt.ylabel("Number of commits")
+    plt.xticks([1], ["PRs"])
+    plt.grid(axis="y", linestyle="--", alpha=0.7)
+    plt.savefig(figure_path)
+    plt.close()
+    return figure_path
+
+
+def save_pr_commits(commit_df, counts, language, metadata_dir=metadata_path):
+    """Write the commits CSV and the PRs with one / several commits."""
+    os.makedirs(metadata_dir, exist_ok=True)
+    prefix = f"{metadata_dir}/{language.lower()}"
+
+    commit_df.to_csv(f"{prefix}_pr_commits_without_parents.csv", index=False)
+    counts[counts["num_commits"] == 1].to_csv(f"{prefix}_prs_single_commit.csv", index=False)
+    counts[counts["num_commits"] > 1].to_csv(f"{prefix}_prs_multi_commit.csv", index=False)
+
+
+def load_pr_commits(language, with_parents=False):
+    suffix = "with_parents" if with_parents else "without_parents"
+    csv_path = f"{metadata_path}/{language.lower()}_pr_commits_{suffix}.csv"
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV file not found: {csv_path}")
+    return pd.read_csv(csv_path)
+
+
+# ==========================================
+# Stage 2: clone the repositories
+# ==========================================
+def get_clone_url(api_url: str, headers) -> str | None:
+    """
+    Given the repository API URL (e.g., https://api.github.com/repos/domaframework/doma),
+    returns the 'clone_url' field from the JSON response.
+    """
+    import requests
+
+    try:
+        with instrumentation.timed("api_request", call="repository") as event:
+            r = requests.get(api_url, headers=headers, timeout=15)
+            event["http_status"] = r.status_code
+        if r.status_code == 200:
+            data = r.json()
+            return data.get("clone_url", None)
+        else:
+            print(f"Failed to get clone_url ({r.status_code}) for {api_url}")
+            return None
+    except Exception as e:
+        print(f"Error fetching clone_url for {api_url}: {e}")
+        return None
+
+
+def clone_repositories(commit_df, language, headers):
+    os.makedirs(git_repos_path, exist_ok=True)
+    repos = commit_df["repo_url"].dropna().unique()
+    print(f"{len(repos)} unique repositories found for {language}.")
+
+    for api_url in tqdm(repos, desc=f"Cloning repositories ({language})"):
+        clone_url = get_clone_url(api_url, headers)
+        if not clone_url:
+            print(f"Could not get clone_url for {api_url}")
+            continue
+
+        repo_name = clone_url.split("/")[-1].replace(".git", "")
+        repo_path = os.path.join(git_repos_path, repo_name)
+
+        if os.path.exists(repo_path):
+            print(f"Repository '{repo_name}' already exists, skipping.")
+            continue
+
+        try:
+            with instrumentation.timed("git_clone", project=repo_name):
+                subprocess.run(["git", "clone", clone_url, repo_path], check=True)
+            print(f"Cloned: {repo_name}")
+        except subprocess.CalledProcessError as e:
+            print(f"Error cloning {repo_name}: {e}")
+        except Exception as e:
+            print(f"Unexpected error with {repo_name}: {e}")
+
+
+# ==========================================
+# Stage 3: parent of every commit
+# ==========================================
+def add_parents(commit_df):
+    """Copy of the commits with the parent column filled from the local clones."""
+    df = commit_df.copy()
+    if "parent" not in df.columns:
+        df["parent"] = None
+    df["parent"] = df["parent"].astype(object)
+
+    repos_grouped = df.groupby("repo_url")
+    total_commits = len(df)
+    commit_counter = 0
+    print(f"Processing {len(repos_grouped)} repositories and {total_commits} commits...\n")
+
+    for repo_url, group in repos_grouped:
+        repo_name = repo_url.split("/")[-1].strip()
+        repo_path = os.path.join(git_repos_path, repo_name)
+
+        if not os.path.exists(repo_path):
+            print(f"[WARNING] Repository not found locally: {repo_path}, skipping.")
+            continue
+
+        print(f"\nRepository: {repo_name} ({len(group)} commits)")
+
+        for idx, row in group.iterrows():
+            if idx == 10:
+                break
+
+            commit_sha = row["sha_commit"]
+
+            try:
+                # Fetch remote commits (in case they are not local yet)
+                with instrumentation.timed("git_fetch", project=repo_name, commit=commit_sha):
+                    subprocess.run(["git", "fetch", "--all", "--quiet"], cwd=repo_path, check=False)
+                    subprocess.run(["git", "fetch", "origin", commit_sha], cwd=repo_path, check=False)
+
+                # Get the real parent of the commit
+                result = subprocess.run(
+                    ["git", "rev-list", "--parents", "-n", "1", commit_sha],
+                    cwd=repo_path,
+                    check=True,
+                    capture_output=True,
+                    text=True
+                )
+                output = result.stdout.strip().split()
+                df.loc[row.name, "parent"] = output[1] if len(output) > 1 else None
+
+            except subprocess.CalledProcessError:
+                print(f"Error processing commit {commit_sha} in {repo_name}")
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+
+            commit_counter += 1
+            print(f"[{commit_counter}/{total_commits}] commits processed", end="\r")
+
+    return df
+
+
+# ==========================================
+# Stage 4: one CSV per repository
+# ==========================================
+def repo_name_of(url):
+    # Example: https://api.github.com/repos/domaframework/doma → "doma"
+    return url.rstrip("/").split("/")[-1] if isinstance(url, str) else "unknown"
+
+
+def split_by_repository(commit_df):
+    """Commits of every repository, sorted by PR and commit number."""
+    df = commit_df.copy()
+    df["repo_name"] = df["repo_url"].apply(repo_name_of)
+    return {
+        repo_name: group.sort_values(["number_pr", "number_commit"])
+        for repo_name, group in df.groupby("repo_name")
+    }
+
+
+def save_project_frames(frames, metadata_dir=metadata_path):
+    os.makedirs(metadata_dir, exist_ok=True)
+    for repo_name, df in tqdm(frames.items(), desc="Generating CSVs per repository"):
+        out_path = os.path.join(metadata_dir, f"{repo_name}.csv")
+        df.to_csv(out_path, index=False)
+        print(f"✅ Generated: {out_path} ({len(df)} rows)")
+
+
+# ==========================================
+# Stage 5: project list
+# ==========================================
+# Language-wide tables stages 1-3 write next to the per-project metadata
+LANGUAGE_TABLES = ["pr_commits_without_parents", "pr_commits_with_parents",
+                   "prs_single_commit", "prs_multi_commit"]
+
+
+def is_project(name):
+    """False for the language-wide tables of metadata/ (see LANGUAGE_TABLES)."""
+    return name not in {f"{language.lower()}_{table}" for language in LANGUAGES for table in LANGUAGE_TABLES}
+
+
+def list_projects(extra=()):
+    """
+    Every project with a metadata file, plus the extra project names (e.g.
+    split by stage 4 in memory), without the language-wide tables.
+    """
+    projects = list(extra)
+    for file in os.listdir(metadata_path) if os.path.isdir(metadata_path) else []:
+        if file.endswith(".csv") or file.endswith(".xlsx"):
+            projects.append(os.path.splitext(file)[0])
+    return sorted({project for project in projects if is_project(project)})
+
+
+def save_project_list(projects, output_path="projects_filtered.txt"):
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(projects))
+
+
+# ==========================================
+# Stage 6: NiCad on every parent and child
+# ==========================================
+def detect_project_clones(project, df, language, compression, detector=None):
+    """
+    Run the clone detector (NiCad if None) on the parent and child of every
+    commit of the project. The repository is checked out in place, so
+    projects must run one at a time.
+    """
+    from nicad_operations import run_nicad
+    from artifact_io import find_artifact
+
+    repo_path = f"{git_repos_path}/{project}"
+    if not os.path.exists(repo_path):
+        print(f"⚠️ Repository not found: {repo_path}")
+        return
+    if df.empty:
+        print(f"⚠️ Empty CSV: {metadata_path}/{project}.csv")
+        return
+
+    print(f"\n📦 Processing project: {project} ({len(df)} commits)")
+    search_results_path.mkdir(exist_ok=True)
+
+    # NiCad is found relative to the repository
+    cwd = os.getcwd()
+    os.chdir(repo_path)
+    try:
+        for _, row in tqdm(df.iterrows(), total=len(df), desc=f"Commits of {project}"):
+            number_pr = row["number_pr"]
+            number_commit = row["number_commit"]
+
+            for mode in ("parent", "child"):
+                sha = str(row[mode]).strip()
+                if sha in ["", "None"] or len(sha) <= 5:
+                    continue
+                snapshot = dict(project=project, pr=int(number_pr), commit=int(number_commit), side=mode)
+                try:
+                    with instrumentation.timed("checkout", **snapshot):
+                        subprocess.run(
+                            ["git", "reset", "--hard", sha],
+                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                        )
+                    with instrumentation.timed("nicad", detector=getattr(detector, "name", "nicad"),
+                                               **snapshot) as event:
+                        run_nicad(repo_path, language, number_pr, number_commit, mode, compression, detector)
+                        xml_path = find_artifact(os.path.join(
+                            search_results_path,
+                            f"nicad-result-{project}-{number_pr}-{number_commit}-{mode}.xml"
+                        ))
+                        event["bytes"] = os.path.getsize(xml_path) if xml_path else 0
+                except subprocess.CalledProcessError:
+                    print(f"⚠️ Error checking out {mode} {sha} (PR {number_pr})")
+    finally:
+        os.chdir(cwd)
+
+
+# ==========================================
+# Stage 7: generic XMLs
+# ==========================================
+def collect_pending_xmls(projects, indexed, metadata=None):
+    """
+    List (xml_path, repo_path, sha, needs_index) for every search_results
+    XML of every project. Already converted files are skipped cheaply by the
+    workers; needs_index tells them the XML is missing from the fingerprint
+    index (indexed is the set of snapshot names it already has). metadata
+    maps projects to their commits when they are already loaded.
+    """
+    from artifact_io import find_artifact
+    from fingerprint_index import snapshot_name
+
+    tasks = []
+
+    for project in projects:
+        df = metadata[project] if metadata and project in metadata else read_metadata(project)
+        if df is None:
+            continue
+        repo_path = f"{git_repos_path}/{project}"
+
+        for _, row in df.iterrows():
+            number_pr = row["number_pr"]
+            number_commit = row["number_commit"]
+
+            for mode in ("parent", "child"):
+                sha = str(row[mode]).strip()
+                # Plain, .gz or .zst, whichever stage 6 wrote
+                xml_path = find_artifact(os.path.join(
+                    search_results_path,
+                    f"nicad-result-{project}-{number_pr}-{number_commit}-{mode}.xml"
+                ))
+
+                if xml_path and sha and sha not in ("None", "nan"):
+                    tasks.append((xml_path, repo_path, sha, snapshot_name(xml_path) not in indexed))
+
+    return tasks
+
+
+# Per-file timings of stage 7, one CSV per project
+CONVERSION_TIMINGS_DIR = os.path.join(summary_path, "conversion_timings")
+
+
+def convert_xmls(projects, workers=1, chunksize=16, metadata=None):
+    """
+    Convert the NiCad XMLs of the projects and update the fingerprint index.
+    Returns the per-file timings.
+    """
+    from parser_operations import convert_snapshot
+    from fingerprint_index import FingerprintIndex
+
+    # The index is written here only, workers just return its entries
+    timings = []
+    with FingerprintIndex() as fingerprint_index:
+        tasks = collect_pending_xmls(projects, fingerprint_index.indexed_snapshots(), metadata)
+        print(f"\n📦 Converting {len(tasks)} XMLs (generic pattern) with {workers} worker(s)")
+
+        project_of = {task[0]: os.path.basename(task[1]) for task in tasks}
+
+        def handle_result(result):
+            entries = result.pop("index_entries")
+            if entries is not None:
+                fingerprint_index.add_snapshot(result["xml_path"], entries)
+            result["project"] = project_of[result["xml_path"]]
+            timings.append(result)
+            instrumentation.emit(
+                "convert_xml", project=result["project"],
+                xml=os.path.basename(result["xml_path"]), status=result["status"],
+                seconds=result["seconds"], bytes=result["bytes"], n_sets=result["n_sets"]
+            )
+
+        if workers > 1:
+            with Pool(processes=workers) as pool:
+                for result in tqdm(pool.imap_unordered(convert_snapshot, tasks, chunksize=chunksize),
+                                   total=len(tasks), desc="Converting XMLs"):
+                    handle_result(result)
+        else:
+            for task in tqdm(tasks, desc="Converting XMLs"):
+                handle_result(convert_snapshot(task))
+
+    return timings
+
+
+def write_conversion_summary(timings):
+    """
+    Save the per-file timings, one file per project so concurrent runs on
+    other projects keep theirs, merge them and print the totals.
+    """
+    os.makedirs(CONVERSION_TIMINGS_DIR, exist_ok=True)
+    df = pd.DataFrame(timings)
+    for project, project_df in df.groupby("project", sort=False):
+        project_df.to_csv(os.path.join(CONVERSION_TIMINGS_DIR, f"{project}.csv"), index=False)
+    timings_csv = merge_conversion_timings()
+
+    counts = df["status"].value_counts()
+    converted = df[df["status"] == "converted"]
+
+    print("\n=== Conversion summary ===")
+    for status in ("converted", "skipped", "failed"):
+        print(f"{status}: {counts.get(status, 0)}")
+
+    if not converted.empty:
+        print(f"Total time: {converted['seconds'].sum():.1f}s")
+        print(f"Median per file: {converted['seconds'].median():.3f}s")
+        print("Slowest files:")
+        for _, row in converted.nlargest(5, "seconds").iterrows():
+            print(f"  {row['seconds']:.2f}s  {os.path.basename(row['xml_path'])} ({row['n_sets']} sets)")
+
+    print(f"📄 Timings saved to: {timings_csv}")
+
+
+def merge_conversion_timings():
+    """summary/conversion_timings.csv from the timings of every project; returns its path."""
+    timings_csv = os.path.join(summary_path, "conversion_timings.csv")
+    parts = sorted(glob.glob(os.path.join(CONVERSION_TIMINGS_DIR, "*.csv")))
+    if not parts:
+        return timings_csv
+    # Written aside and moved, so a reader never sees half a file
+    tmp = f"{timings_csv}.{os.getpid()}.tmp"
+    pd.concat([pd.read_csv(part) for part in parts], ignore_index=True).to_csv(tmp, index=False)
+    os.replace(tmp, timings_csv)
+    return timings_csv
+
+
+# ==========================================
+# Stage 8: clone lifetimes
+# ==========================================
+def collect_pr_units(projects, metadata=None):
+    """
+    List one work unit (project, pr_id, commits) per PR, PRs of a project
+    next to each other so a worker keeps reusing that project's state.
+    Also returns the PR ids of every project, in output order.
+    """
+    units = []
+    project_prs = {}
+
+    for project in projects:
+        df = metadata[project] if metadata and project in metadata else read_metadata(project)
+        if df is None or df.empty:
+            continue
+
+        project_prs[project] = []
+        for pr_id, pr_group in df.groupby("number_pr"):
+            pr_group = pr_group.sort_values("number_commit")
+            commits = list(zip(
+                pr_group["number_commit"].tolist(),
+                pr_group["parent"].astype(str).str.strip().tolist(),
+                pr_group["child"].astype(str).str.strip().tolist()
+            ))
+            units.append((project, pr_id, commits))
+            project_prs[project].append(pr_id)
+
+    return units, project_prs
+
+
+def track_units(units, workers=1, chunksize=4, snapshot_cache_size=256, line_mapping=True):
+    """Results of track_pr_unit for every unit, in completion order."""
+    from tracking_operations import configure, track_pr_unit
+
+    if workers > 1:
+        with Pool(processes=workers, initializer=configure,
+                  initargs=(snapshot_cache_size, line_mapping)) as pool:
+            yield from tqdm(pool.imap_unordered(track_pr_unit, units, chunksize=chunksize),
+                            total=len(units), desc="Tracking PRs")
+    else:
+        configure(snapshot_cache_size, line_mapping)
+        for unit in tqdm(units, desc="Tracking PRs"):
+            yield track_pr_unit(unit)
+
+
+def track_clones(projects, workers=1, chunksize=4, snapshot_cache_size=256, line_mapping=True,
+                 metadata=None):
+    """Lifetimes DataFrame of every project with clones, rows in PR order."""
+    from tracking_operations import LIFETIME_COLUMNS
+
+    units, project_prs = collect_pr_units(projects, metadata)
+    print(f"\n📌 Tracking Individual Snippets - {len(units)} PRs of {len(project_prs)} project(s) "
+          f"with {workers} worker(s)")
+
+    by_pr = {project: {} for project in project_prs}
+    for project, pr_id, df_pr, _ in track_units(units, workers, chunksize,
+                                                snapshot_cache_size, line_mapping):
+        if not df_pr.empty:
+            by_pr[project][pr_id] = df_pr
+
+    lifetimes = {}
+    for project, pr_ids in project_prs.items():
+        frames = [by_pr[project][pr_id] for pr_id in pr_ids if pr_id in by_pr[project]]
+        if not frames:
+            print(f"⚠️ No clone found or tracked for {project}")
+            continue
+        lifetimes[project] = pd.concat(frames, ignore_index=True)[LIFETIME_COLUMNS]
+    return lifetimes
+
+
+def save_lifetimes(lifetimes):
+    os.makedirs(lifetimes_path, exist_ok=True)
+    for project, df in lifetimes.items():
+        output_csv = os.path.join(lifetimes_path, f"{project}_clone_lifetimes.csv")
+        df.to_csv(output_csv, index=False)
+        print(f"✅ CSV saved: {output_csv}")
+
+
+# ==========================================
+# Stage 9: lifecycle categories
+# ==========================================
+# Lifecycle categories, checked in this order (first match wins)
+CATEGORIES = [
+    "ini_mei_final",  # full span, also (1, 1, 1)
+    "unique_ini",
+    "unique_final",
+    "unique_mei",
+    "ini_mei",
+    "mei",
+    "mei_final",
+]
+
+
+def classify_clones(start, end, total):
+    """Category of every clone, from numpy arrays of start, end and total commits."""
+    unique = start == end
+    conditions = [
+        # 1. Full span: captures (1, 1, 1) AND (1, 5, 5)
+        (start == 1) & (end == total),
+        # 2. Unique cases (start == end), not a full span
+        unique & (start == 1),
+        unique & (start == total),
+        unique,
+        # 3. Partial spans (start != end)
+        (start == 1) & (end < total),
+        (1 < start) & (end < total),
+        (start > 1) & (end == total),
+    ]
+    # Safety case, should not be reached
+    return np.select(conditions, CATEGORIES, default="unknown")
+
+
+def clean_lifetimes(project, df, source):
+    """
+    Validated (project, pr, clone_fingerprint, start_commit, end_commit,
+    total_commits) frame from the lifetimes of a project, or None. source
+    names the data in the messages.
+    """
+    if df.empty:
+        # If the file has headers but no data rows
+        print(f"⚠️ Empty CSV (no data rows): {source}")
+        return None
+
+    # Check minimum expected columns
+    required_cols = {"pr", "clone_fingerprint", "start_commit", "end_commit", "total_commits_in_pr"}
+    if not required_cols.issubset(set(df.columns)):
+        print(f"⚠️ Missing columns in {source}. Expected: {required_cols}. Found: {set(df.columns)}")
+        return None
+
+    # Coerce -> converts non-numeric values to NaN
+    start = pd.to_numeric(df["start_commit"], errors="coerce")
+    end = pd.to_numeric(df["end_commit"], errors="coerce")
+    total = pd.to_numeric(df["total_commits_in_pr"], errors="coerce")
+
+    # Remove rows with NaN or total_commits_in_pr <= 0
+    invalid_mask = start.isna() | end.isna() | total.isna() | (total <= 0)
+    if invalid_mask.any():
+        print(f"⚠️ {invalid_mask.sum()} invalid/removed rows in {source} (NaN or total <= 0).")
+        valid = ~invalid_mask
+        df, start, end, total = df[valid], start[valid], end[valid], total[valid]
+
+    if df.empty:
+        print(f"⚠️ After cleaning, CSV is empty: {source}")
+        return None
+
+    return pd.DataFrame({
+        "project": project,
+        "pr": df["pr"].to_numpy(),
+        "clone_fingerprint": df["clone_fingerprint"].to_numpy(),
+        # Force integers (commit indices are integers)
+        "start_commit": start.to_numpy(dtype=np.int64),
+        "end_commit": end.to_numpy(dtype=np.int64),
+        "total_commits": total.to_numpy(dtype=np.int64),
+    })
+
+
+def load_lifetimes(project):
+    """Lifetimes CSV of one project, validated, or None."""
+    input_csv = os.path.join(lifetimes_path, f"{project}_clone_lifetimes.csv")
+    if not os.path.exists(input_csv):
+        print(f"⚠️ File not found: {input_csv}")
+        return None
+
+    try:
+        df = pd.read_csv(input_csv)
+    except pd.errors.EmptyDataError:
+        # If the file is completely empty (0 bytes), pandas raises this error
+        print(f"⚠️ Empty CSV (EmptyDataError): {input_csv}")
+        return None
+    except Exception as e:
+        # Catch other read errors
+        print(f"🚨 Error reading CSV {input_csv}: {e}")
+        return None
+
+    return clean_lifetimes(project, df, input_csv)
+
+
+def classify_lifecycle(frames):
+    """
+    Category, distance and duration of every clone of the frames (outputs
+    of clean_lifetimes / load_lifetimes), in one DataFrame, or None.
+    """
+    frames = [df for df in frames if df is not None]
+    if not frames:
+        return None
+
+    clones = pd.concat(frames, ignore_index=True)
+    print(f"\n📌 Classifying {len(clones)} CLONES of {len(frames)} project(s)")
+
+    start = clones["start_commit"].to_numpy()
+    end = clones["end_commit"].to_numpy()
+    total = clones["total_commits"].to_numpy()
+
+    clones["category"] = classify_clones(start, end, total)
+    clones["distancia"] = np.round(np.where((total <= 1) | (start == 1), 0.0, start / total), 4)
+    # total > 0 after cleaning
+    clones["duracao"] = np.round((end - start + 1) / total, 4)
+
+    for project, n in clones["project"].value_counts().items():
+        instrumentation.emit("classified", project=project, clones=int(n))
+    return clones
+
+
+def save_classified(clones):
+    """One file per project."""
+    os.makedirs(clones_classified_path, exist_ok=True)
+    for project, df in clones.groupby("project", sort=False):
+        out_csv = os.path.join(clones_classified_path, f"{project}_clone_classified.csv")
+        df.to_csv(out_csv, index=False)
+        print(f"✅ Result saved to: {out_csv}")
+
+
+# ==========================================
+# Stage 10: PRs by category
+# ==========================================
+def count_prs_by_category(df):
+    """
+    Unique PRs per category. A PR is identified by ('project', 'pr'), so
+    counts of different projects simply add up.
+    """
+    # drop_duplicates() ensures each PR is counted only ONCE per category,
+    # even if it has multiple clones in that category.
+    unique_pr_categories = df[["project", "pr", "category"]].drop_duplicates()
+    counts = unique_pr_categories["category"].value_counts()
+    return {str(category): int(n) for category, n in counts.items()}
+
+
+def summarize_categories(totals):
+    """Summary table from category -> count, largest first."""
+    summary_df = pd.DataFrame(list(totals.items()), columns=["type", "count"])
+    return summary_df.sort_values(by=["count", "type"], ascending=[False, True])
+
+
+# Per-file partial counts and the hash of the file they were computed from
+SUMMARY_MANIFEST = os.path.join(summary_path, "summary_pr_by_category_manifest.json")
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_summary_manifest(manifest_file=SUMMARY_MANIFEST):
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"⚠️ Unreadable manifest {manifest_file}, rebuilding it.")
+        return {}
+
+
+def save_summary_manifest(manifest, manifest_file=SUMMARY_MANIFEST):
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    tmp = manifest_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, manifest_file)
+
+
+def partial_counts(path):
+    """
+    Unique PRs per category of one classified CSV (see count_prs_by_category).
+    Returns None if the file cannot be used.
+    """
+    try:
+        df = pd.read_csv(path, usecols=lambda c: c in {"project", "pr", "category"})
+    except pd.errors.EmptyDataError:
+        print(f"ℹ️ File {path} is empty and will be ignored.")
+        return {}
+    except Exception as e:
+        print(f"🚨 Error reading {path}: {e}")
+        return None
+
+    required_cols = {"project", "pr", "category"}
+    if not required_cols.issubset(df.columns):
+        print(f"⚠️ File {path} skipped: columns {required_cols} not found.")
+        return None
+
+    return count_prs_by_category(df)
+
+
+def update_summary_manifest(files, manifest):
+    """
+    New manifest for the classified files: only new or changed files are
+    read, the partial counts of the others are reused. Returns the manifest
+    and the number of files read, reused and removed.
+    """
+    new_manifest = {}
+    n_read = 0
+    n_reused = 0
+
+    for path in files:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = manifest.get(name)
+
+        # Same size and modification time: trust the stored partial without hashing
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            new_manifest[name] = entry
+            n_reused += 1
+            continue
+
+        digest = file_digest(path)
+        if entry and entry["hash"] == digest:
+            # Touched but not changed
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            new_manifest[name] = entry
+            n_reused += 1
+            continue
+
+        counts = partial_counts(path)
+        n_read += 1
+        if counts is None:
+            continue
+
+        new_manifest[name] = {
+            "hash": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "counts": counts,
+        }
+
+    n_removed = len(set(manifest) - {os.path.basename(path) for path in files})
+    return new_manifest, n_read, n_reused, n_removed
+
+
+def merge_partial_counts(manifest):
+    """category -> count over every file of the manifest."""
+    totals = {}
+    for entry in manifest.values():
+        for category, n in entry["counts"].items():
+            totals[category] = totals.get(category, 0) + n
+    return totals
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiling of a stage, enabled by the LIFECYCLE_PROFILE environment
+variable, a comma-separated list of:
+
+    cpu     cProfile of the stage          -> <name>.prof and <name>.txt (top functions)
+    sample  wall-clock stack sampling      -> <name>.collapsed (flamegraph.pl / speedscope)
+    memory  tracemalloc peak and top sites -> <name>.mem.txt
+    all     the three above
+
+The profiles are written to summary/profiles/, named after the stage, the
+projects and the time. Every numbered stage starts the profilers from
+instrumentation.start_stage(), so the stages run by run_all.sh, the
+orchestrator or the shard workers can be profiled by setting the variable.
+LIFECYCLE_PROFILE_INTERVAL sets the sampling interval (default 0.005 s).
+
+Only the stage process is profiled: run stages 7 and 8 with --workers 1 to
+see the work of their worker processes.
+
+Usage (from the scripts folder), profiling stages 6-9 on one repository:
+    python3 profiling.py --profile all --projects owner_repo 8_track_clones.py
+    LIFECYCLE_PROFILE=cpu,memory LIFECYCLE_PROJECTS=owner_repo python3 9_made_lifecycle.py
+"""
+import os
+import sys
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import subprocess
+import tracemalloc
+from collections import Counter
+from paths import summary_path
+
+MODES = ("cpu", "sample", "memory")
+profiles_path = os.path.join(summary_path, "profiles")
+
+
+def requested_modes(value=None):
+    value = os.environ.get("LIFECYCLE_PROFILE", "") if value is None else value
+    modes = {mode.strip().lower() for mode in value.split(",") if mode.strip()}
+    if "all" in modes:
+        return set(MODES)
+    unknown = modes - set(MODES)
+    if unknown:
+        raise ValueError(f"unknown profile mode(s): {', '.join(sorted(unknown))}")
+    return modes
+
+
+def profile_name(stage):
+    """<stage>-<projects>-<time>, where projects is 'all' unless LIFECYCLE_PROJECTS is set."""
+    projects = os.environ.get("LIFECYCLE_PROJECTS")
+    scope = "all"
+    if projects:
+        names = [p for p in projects.split(",") if p]
+        scope = names[0] if len(names) == 1 else f"{len(names)}_projects"
+    scope = "".join(c if c.isalnum() or c in "-_." else "_" for c in scope)
+    return f"stage{stage}-{scope}-{time.strftime('%Y%m%d_%H%M%S')}-{os.getpid()}"
+
+
+# ==========================================
+# Wall-clock sampler
+# ==========================================
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval and counts the
+    collapsed stacks ("root;...;leaf count"), the input format of
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# ==========================================
+# Profiling of a stage
+# ==========================================
+class StageProfiler:
+    def __init__(self, stage, modes):
+        self.stage = stage
+        self.modes = modes
+        self.base = os.path.join(profiles_path, profile_name(stage))
+        self.cpu = cProfile.Profile() if "cpu" in modes else None
+        self.sampler = None
+        if "sample" in modes:
+            interval = float(os.environ.get("LIFECYCLE_PROFILE_INTERVAL", "0.005"))
+            self.sampler = StackSampler(interval)
+
+    def start(self):
+        if "memory" in self.modes:
+            tracemalloc.start(16)
+        if self.sampler is not None:
+            self.sampler.start()
+        if self.cpu is not None:
+            self.cpu.enable()
+
+    def stop(self):
+        """Stop the profilers and write their files. Returns the written paths."""
+        if self.cpu is not None:
+            self.cpu.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+        os.makedirs(profiles_path, exist_ok=True)
+        written = []
+
+        # Before the other profiles are written, which allocate too
+        peak = None
+        if tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(f"{self.base}.mem.txt", "w", encoding="utf-8") as f:
+                f.write(f"peak traced memory: {peak / 1e6:.1f} MB\n\n")
+                f.write("largest allocation sites still alive at the end of the stage:\n")
+                for stat in snapshot.statistics("lineno")[:30]:
+                    f.write(f"{stat}\n")
+            written.append(f"{self.base}.mem.txt")
+
+        if self.cpu is not None:
+            self.cpu.dump_stats(f"{self.base}.prof")
+            with open(f"{self.base}.txt", "w", encoding="utf-8") as f:
+                stats = pstats.Stats(self.cpu, stream=f).strip_dirs()
+                stats.sort_stats("cumulative").print_stats(40)
+                stats.sort_stats("tottime").print_stats(40)
+            written += [f"{self.base}.prof", f"{self.base}.txt"]
+
+        if self.sampler is not None:
+            self.sampler.write(f"{self.base}.collapsed")
+            written.append(f"{self.base}.collapsed")
+
+        return written, peak
+
+
+def start(stage):
+    """
+    Start the profilers requested by LIFECYCLE_PROFILE (nothing if it is
+    unset) and write the profiles when the process exits.
+    """
+    modes = requested_modes()
+    if not modes:
+        return None
+
+    import atexit
+    import instrumentation
+
+    profiler = StageProfiler(stage, modes)
+
+    def finish():
+        written, peak = profiler.stop()
+        instrumentation.emit(
+            "profile", modes=sorted(modes), files=written,
+            peak_bytes=peak, projects=os.environ.get("LIFECYCLE_PROJECTS")
+        )
+        print(f"🔬 Profiles of stage {stage}: {', '.join(written)}")
+
+    profiler.start()
+    atexit.register(finish)
+    return profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a numbered stage with profiling.",
+        usage="%(prog)s [--profile MODES] [--projects P1,P2] script [script arguments]",
+    )
+    parser.add_argument("--profile", default="all",
+                        help=f"Comma-separated modes: {', '.join(MODES)} or all (default: all)")
+    parser.add_argument("--projects", default=None,
+                        help="Only process these comma-separated projects (sets LIFECYCLE_PROJECTS)")
+    parser.add_argument("script", help="Numbered stage script, e.g. 8_track_clones.py")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments of the script")
+    args = parser.parse_args()
+
+    try:
+        requested_modes(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+
+    env = dict(os.environ, LIFECYCLE_PROFILE=args.profile)
+    if args.projects:
+        env["LIFECYCLE_PROJECTS"] = args.projects
+
+    script = args.script
+    if not os.path.exists(script):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+    sys.exit(subprocess.run([sys.executable, script] + args.args, env=env).returncode)
+
+
+if __name__ == "__main__":
+    main()
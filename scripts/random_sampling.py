@@ -4,9 +4,14 @@ import csv
 import glob
 import random
 import xml.etree.ElementTree as ET
+import argparse
 import pandas as pd
-import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from git_objects import BlobReader
+from clone_store import HAS_PYARROW, find_blocks, snapshot_table_path
+from artifact_io import find_artifact, open_artifact
+from fingerprint_index import FingerprintIndex
 
 # CONFIG
 CLASSIFIED_DIR = "clones_classified"
@@ -19,7 +24,21 @@ SNIPPETS_DIR = os.path.join(CLASSIFIED_DIR, "sample_snippets")
 # How many unique fingerprints to sample in total
 N_SAMPLES = 48
 
-random.seed(42)
+# How N_SAMPLES is split across categories: "proportional" or "equal"
+SAMPLE_ALLOCATION = "proportional"
+
+rng = random.Random(42)
+
+parser = argparse.ArgumentParser(description="Sample clones and export their snippets for manual review.")
+parser.add_argument("--workers", type=int, default=8,
+                    help="Number of threads reading snippets from git")
+parser.add_argument("--all-category",
+                    help="Export every clone of this category instead of sampling N_SAMPLES")
+args = parser.parse_args()
+
+# fingerprint -> (snapshot, set offset, blocks), when stage 7 has built it
+INDEX_PATH = os.path.join(SEARCH_RESULTS_DIR, "fingerprint_index.sqlite")
+fingerprint_index = FingerprintIndex(INDEX_PATH, readonly=True) if os.path.exists(INDEX_PATH) else None
 
 os.makedirs(SNIPPETS_DIR, exist_ok=True)
 
@@ -35,8 +54,29 @@ def find_metadata_csv(project):
 def find_set_by_fingerprint(xml_path, fingerprint):
     if fingerprint == 0 or fingerprint == "0":
         fingerprint = "0000000000000000"
+
+    # 0) Fingerprint index written by stage 7: no XML parsing at all
+    if fingerprint_index is not None:
+        try:
+            matches = fingerprint_index.lookup(fingerprint, xml_path)
+            if matches and matches[0][2]:
+                return matches[0][2], None
+        except Exception:
+            pass
+
+    # Columnar snapshot file written by stage 7: no XML parsing either
+    table_path = snapshot_table_path(xml_path)
+    if HAS_PYARROW and os.path.exists(table_path):
+        try:
+            blocks = find_blocks(table_path, fingerprint)
+            if blocks:
+                return blocks, None
+        except Exception:
+            pass
+
     try:
-        tree = ET.parse(xml_path)
+        with open_artifact(xml_path, "rb") as f:
+            tree = ET.parse(f)
         root = tree.getroot()
     except Exception as e:
         return None, f"XML_PARSE_ERROR: {e}"
@@ -57,7 +97,8 @@ def find_set_by_fingerprint(xml_path, fingerprint):
 
     # 2) If not found, attempt to search textual occurrence of fingerprint in file (some tools embed it as text)
     try:
-        txt = Path(xml_path).read_text(encoding='utf-8', errors='ignore')
+        with open_artifact(xml_path, "rt", encoding='utf-8', errors='ignore') as f:
+            txt = f.read()
         if fingerprint in txt:
             # fall back: find nearest <set ...> that encloses that position
             idx = txt.find(fingerprint)
@@ -85,69 +126,167 @@ def find_set_by_fingerprint(xml_path, fingerprint):
 
     return None, "FINGERPRINT_NOT_FOUND_IN_XML"
 
-# Helper: extract snippet from file (1-indexed lines: start..end)
-def extract_snippet(file_path, start, end):
+# Helper: extract snippet (1-indexed lines: start..end) of a file at the reader's commit
+def extract_snippet(reader, file_path, start, end):
     try:
-        lines = Path(file_path).read_text(encoding='utf-8', errors='ignore').splitlines()
+        lines = reader.read_lines(file_path)
     except Exception as e:
         return None, f"READ_ERROR: {e}"
+    if lines is None:
+        return None, f"READ_ERROR: {file_path} not found at {reader.sha}"
     try:
         s = int(start) - 1
         eidx = int(end)  # exclusive index in slice usage below will handle
-        snippet_lines = lines[s:eidx]
-        snippet = "\n".join(snippet_lines)
+        snippet = "".join(lines[s:eidx])
+        if snippet.endswith("\n"):
+            snippet = snippet[:-1]
         return snippet, None
     except Exception as e:
         return None, f"LINE_IDX_ERROR: {e}"
 
+# Helper: snippets of every sample of one commit, read from the git object
+# database with a single BlobReader (no checkout, so groups run concurrently).
+# Returns (out, snippet number, snippet path, snippet, error) for each fragment.
+def export_group(group):
+    repo_dir, sha, jobs = group
+    results = []
+    with BlobReader(repo_dir, sha) as reader:
+        for out, fragments in jobs:
+            for n, (file_path, start, end, snippet_path) in enumerate(fragments, start=1):
+                snippet, err = extract_snippet(reader, file_path, start, end)
+                results.append((out, n, snippet_path, snippet, err))
+    return results
+
+# Reservoir of at most `size` items, uniform over everything offered (Algorithm R)
+class Reservoir:
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.items = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            j = self.rng.randrange(self.seen)
+            if j < self.size:
+                self.items[j] = item
+
+# Helper: split n samples across categories (proportional to their size, or equal)
+def split(sizes, n, mode):
+    if mode == "equal":
+        quotas = {c: n // len(sizes) for c in sizes}
+        for c in sorted(sizes)[:n % len(sizes)]:
+            quotas[c] += 1
+    else:
+        total = sum(sizes.values())
+        exact = {c: n * size / total for c, size in sizes.items()}
+        quotas = {c: int(v) for c, v in exact.items()}
+        # largest remainders get the samples left
+        left = n - sum(quotas.values())
+        for c in sorted(exact, key=lambda c: exact[c] - quotas[c], reverse=True)[:left]:
+            quotas[c] += 1
+    return quotas
+
+# Helper: quotas of split(), where a category cannot give more than it has;
+# what it cannot give goes to the categories that still have clones
+def allocate(sizes, n, mode):
+    quotas = {c: 0 for c in sizes}
+    n = min(n, sum(sizes.values()))
+    while sum(quotas.values()) < n:
+        open_sizes = {c: sizes[c] for c in sizes if quotas[c] < sizes[c]}
+        for c, q in split(open_sizes, n - sum(quotas.values()), mode).items():
+            quotas[c] += min(q, sizes[c] - quotas[c])
+    return quotas
+
+# Helper: stream the classified files once into a (file, fingerprint) -> rows
+# index; a distinct (file, fingerprint) is the sampling unit
+def index_clones(classified_files):
+    index = {}
+    for file_path in classified_files:
+        with open(file_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                fp = row.get('clone_fingerprint')
+                if not fp:
+                    continue
+                row['source_classified_file'] = os.path.basename(file_path)
+                index.setdefault((file_path, fp), []).append(row)
+    return index
+
+# Helper: stratified reservoir sampling by category, in one pass over the index
+def sample_clones(clone_index, n_samples, mode, rng):
+    reservoirs = {}
+    for key, clone_rows in clone_index.items():
+        category = clone_rows[0].get('category', '')
+        if category not in reservoirs:
+            reservoirs[category] = Reservoir(n_samples, rng)
+        reservoirs[category].add(key)
+
+    if not reservoirs:
+        return []
+
+    quotas = allocate({c: r.seen for c, r in reservoirs.items()}, n_samples, mode)
+    samples = []
+    for category in sorted(reservoirs):
+        items = reservoirs[category].items
+        rng.shuffle(items)
+        samples.extend(items[:quotas[category]])
+        print(f"Category {category}: {reservoirs[category].seen} clones, {quotas[category]} sampled")
+    return samples
+
+# Helper: (project, pr, commit) -> child sha, one metadata read per project
+def build_child_sha_index(projects):
+    index = {}
+    for project in projects:
+        meta_csv = find_metadata_csv(project)
+        if meta_csv is None:
+            continue
+        try:
+            df_meta = pd.read_csv(meta_csv, dtype=str, usecols=['number_pr', 'number_commit', 'child'])
+        except Exception as e:
+            print(f"Failed to read {meta_csv}: {e}")
+            continue
+        for pr, commit, child in zip(df_meta['number_pr'], df_meta['number_commit'], df_meta['child']):
+            index.setdefault((project, str(pr).strip(), str(commit).strip()), child)
+    return index
+
 # Collect all classified files
-classified_files = glob.glob(os.path.join(CLASSIFIED_DIR, "*_clone_classified.csv"))
+classified_files = sorted(glob.glob(os.path.join(CLASSIFIED_DIR, "*_clone_classified.csv")))
 if not classified_files:
     print("No classified files found in", CLASSIFIED_DIR)
     raise SystemExit(1)
 
-# Track sampled fingerprints per file to avoid duplicates within same file
-sampled_per_file = {cf: set() for cf in classified_files}
+clone_index = index_clones(classified_files)
+if args.all_category:
+    samples = [key for key, clone_rows in clone_index.items()
+               if clone_rows[0].get('category') == args.all_category]
+    print(f"Exporting all {len(samples)} clones of category {args.all_category}")
+else:
+    samples = sample_clones(clone_index, N_SAMPLES, SAMPLE_ALLOCATION, rng)
+child_sha_index = build_child_sha_index({clone_index[key][0].get('project') for key in samples})
 
-# Final rows
+# Final rows, and the samples to export grouped by (repo_dir, sha_child)
 rows = []
+groups = {}
 
-attempts = 0
-while len(rows) < N_SAMPLES and attempts < N_SAMPLES * 10:
-    attempts += 1
-    # choose a random classified file (files may repeat)
-    file_path = random.choice(classified_files)
-    try:
-        df = pd.read_csv(file_path, dtype=str)
-    except Exception as e:
-        print("Failed to read", file_path, ":", e)
-        continue
-    if df.empty:
-        continue
-
-    # choose a random fingerprint from this file that was not already picked from this same file
-    unique_fps = df['clone_fingerprint'].dropna().unique().tolist()
-    available = [fp for fp in unique_fps if fp not in sampled_per_file[file_path]]
-    if not available:
-        # nothing left in this file, try another
-        continue
-    fp = random.choice(available)
-    sampled_per_file[file_path].add(fp)
-
-    # get one row that has this fingerprint (if multiple, pick first)
-    row = df[df['clone_fingerprint'] == fp].iloc[0].to_dict()
-
+for key in samples:
+    # the first row of the fingerprint describes the clone, as before
+    row = clone_index[key][0]
+    fp = row['clone_fingerprint']
     project = row.get('project')
     pr = row.get('pr')
     start_commit = row.get('start_commit')
 
     # Save basic fields from the classified file row (keep many common columns if present)
     out = {k: row.get(k, "") for k in ['project','pr','clone_fingerprint','start_commit','end_commit','total_commits','category','distancia','duracao']}
-    out['source_classified_file'] = os.path.basename(file_path)
+    out['source_classified_file'] = row['source_classified_file']
+    out['fingerprint_rows'] = len(clone_index[key])
 
     # find corresponding search_results XML (child)
     xml_name = f"nicad-result-{project}-{pr}-{start_commit}-child.xml"
-    xml_path = os.path.join(SEARCH_RESULTS_DIR, xml_name)
+    xml_path = find_artifact(os.path.join(SEARCH_RESULTS_DIR, xml_name)) or os.path.join(SEARCH_RESULTS_DIR, xml_name)
     if not os.path.exists(xml_path):
         out['xml_path'] = "XML_NOT_FOUND"
         out['xml_error'] = "XML not found at expected path: " + xml_path
@@ -181,9 +320,8 @@ while len(rows) < N_SAMPLES and attempts < N_SAMPLES * 10:
     out['clone2_start'] = start2
     out['clone2_end'] = end2
 
-    # find metadata csv for the project to retrieve child sha
+    # child sha of the commit where the clone was born
     meta_csv = find_metadata_csv(project)
-    sha_child = None
     if meta_csv is None:
         out['meta_csv'] = "METADATA_NOT_FOUND"
         rows.append(out)
@@ -191,73 +329,15 @@ while len(rows) < N_SAMPLES and attempts < N_SAMPLES * 10:
         continue
     out['meta_csv'] = meta_csv
 
-    try:
-        df_meta = pd.read_csv(meta_csv, dtype=str)
-    except Exception as e:
-        out['meta_csv_error'] = f"READ_ERROR: {e}"
-        rows.append(out)
-        continue
-
-    # try to find row with number_pr and number_commit == start_commit
-    # attempt several likely column names
-    possible_pr_cols = [c for c in df_meta.columns if 'pr' in c.lower()]
-    possible_commit_cols = [c for c in df_meta.columns if 'commit' in c.lower() or 'number_commit' in c.lower()]
-    pr_col = None
-    commit_col = None
-    for c in possible_pr_cols:
-        if (df_meta[c].astype(str) == str(pr)).any():
-            pr_col = c
-            break
-    for c in possible_commit_cols:
-        if (df_meta[c].astype(str) == str(start_commit)).any():
-            commit_col = c
-            break
-
-    if pr_col is None or commit_col is None:
-        # fallback: try exact columns 'number_pr' and 'number_commit' or 'number_commit' etc
-        for c in ['number_pr','pr','PR','number_commit','number_commit']:
-            if c in df_meta.columns and pr_col is None and (df_meta[c].astype(str) == str(pr)).any():
-                pr_col = c
-            if c in df_meta.columns and commit_col is None and (df_meta[c].astype(str) == str(start_commit)).any():
-                commit_col = c
-
-    if pr_col is None or commit_col is None:
-        out['meta_lookup_error'] = f"Could not find matching PR/commit columns in {meta_csv}. Columns: {df_meta.columns.tolist()}"
-        rows.append(out)
-        print(out['meta_lookup_error'])
-        continue
-
-    matched = df_meta[(df_meta[pr_col].astype(str) == str(pr)) & (df_meta[commit_col].astype(str) == str(start_commit))]
-    if matched.empty:
+    sha_child = child_sha_index.get((project, str(pr).strip(), str(start_commit).strip()))
+    if sha_child is None:
         out['meta_lookup_error'] = f"No matching row for PR={pr} and commit={start_commit} in {meta_csv}"
         rows.append(out)
         print(out['meta_lookup_error'])
         continue
-
-    # find child sha column (common names: child, child_sha, sha_child, sha)
-    child_sha_col = None
-    for cname in ['child','child_sha','sha_child','sha','commit_sha']:
-        if cname in matched.columns:
-            child_sha_col = cname
-            break
-    if child_sha_col is None:
-        # attempt to find any column with values that look like sha (40 hex chars)
-        for c in matched.columns:
-            sample_val = str(matched[c].iloc[0])
-            if isinstance(sample_val, str) and len(sample_val) >= 7:  # loose heuristic
-                child_sha_col = c
-                break
-
-    if child_sha_col is None:
-        out['meta_lookup_error'] = "Could not determine child sha column in metadata file."
-        rows.append(out)
-        print(out['meta_lookup_error'])
-        continue
-
-    sha_child = matched[child_sha_col].iloc[0]
     out['sha_child'] = sha_child
 
-    # perform git reset --hard in the repository
+    # repository to read the blobs from
     repo_dir_guesses = [
         os.path.join("git_repos", project),
         os.path.join(os.getcwd(), "git_repos", project),
@@ -274,41 +354,33 @@ while len(rows) < N_SAMPLES and attempts < N_SAMPLES * 10:
         print(out['repo_error'])
         continue
 
-    # run git reset --hard <sha_child>
-    try:
-        subprocess.run(["git", "reset", "--hard", sha_child], cwd=repo_dir, check=True,
-                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        out['git_reset'] = f"reset OK in {repo_dir}"
-    except Exception as e:
-        out['git_reset_error'] = f"GIT_RESET_FAILED: {e}"
-        rows.append(out)
-        print(out['git_reset_error'])
-        continue
-
-    # extract code snippets for both clones
-    snippet1, err1 = extract_snippet(file1, start1, end1)
-    snippet2, err2 = extract_snippet(file2, start2, end2)
-    if err1:
-        out['snippet1_error'] = err1
-    if err2:
-        out['snippet2_error'] = err2
-
-    # save snippets to files
+    # snippets are exported below, grouped by commit
     s1_path = os.path.join(SNIPPETS_DIR, f"{project}_{pr}_{start_commit}_1_{fp}.txt")
     s2_path = os.path.join(SNIPPETS_DIR, f"{project}_{pr}_{start_commit}_2_{fp}.txt")
-    try:
-        if snippet1 is not None:
-            Path(s1_path).write_text(snippet1, encoding='utf-8', errors='ignore')
-            out['snippet1_path'] = s1_path
-        if snippet2 is not None:
-            Path(s2_path).write_text(snippet2, encoding='utf-8', errors='ignore')
-            out['snippet2_path'] = s2_path
-    except Exception as e:
-        out['snippet_save_error'] = str(e)
-
+    groups.setdefault((repo_dir, sha_child), []).append(
+        (out, [(file1, start1, end1, s1_path), (file2, start2, end2, s2_path)])
+    )
     rows.append(out)
     print(f"Sampled: project={project} pr={pr} start={start_commit} fp={fp}")
 
+# Export the snippets: one BlobReader per commit, commits read concurrently,
+# files written in bulk as each commit completes
+print(f"Exporting snippets of {sum(len(jobs) for jobs in groups.values())} clones "
+      f"from {len(groups)} commits with {args.workers} thread(s)")
+with ThreadPoolExecutor(max_workers=args.workers) as executor:
+    futures = [executor.submit(export_group, (repo_dir, sha, jobs))
+               for (repo_dir, sha), jobs in groups.items()]
+    for future in as_completed(futures):
+        for out, n, snippet_path, snippet, err in future.result():
+            if err:
+                out[f'snippet{n}_error'] = err
+                continue
+            try:
+                Path(snippet_path).write_text(snippet, encoding='utf-8', errors='ignore')
+                out[f'snippet{n}_path'] = snippet_path
+            except Exception as e:
+                out['snippet_save_error'] = str(e)
+
 # Save results to CSV
 if rows:
     keys = list({k for r in rows for k in r.keys()})
@@ -1,6 +1,6 @@
 #!/bin/bash
 
-# Script to execute in sequence all numbered files from 0 to 10
+# Script to execute in sequence all numbered files from 0 to 11
 
 # Colors for output
 RED='\033[0;31m'
@@ -20,6 +20,9 @@ declare -a STEP_NAMES
 declare -a STEP_TIMES
 declare -a STEP_STATUSES
 
+# Run id shared by the events of every stage (summary/events.jsonl)
+export LIFECYCLE_RUN_ID="${LIFECYCLE_RUN_ID:-$(date +%Y%m%d_%H%M%S)}"
+
 # Output file for summary
 OUTPUT_FILE="${SCRIPT_DIR}/execution_summary_$(date +%Y%m%d_%H%M%S).txt"
 
@@ -68,7 +71,7 @@ generate_summary() {
         echo "=========================================="
         echo ""
         
-        for i in {0..10}; do
+        for i in {0..11}; do
             if [ -n "${STEP_NAMES[$i]}" ]; then
                 printf "[%2d] %-50s | Status: %-10s | Time: %s\n" "$i" "${STEP_NAMES[$i]}" "${STEP_STATUSES[$i]}" "${STEP_TIMES[$i]}"
             fi
@@ -85,12 +88,12 @@ generate_summary() {
 START_TIME=$(date +%s)
 
 echo "=========================================="
-echo "Executing scripts in sequence (0-10)"
+echo "Executing scripts in sequence (0-11)"
 echo "=========================================="
 echo ""
 
-# Loop from 0 to 10
-for i in {2..10}; do
+# Loop from 0 to 11
+for i in {2..11}; do
     # Search for files that start with the number followed by underscore or without extension
     FILE=$(find "$SCRIPT_DIR" -maxdepth 1 -name "${i}_*.py" -o -name "${i}.py" | head -n 1)
     
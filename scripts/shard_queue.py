@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Split the per-project stages over several workers and hosts.
+
+The projects are assigned to shards deterministically (plan), and queued in
+a SQLite database inside a folder every host can reach (--queue). Each worker
+(work) claims the projects of its shard, then steals from the other shards
+once its own are done, and runs the per-project stages on them in its own
+workspace, <queue>/workspaces/<name>/. metadata, git_repos and AIDev_Dataset
+are links to the main folders. When the queue is empty, merge copies the
+search_results, lifetimes and clones_classified of every workspace back into
+the main folders and rebuilds the fingerprint index.
+
+Run every command from the scripts folder (the main workspace):
+    python3 shard_queue.py plan --queue /shared/queue --shards 4
+    python3 shard_queue.py work --queue /shared/queue --shard 0     # on every host
+    python3 shard_queue.py status --queue /shared/queue
+    python3 shard_queue.py merge --queue /shared/queue
+    python3 10_count_lifecycle.py
+
+The queue relies on SQLite file locking, which the shared filesystem must
+support (NFSv4 and most cluster filesystems do). Several workers against one
+local folder work too, which is the easy way to try it out.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import fcntl
+import shutil
+import socket
+import sqlite3
+import hashlib
+import argparse
+import threading
+import subprocess
+from paths import metadata_path, git_repos_path, aidev_path, search_results_path, lifetimes_path, \
+    clones_classified_path, load_projects
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STAGES = "6,7,8,9"
+STAGE_SCRIPTS = {
+    "6": "6_detect_clone.py",
+    "7": "7_parser_clones.py",
+    "8": "8_track_clones.py",
+    "9": "9_made_lifecycle.py",
+    "11": "11_attribute_added_lines.py",
+}
+MAX_ATTEMPTS = 2
+HEARTBEAT_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    project TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    cost INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    heartbeat REAL,
+    finished_at REAL,
+    seconds REAL
+);
+CREATE INDEX IF NOT EXISTS units_by_status ON units (status, shard);
+"""
+
+
+def connect(queue_dir):
+    # No WAL: it needs shared memory, which network filesystems do not have
+    conn = sqlite3.connect(os.path.join(queue_dir, "queue.sqlite"), timeout=120, isolation_level=None)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# ==========================================
+# Sharding
+# ==========================================
+def stable_hash(project):
+    """Same value on every host and Python run (unlike hash())."""
+    return int(hashlib.blake2b(project.encode("utf-8"), digest_size=8).hexdigest(), 16)
+
+
+def project_cost(project):
+    """Snapshots NiCad has to process: two per commit of the project."""
+    metadata_csv = f"{metadata_path}/{project}.csv"
+    if not os.path.exists(metadata_csv):
+        return 0
+    with open(metadata_csv, "rb") as f:
+        return 2 * max(sum(1 for _ in f) - 1, 0)
+
+
+def assign_shards(costs, n_shards, strategy="lpt"):
+    """
+    {project: shard}. "hash" only uses the project name, so a project keeps
+    its shard when others are added. "lpt" gives the most expensive project
+    left to the least loaded shard (longest processing time first), ties
+    broken by the hash, which balances the shards much better.
+    """
+    if strategy == "hash":
+        return {project: stable_hash(project) % n_shards for project in costs}
+
+    loads = [0] * n_shards
+    shards = {}
+    for project in sorted(costs, key=lambda p: (-costs[p], stable_hash(p))):
+        shard = min(range(n_shards), key=lambda s: (loads[s], s))
+        shards[project] = shard
+        loads[shard] += costs[project]
+    return shards
+
+
+def plan(args):
+    projects = [p for p in load_projects() if p]
+    costs = {project: project_cost(project) for project in projects}
+    shards = assign_shards(costs, args.shards, args.strategy)
+
+    os.makedirs(args.queue, exist_ok=True)
+    conn = connect(args.queue)
+    conn.execute("BEGIN IMMEDIATE")
+    if args.reset:
+        conn.execute("DELETE FROM units")
+    # Projects already queued keep their state
+    conn.executemany(
+        "INSERT INTO units (project, shard, cost) VALUES (?, ?, ?) "
+        "ON CONFLICT(project) DO UPDATE SET shard = excluded.shard, cost = excluded.cost",
+        [(project, shards[project], costs[project]) for project in projects]
+    )
+    conn.execute("COMMIT")
+
+    loads = {}
+    for project, shard in shards.items():
+        loads.setdefault(shard, [0, 0])
+        loads[shard][0] += 1
+        loads[shard][1] += costs[project]
+    print(f"📋 {len(projects)} project(s) in {args.shards} shard(s) ({args.strategy}):")
+    for shard in range(args.shards):
+        n, cost = loads.get(shard, [0, 0])
+        print(f"   shard {shard}: {n} project(s), {cost} snapshots")
+
+
+# ==========================================
+# Workers
+# ==========================================
+def claim(conn, worker, shard, steal, lease):
+    """Project claimed by the worker, or None when nothing is left."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Pending units, and running ones whose worker stopped sending heartbeats
+        available = "(status = 'pending' OR (status = 'running' AND heartbeat < ?))"
+        row = conn.execute(
+            f"SELECT project FROM units WHERE {available} AND shard = ? ORDER BY cost DESC, project LIMIT 1",
+            (now - lease, shard)
+        ).fetchone()
+        if row is None and steal:
+            row = conn.execute(
+                f"SELECT project FROM units WHERE {available} ORDER BY cost DESC, project LIMIT 1",
+                (now - lease,)
+            ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        conn.execute(
+            "UPDATE units SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 "
+            "WHERE project = ?",
+            (worker, now, row[0])
+        )
+        conn.execute("COMMIT")
+        return row[0]
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def finish(conn, project, worker, ok, seconds):
+    conn.execute("BEGIN IMMEDIATE")
+    attempts = conn.execute("SELECT attempts FROM units WHERE project = ?", (project,)).fetchone()[0]
+    status = "done" if ok else ("failed" if attempts >= MAX_ATTEMPTS else "pending")
+    # Only if the unit was not reclaimed by another worker meanwhile
+    conn.execute(
+        "UPDATE units SET status = ?, finished_at = ?, seconds = ? WHERE project = ? AND worker = ?",
+        (status, time.time(), round(seconds, 1), project, worker)
+    )
+    conn.execute("COMMIT")
+    return status
+
+
+def keep_alive(queue_dir, project, worker, stop, lease):
+    """
+    Renew the heartbeat of the project until stop is set. A failed renewal
+    (e.g. the shared filesystem is briefly unreachable) is logged and retried
+    at the next beat with a new connection, so the thread never dies while
+    the project runs.
+    """
+    conn = None
+    renewed = time.time()
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            if conn is None:
+                conn = connect(queue_dir)
+            conn.execute("UPDATE units SET heartbeat = ? WHERE project = ? AND worker = ?",
+                         (time.time(), project, worker))
+            renewed = time.time()
+        except Exception as e:
+            late = time.time() - renewed
+            print(f"⚠️ Heartbeat of {project} failed ({e!r}), retrying; last renewal {late:.0f}s ago",
+                  file=sys.stderr, flush=True)
+            if late > lease:
+                print(f"🚨 The lease of {project} expired: another worker may claim it while it runs",
+                      file=sys.stderr, flush=True)
+            if conn is not None:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                conn = None
+    if conn is not None:
+        conn.close()
+
+
+def prepare_workspace(queue_dir, name):
+    """Private folder of one worker; shared inputs are links to the main folders."""
+    path = os.path.join(os.path.abspath(queue_dir), "workspaces", name)
+    os.makedirs(os.path.join(path, "search_results"), exist_ok=True)
+    shutil.copy("settings.ini", os.path.join(path, "settings.ini"))
+    for shared in (metadata_path, git_repos_path, aidev_path):
+        link = os.path.join(path, os.path.basename(shared))
+        if not os.path.lexists(link):
+            os.symlink(shared, link)
+    return path
+
+
+def run_project(path, project, stages, workers, log_path):
+    """Run the stages on one project inside the workspace. True on success."""
+    # Workspaces live on the shared filesystem: no WAL for their SQLite files
+    env = dict(os.environ, LIFECYCLE_PROJECTS=project, LIFECYCLE_SQLITE_JOURNAL="delete")
+
+    with open(log_path, "w", encoding="utf-8") as log:
+        for stage in stages:
+            command = [sys.executable, os.path.join(SCRIPT_DIR, STAGE_SCRIPTS[stage])]
+            if stage in ("7", "8"):
+                command += ["--workers", str(workers)]
+
+            log.write(f"=== {STAGE_SCRIPTS[stage]} ===\n")
+            log.flush()
+
+            if stage == "6":
+                # NiCad shares its working files in git_repos: one run at a time
+                # for every worker using this git_repos, on any host
+                with open(os.path.join(git_repos_path, ".nicad.lock"), "w") as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    result = subprocess.run(command, cwd=path, env=env, stdout=log, stderr=subprocess.STDOUT)
+            else:
+                result = subprocess.run(command, cwd=path, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+            if result.returncode != 0:
+                return False
+    return True
+
+
+def work(args):
+    name = args.name or f"{socket.gethostname()}-{os.getpid()}"
+    stages = [stage.strip() for stage in args.stages.split(",")]
+    unknown = [stage for stage in stages if stage not in STAGE_SCRIPTS]
+    if unknown:
+        sys.exit(f"Unknown stage(s) {unknown}, choose from {', '.join(STAGE_SCRIPTS)}")
+
+    path = prepare_workspace(args.queue, name)
+    log_dir = os.path.join(path, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    conn = connect(args.queue)
+    print(f"👷 Worker {name} on shard {args.shard}, workspace {path}")
+
+    n_done = 0
+    while True:
+        project = claim(conn, name, args.shard, not args.no_steal, args.lease)
+        if project is None:
+            break
+
+        print(f"▶️ {project}")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_alive, args=(args.queue, project, name, stop, args.lease),
+                                     daemon=True)
+        heartbeat.start()
+
+        started = time.perf_counter()
+        try:
+            ok = run_project(path, project, stages, args.workers, os.path.join(log_dir, f"{project}.log"))
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        status = finish(conn, project, name, ok, time.perf_counter() - started)
+        print(f"{'✅' if ok else '❌'} {project}: {status} ({time.perf_counter() - started:.1f}s)")
+        n_done += ok
+
+    print(f"🏁 Worker {name}: {n_done} project(s) done, queue empty")
+
+
+def status(args):
+    conn = connect(args.queue)
+    rows = conn.execute(
+        "SELECT shard, status, COUNT(*), SUM(cost) FROM units GROUP BY shard, status ORDER BY shard, status"
+    ).fetchall()
+    if not rows:
+        print("Queue is empty, run plan first.")
+        return
+
+    print(f"{'shard':>5}  {'status':<8} {'projects':>8} {'snapshots':>10}")
+    for shard, unit_status, n, cost in rows:
+        print(f"{shard:>5}  {unit_status:<8} {n:>8} {cost:>10}")
+
+    for project, worker, attempts in conn.execute(
+            "SELECT project, worker, attempts FROM units WHERE status = 'failed' ORDER BY project"):
+        print(f"❌ {project} (worker {worker}, {attempts} attempts)")
+
+
+# ==========================================
+# Merge
+# ==========================================
+def copy_newest(pattern_by_workspace, target_dir):
+    """Copy the files into target_dir; the most recent wins when several workspaces have one."""
+    newest = {}
+    for path in pattern_by_workspace:
+        name = os.path.basename(path)
+        if name not in newest or os.path.getmtime(path) > os.path.getmtime(newest[name]):
+            newest[name] = path
+
+    os.makedirs(target_dir, exist_ok=True)
+    for name, path in newest.items():
+        shutil.copy2(path, os.path.join(target_dir, name))
+    return len(newest)
+
+
+def merge(args):
+    from fingerprint_index import FingerprintIndex
+    from pipeline_stages import CONVERSION_TIMINGS_DIR, merge_conversion_timings
+
+    workspaces = sorted(glob.glob(os.path.join(args.queue, "workspaces", "*")))
+    if not workspaces:
+        print("No workspace to merge.")
+        return
+
+    conn = connect(args.queue)
+    pending = conn.execute("SELECT COUNT(*) FROM units WHERE status != 'done'").fetchone()[0]
+    if pending:
+        print(f"⚠️ {pending} project(s) are not done, merging what is there.")
+
+    def files(folder, pattern):
+        return [f for ws in workspaces for f in glob.glob(os.path.join(ws, folder, pattern))]
+
+    n = copy_newest(files("search_results", "nicad-result-*"), search_results_path)
+    print(f"📦 search_results: {n} file(s)")
+    n = copy_newest(files("lifetimes", "*.csv"), lifetimes_path)
+    print(f"📦 lifetimes: {n} file(s)")
+    n = copy_newest(files("clones_classified", "*_clone_classified.csv"), clones_classified_path)
+    print(f"📦 clones_classified: {n} file(s)")
+
+    # Fingerprint index: every snapshot of every workspace index
+    n_snapshots = 0
+    with FingerprintIndex() as index:
+        for ws in workspaces:
+            shard_index = os.path.join(ws, "search_results", "fingerprint_index.sqlite")
+            if not os.path.exists(shard_index):
+                continue
+            shard = sqlite3.connect(f"file:{shard_index}?mode=ro", uri=True, timeout=60)
+            for snapshot_id, name in shard.execute("SELECT id, name FROM snapshots").fetchall():
+                entries = [
+                    (fp, offset, json.loads(blocks))
+                    for fp, offset, blocks in shard.execute(
+                        "SELECT fingerprint, set_offset, blocks FROM sets WHERE snapshot_id = ?",
+                        (snapshot_id,)
+                    )
+                ]
+                index.add_snapshot(name, entries)
+                n_snapshots += 1
+            shard.close()
+    print(f"📦 fingerprint index: {n_snapshots} snapshot(s)")
+
+    timings = files(os.path.join("summary", "conversion_timings"), "*.csv")
+    if timings:
+        copy_newest(timings, CONVERSION_TIMINGS_DIR)
+        merge_conversion_timings()
+
+    print("\n✅ Shards merged, run 10_count_lifecycle.py for the summary.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded execution of the per-project stages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("plan", help="Assign the projects to shards and queue them")
+    p.add_argument("--queue", required=True, help="Queue folder, on a filesystem every host sees")
+    p.add_argument("--shards", type=int, required=True)
+    p.add_argument("--strategy", choices=["lpt", "hash"], default="lpt")
+    p.add_argument("--reset", action="store_true", help="Drop the state of previously queued projects")
+    p.set_defaults(func=plan)
+
+    p = commands.add_parser("work", help="Process projects until the queue is empty")
+    p.add_argument("--queue", required=True)
+    p.add_argument("--shard", type=int, required=True, help="Shard processed first")
+    p.add_argument("--name", help="Worker name, also its workspace folder (default: host-pid)")
+    p.add_argument("--stages", default=DEFAULT_STAGES, help=f"Stages per project (default: {DEFAULT_STAGES})")
+    p.add_argument("--workers", type=int, default=1, help="Processes of stages 7 and 8")
+    p.add_argument("--no-steal", action="store_true", help="Stop when the own shard is done")
+    p.add_argument("--lease", type=float, default=15 * 60,
+                   help="Seconds without heartbeat after which a running project is reclaimed")
+    p.set_defaults(func=work)
+
+    p = commands.add_parser("status", help="Progress per shard")
+    p.add_argument("--queue", required=True)
+    p.set_defaults(func=status)
+
+    p = commands.add_parser("merge", help="Assemble the outputs of every workspace")
+    p.add_argument("--queue", required=True)
+    p.set_defaults(func=merge)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Regression tests of git_objects.diff_hunks and clone_tracking.map_range on a
+scratch repository.
+
+Usage (from the scripts folder):
+    python3 -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from git_objects import diff_hunks, unquote_path
+from clone_tracking import map_range
+
+AUTHOR = dict(GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+              GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com")
+
+
+class DiffHunksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp(prefix="diff-hunks-")
+        self.git("init", "-q")
+
+    def tearDown(self):
+        shutil.rmtree(self.repo, ignore_errors=True)
+
+    def git(self, *args):
+        return subprocess.run(["git", *args], cwd=self.repo, check=True, capture_output=True, text=True,
+                              env=dict(os.environ, **AUTHOR)).stdout.strip()
+
+    def commit(self, files):
+        for name, text in files.items():
+            Path(self.repo, name).write_text(text, encoding="utf-8")
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", "change")
+        return self.git("rev-parse", "HEAD")
+
+    def test_removed_and_added_lines_that_look_like_file_headers(self):
+        lines = [f"select {i};" for i in range(1, 13)]
+        lines[1], lines[5] = "-- old1", "-- old2"
+        old = self.commit({"q.sql": "\n".join(lines) + "\n"})
+        lines[1], lines[5], lines[9] = "++ new1", "++ new2", "select 100;"
+        new = self.commit({"q.sql": "\n".join(lines) + "\n"})
+
+        self.assertEqual(diff_hunks(self.repo, old, new),
+                         {"q.sql": ("q.sql", [(2, 1, 2, 1), (6, 1, 6, 1), (10, 1, 10, 1)])})
+
+    def test_non_ascii_and_quoted_paths(self):
+        old = self.commit({"café.py": "a\nb\nc\n", 'say "hi".py': "a\nb\n"})
+        new = self.commit({"café.py": "a\nB\nc\n", 'say "hi".py': "a\nB\n"})
+
+        changes = diff_hunks(self.repo, old, new)
+        self.assertEqual(changes["café.py"], ("café.py", [(2, 1, 2, 1)]))
+        self.assertEqual(changes['say "hi".py'], ('say "hi".py', [(2, 1, 2, 1)]))
+
+    def test_renamed_non_ascii_path(self):
+        text = "".join(f"line {i}\n" for i in range(20))
+        old = self.commit({"名前.py": text})
+        os.remove(Path(self.repo, "名前.py"))
+        new = self.commit({"café.py": "first\n" + text})
+
+        self.assertEqual(diff_hunks(self.repo, old, new), {"名前.py": ("café.py", [(0, 0, 1, 1)])})
+
+    def test_form_feed_inside_a_line(self):
+        old = self.commit({"f.py": "a\nb\x0c-- c\nd\n"})
+        new = self.commit({"f.py": "a\nb\x0c-- c\nD\n"})
+
+        self.assertEqual(diff_hunks(self.repo, old, new), {"f.py": ("f.py", [(3, 1, 3, 1)])})
+
+    def test_unquote_path(self):
+        self.assertEqual(unquote_path('"a/caf\\303\\251.py"'), "a/café.py")
+        self.assertEqual(unquote_path('"a/tab\\there\\\\\\"x\\""'), 'a/tab\there\\"x"')
+        self.assertEqual(unquote_path("a/plain.py"), "a/plain.py")
+
+
+class MapRangeTest(unittest.TestCase):
+
+    def test_shifts_after_the_hunks(self):
+        hunks = [(2, 1, 2, 1), (6, 1, 6, 1), (10, 0, 11, 2)]
+        self.assertEqual(map_range(hunks, 12, 15), (14, 17))
+        self.assertEqual(map_range(hunks, 7, 9), (7, 9))
+
+    def test_changed_range(self):
+        self.assertIsNone(map_range([(2, 1, 2, 1), (6, 1, 6, 1)], 5, 8))
+        self.assertIsNone(map_range([(4, 0, 5, 3)], 3, 8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+"""
+Regression tests of hunk_index.added_ranges.
+
+Usage (from the scripts folder):
+    python3 -m unittest discover tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hunk_index import added_ranges
+
+
+class AddedRangesTest(unittest.TestCase):
+
+    def test_line_breaks_inside_a_source_line(self):
+        for separator in ("\x0c", "\r", "\u2028", "\x1c"):
+            patch = f"@@ -1,2 +1,4 @@\n ctx{separator}more\n+a\n+b\n ctx2"
+            self.assertEqual(added_ranges(patch), [(2, 3)], repr(separator))
+
+    def test_crlf_patch(self):
+        self.assertEqual(added_ranges("@@ -1,2 +1,4 @@\r\n ctx\r\n+a\r\n+b\r\n ctx2\r\n"), [(2, 3)])
+
+    def test_hunks_and_no_newline_marker(self):
+        patch = "@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n@@ -10,0 +11,2 @@\n+x\n+y\n\\ No newline at end of file"
+        self.assertEqual(added_ranges(patch), [(2, 2), (11, 12)])
+
+
+if __name__ == "__main__":
+    unittest.main()
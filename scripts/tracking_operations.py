@@ -0,0 +1,268 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import xml.etree.ElementTree as ET
+from clone_store import HAS_PYARROW, read_snapshot, snapshot_table_path
+from clone_tracking import (EMPTY_IDS, InstanceInterner, SnapshotCache, carry_forward,
+                            content_key, track_pr)
+from artifact_io import find_artifact, open_artifact
+from git_objects import diff_hunks, resolve_trees
+from paths import search_results_path, git_repos_path
+import instrumentation
+
+# Column order of the lifetimes CSV
+LIFETIME_COLUMNS = [
+    "project", "pr", "clone_fingerprint",
+    "start_commit", "end_commit", "total_commits_in_pr",
+    "source_file", "start_line", "end_line"
+]
+
+# Set by configure() (in every worker process)
+settings = {
+    "snapshot_cache_size": 256,
+    "line_mapping": True,
+}
+
+
+def configure(snapshot_cache_size, line_mapping):
+    settings["snapshot_cache_size"] = snapshot_cache_size
+    settings["line_mapping"] = line_mapping
+
+
+EMPTY_COLUMNS = ([], [], [], [])
+
+
+def extract_clone_columns_from_table(table_path):
+    """Instance columns read straight from the columnar snapshot file."""
+    columns = read_snapshot(table_path, ["fingerprint", "source_file", "start_line", "end_line"])
+    return (
+        columns["fingerprint"].tolist(),
+        columns["source_file"].tolist(),
+        columns["start_line"].tolist(),
+        columns["end_line"].tolist()
+    )
+
+
+def extract_clone_columns(xml_path):
+    """
+    Reads the snapshot and returns its clone instances as four columns:
+    (fingerprints, source_files, start_lines, end_lines)
+
+    Each clone instance is identified by:
+    (fingerprint, source_file, start_line, end_line)
+
+    When stage 7 wrote the columnar snapshot file next to the XML, it is
+    read instead of parsing the XML.
+    """
+    table_path = snapshot_table_path(xml_path)
+    if HAS_PYARROW and os.path.exists(table_path):
+        try:
+            return extract_clone_columns_from_table(table_path)
+        except Exception as e:
+            print(f"⚠️ Error reading snapshot table {table_path}: {e}")
+
+    # Plain, .gz or .zst, whichever stage 6 wrote
+    xml_path = find_artifact(xml_path)
+    if xml_path is None:
+        return EMPTY_COLUMNS
+
+    fingerprints, source_files, start_lines, end_lines = [], [], [], []
+
+    try:
+        with open_artifact(xml_path, "rt", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+
+        # Header cleanup
+        idx = content.find("<")
+        if idx > 0:
+            content = content[idx:]
+
+        root = ET.fromstring(content)
+
+        # Look for sets (Simian structure or generic <clones>)
+        sets = root.findall(".//set")
+
+        for s in sets:
+            fp = s.attrib.get("fingerprint")
+            if not fp:
+                continue
+
+            # Try to find blocks (Simian <block> or NiCad <source>)
+            blocks = s.findall("block")
+            if not blocks:
+                blocks = s.findall("source")
+
+            for b in blocks:
+                # Normalize attributes
+                source_file = b.attrib.get("sourceFile") or b.attrib.get("file")
+                start_line = b.attrib.get("startLineNumber") or b.attrib.get("startline")
+                end_line = b.attrib.get("endLineNumber") or b.attrib.get("endline")
+
+                if source_file and start_line and end_line:
+                    fingerprints.append(fp)
+                    source_files.append(source_file)
+                    start_lines.append(int(start_line))
+                    end_lines.append(int(end_line))
+
+        return fingerprints, source_files, start_lines, end_lines
+
+    except Exception as e:
+        print(f"⚠️ Error reading XML {xml_path}: {e}")
+        return EMPTY_COLUMNS
+
+
+def load_snapshot_ids(xml_path, interner):
+    """Snapshot as a sorted int64 array of instance ids."""
+    return interner.intern(*extract_clone_columns(xml_path))
+
+
+def load_snapshot(xml_path, sha, trees, cache, interner):
+    """
+    Snapshot ids through the cache. The key is the tree of the commit when
+    the repository knows it, otherwise a hash of the result file content.
+    Missing results are never cached.
+    """
+    table_path = snapshot_table_path(xml_path)
+    if HAS_PYARROW and os.path.exists(table_path):
+        source = table_path
+    else:
+        source = find_artifact(xml_path)
+    if source is None:
+        return EMPTY_IDS
+
+    tree = trees.get(sha)
+    key = ("tree", tree) if tree else content_key(source)
+    return cache.get_or_load(key, lambda: load_snapshot_ids(xml_path, interner))
+
+
+def is_valid_sha(sha):
+    return bool(sha) and sha not in ("None", "nan")
+
+
+def make_carry(repo_path, old_sha, new_sha, diffs, interner):
+    """
+    Function moving instance ids from old_sha to new_sha line numbers with
+    the diff hunks between them, or None to compare ids as they are (same
+    commit, line mapping disabled or no repository to diff).
+    """
+    if not settings["line_mapping"] or old_sha == new_sha:
+        return None
+    if not (is_valid_sha(old_sha) and is_valid_sha(new_sha)):
+        return None
+
+    if (old_sha, new_sha) not in diffs:
+        diffs[(old_sha, new_sha)] = diff_hunks(repo_path, old_sha, new_sha)
+    changes = diffs[(old_sha, new_sha)]
+    if changes is None:
+        return None
+
+    repo_prefix = f"{repo_path}/"
+    return lambda ids: carry_forward(ids, changes, repo_prefix, interner)
+
+
+class ProjectState:
+    """
+    What a process keeps while it tracks PRs of one project: the instance
+    dictionary, the snapshot cache, resolved trees and diffs.
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.repo_path = f"{git_repos_path}/{project}"
+        self.interner = InstanceInterner()
+        self.cache = SnapshotCache(settings["snapshot_cache_size"])
+        self.trees = {}
+        self.resolved = set()
+        self.diffs = {}
+
+    def resolve(self, shas):
+        """Tree SHAs of the commits not resolved yet, in one git call."""
+        pending = [sha for sha in shas if sha not in self.resolved]
+        if pending:
+            self.trees.update(resolve_trees(self.repo_path, pending))
+            self.resolved.update(pending)
+
+
+# Only the project being tracked is kept, so memory stays bounded
+_state = None
+
+
+def project_state(project):
+    global _state
+    if _state is None or _state.project != project:
+        _state = ProjectState(project)
+    return _state
+
+
+def track_pr_unit(unit):
+    """
+    Work unit of stage 8: unit is (project, pr_id, commits) where commits is
+    the commit-ordered list of (number_commit, parent_sha, child_sha).
+    Returns (project, pr_id, lifetimes DataFrame, (cache hits, cache misses)).
+    Rows are sorted, so the result does not depend on which process ran it.
+    """
+    project, pr_id, commits = unit
+    started = time.perf_counter()
+    state = project_state(project)
+    hits, misses = state.cache.hits, state.cache.misses
+
+    state.resolve([sha for _, parent, child in commits for sha in (parent, child)])
+
+    snapshots = []
+    carries = []
+    previous_child_sha = None
+
+    for number_commit, parent_sha, child_sha in commits:
+        # File paths (NiCad result pattern according to your last XML)
+        xml_parent = os.path.join(
+            search_results_path,
+            f"nicad-result-{project}-{pr_id}-{number_commit}-parent.xml"
+        )
+        xml_child = os.path.join(
+            search_results_path,
+            f"nicad-result-{project}-{pr_id}-{number_commit}-child.xml"
+        )
+
+        snapshots.append((
+            number_commit,
+            load_snapshot(xml_parent, parent_sha, state.trees, state.cache, state.interner),
+            load_snapshot(xml_child, child_sha, state.trees, state.cache, state.interner)
+        ))
+
+        # Active instances live in the previous child's line numbers,
+        # births are checked against the parent's
+        carries.append((
+            make_carry(state.repo_path, previous_child_sha, child_sha, state.diffs, state.interner)
+            if previous_child_sha else None,
+            make_carry(state.repo_path, parent_sha, child_sha, state.diffs, state.interner)
+        ))
+        previous_child_sha = child_sha
+
+    lifetimes = track_pr(snapshots, carries)
+    instances = state.interner.decode(lifetimes["instance_id"])
+    n = lifetimes["instance_id"].size
+
+    df = pd.DataFrame({
+        "project": np.full(n, project, dtype=object),
+        "pr": np.full(n, pr_id),
+        "clone_fingerprint": instances["clone_fingerprint"],
+        "start_commit": lifetimes["start_commit"],
+        "end_commit": lifetimes["end_commit"],
+        "total_commits_in_pr": np.full(n, len(commits), dtype=np.int64),
+        "source_file": instances["source_file"],
+        "start_line": instances["start_line"],
+        "end_line": instances["end_line"],
+    }, columns=LIFETIME_COLUMNS)
+    df = df.sort_values(
+        ["start_commit", "end_commit", "source_file", "start_line", "end_line", "clone_fingerprint"],
+        ignore_index=True
+    )
+
+    cache_stats = (state.cache.hits - hits, state.cache.misses - misses)
+    instrumentation.emit(
+        "track_pr", project=project, pr=int(pr_id), commits=len(commits), clones=len(df),
+        cache_hits=cache_stats[0], cache_misses=cache_stats[1],
+        seconds=round(time.perf_counter() - started, 4)
+    )
+    return project, pr_id, df, cache_stats